@@ -1,42 +1,261 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 import os
 import time
-import jwt
-import uuid
-import requests
+import asyncio
 import json
-import google.generativeai as genai
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from monitor import KimchiPremiumMonitor
+from services import ColdStart, FirstResponse, ServiceRegistry, warmup_from_env
+from monitor import AsyncKimchiPremiumMonitor
+from market_feed import poller_from_env
+from push_stream import Broadcaster
+from ticker_stream import TickerStreamEngine
+from history_buffer import PriceHistory, snapshot_values
+from tick_store import TickStore, TickStoreWriter, store_dir_from_env
+from premium_matrix import PremiumMatrix, MATRIX_COLUMNS, sort_matrix, matrix_rows
+from executable_premium import executable_premium_from_env
+from arbitrage import arbitrage_from_env
+from backtest import load_series, backtest_rules, update_rule_statuses, format_status
+from premium_stats import premium_stats_from_env, window_label
+from rule_engine import RuleEngine, snapshot_metrics
+from exchange_api import BalanceService
+from llm_gateway import gateway_from_env, market_state_key, prompt_key, RuleTagFilter
+from orderbook import OrderBookCache
+from mock_exchange import MockExchange
+from local_db import LocalDB
+from db_layer import data_layer_from_env, utc_now
+from http_cache import StaticPages, ConditionalJSON
+from shared_state import shared_state_from_env
+from metrics import (Registry, MetricsMiddleware, InstrumentedDB, LoopLagMonitor, TaskHealth,
+                     SamplingProfiler, LAG_BUCKETS)
+
+# .env 는 여기서 한 번만 로드 (monitor/exchange_api 는 import 시점에 읽지 않음)
+load_dotenv()
+coldstart = ColdStart()
 
-from supabase import create_client, Client
+# 제미나이/슈파베이스 SDK 는 처음 쓸 때 import + 생성 (서버 시작 후 백그라운드에서 미리 생성)
+services = ServiceRegistry()
+SERVICE_WARMUP, SERVICE_WARMUP_DELAY_SEC = warmup_from_env()
 
 # Supabase 초기화
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY") # 관리자 권한 키 사용
-db: Client = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+# 슈파베이스 미설정 시 LOCAL_DB_PATH 를 지정했을 때만 로컬 SQLite 로 대체 (둘 다 없으면 DB 미연결)
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH")
+def supabase_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+if SUPABASE_URL and SUPABASE_KEY:
+    db = services.register("supabase", supabase_client)
+else:
+    db = LocalDB(LOCAL_DB_PATH) if LOCAL_DB_PATH else None
 
-monitor = KimchiPremiumMonitor()
-load_dotenv()
+# 지표 (/metrics): 요청 경로에서는 카운터/히스토그램에 숫자만 더함
+metrics = Registry()
+if db:
+    db = InstrumentedDB(db, metrics.histogram("db_request_seconds", "DB 요청 시간", ("table", "op")),
+                        metrics.counter("db_errors_total", "DB 요청 실패", ("table", "op")))
 
-# 가격 히스토리 저장용 (차트용)
-price_history = []
+# 규칙 저장은 큐에 넣고 바로 응답 (백그라운드에서 묶어서 insert), 규칙 목록은 읽기 캐시에서
+db_writes, rules_cache = data_layer_from_env(db)
 
-# Gemini AI 초기화
-GENAI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GENAI_API_KEY:
+monitor = AsyncKimchiPremiumMonitor()
+
+# 시장 스냅샷: 백그라운드 태스크 하나가 주기적으로 갱신하고 모든 요청은 메모리에서 읽음
+market_poller = poller_from_env(monitor.get_combined_data)
+
+# 대시보드 실시간 푸시 (SSE) - 업데이트당 한 번 직렬화해서 모든 접속자에게 전파
+broadcaster = Broadcaster()
+
+def market_payload(data, updated_at):
+    """/api/market-data 및 푸시 스트림 공용 응답 형식"""
+    return {
+        "binance": data['prices']['binance'],
+        "upbit": data['prices']['upbit'],
+        "bithumb": data['prices']['bithumb'],
+        "usd_krw": data['fx_rate'],
+        "premium_up": data['premiums']['upbit'],
+        "premium_bithumb": data['premiums']['bithumb'],
+        "stale": data.get('stale', []),
+        "updated_at": updated_at,
+        "age": round(time.time() - updated_at, 3)
+    }
+
+def market_summary(data):
+    """AI 프롬프트용 시세 요약 (조회 실패로 지연/없는 값은 그대로 표시)"""
+    prices = data['prices']
+    fmt = lambda v, unit: "조회 실패" if v is None else f"{unit}{v:,}"
+    prem = data['premiums']['upbit']
+    text = (f"바이낸스 BTC: {fmt(prices['binance'], '$')}, 업비트 BTC: {fmt(prices['upbit'], '₩')}, "
+            f"환율: {fmt(data['fx_rate'], '₩')}, 업비트 김프: {'계산 불가' if prem is None else f'{prem:.2f}%'}")
+    if data.get('stale'):
+        text += f" (지연 데이터: {', '.join(data['stale'])})"
+    return text
+
+# 가격 히스토리 저장용 (차트용)
+# 원시 스냅샷 링버퍼 + 1m/5m/1h OHLC 롤업 (용량 고정)
+price_history = PriceHistory(raw_capacity=int(os.getenv("HISTORY_RAW_CAPACITY", "720")))
+
+# 재시작해도 남는 디스크 틱 저장소 (날짜별 memmap 파일)
+TICK_STORE_DIR = store_dir_from_env()
+tick_writer = TickStoreWriter(TICK_STORE_DIR) if TICK_STORE_DIR else None
+tick_store = TickStore(TICK_STORE_DIR) if TICK_STORE_DIR else None
+
+def record_price_history(data, updated_at):
+    """스냅샷이 갱신될 때마다 차트용 히스토리에 한 점 추가"""
+    values = snapshot_values(data)
+    price_history.append(updated_at, values)
+    if tick_writer:
+        tick_writer.append(updated_at, "BTC", values)
+    broadcaster.publish("market", market_payload(data, updated_at))
+    broadcaster.publish("history", price_history.latest_point())
+
+market_poller.listeners.append(record_price_history)
+
+# 모의 거래소: 지갑은 메모리에서 원자적으로 갱신, 체결은 업비트 호가 기준, DB 저장은 모아서 주기적으로
+mock_exchange = MockExchange()
+book_cache = OrderBookCache(monitor)
+MOCK_FLUSH_SEC = float(os.getenv("MOCK_FLUSH_SEC", "2"))
+
+def track_last_price(data, updated_at):
+    """호가 조회 실패 시 합성 호가의 기준 가격"""
+    if data['prices']['upbit'] and 'upbit' not in data.get('stale', []):
+        book_cache.last_prices["BTC"] = data['prices']['upbit']
+
+market_poller.listeners.append(track_last_price)
+
+# 구조화된 규칙 실시간 평가 (임계값을 넘나든 규칙만 확인) → 대시보드 + 모의매매로 신호 전달
+rule_engine = RuleEngine(cooldown=float(os.getenv("RULE_SIGNAL_COOLDOWN_SEC", "60")))
+RULE_SIGNAL_TRADE_KRW = float(os.getenv("RULE_SIGNAL_TRADE_KRW", "100000"))
+RULE_SIGNAL_WALLET_ID = int(os.getenv("RULE_SIGNAL_WALLET_ID", "2"))  # 수동 주문(1번)과 분리된 전략 지갑
+
+async def execute_signal(signal):
+    """매수/매도 신호를 모의매매로 실행 (BTC만, 금액 0이면 사용 안 함)"""
     try:
-        genai.configure(api_key=GENAI_API_KEY)
-        # 404 에러 방지를 위해 모델 경로를 더 명확히 지정하거나 안정적인 모델 사용
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        result = await mock_trade({
+            "wallet_id": RULE_SIGNAL_WALLET_ID,
+            "side": signal["action"],
+            "symbol": signal["symbol"],
+            "amount_krw": signal["amount_krw"] or RULE_SIGNAL_TRADE_KRW
+        })
+        print(f"[rules] {signal['name']} → 모의 {signal['action']}: {result.get('message', result['status'])}")
     except Exception as e:
-        print(f"AI 초기화 오류: {e}")
-        model = None
-else:
-    model = None
+        print(f"[rules] 모의매매 실행 실패: {e}")
+
+def on_rule_signal(signal):
+    broadcaster.publish("signal", signal)
+    if signal["action"] in ("buy", "sell") and signal["symbol"] == "BTC" and RULE_SIGNAL_TRADE_KRW > 0:
+        asyncio.create_task(execute_signal(signal))
+
+rule_engine.listeners.append(on_rule_signal)
+market_poller.listeners.append(lambda data, updated_at: rule_engine.update("BTC", snapshot_metrics(data), updated_at))
+
+# 심볼별 김프/업비트-빗썸 차이 구간 통계 (틱당 O(1) 갱신) → /api/premium-stats, AI 프롬프트
+premium_stats = premium_stats_from_env()
+
+def record_premium_stats(data, updated_at):
+    if not data.get('stale'):  # 조회 실패로 마지막 정상값을 재사용한 스냅샷은 분포를 왜곡하므로 제외
+        premium_stats.update("BTC", snapshot_metrics(data), updated_at)
+
+market_poller.listeners.append(record_premium_stats)
+
+def load_rule_engine():
+    """rules.json + trading_rules 의 규칙명을 구조화해서 평가기에 등록"""
+    with open("rules.json", "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    if db:
+        try:
+            rows += db.table("trading_rules").select("name").execute().data
+        except Exception as e:
+            print(f"DB Error: {e}")
+    count = rule_engine.load_rules(rows)
+    print(f"[rules] 실시간 평가 규칙 {count}개 등록 (전체 {len(rows)}개 중)")
+
+# 전체 원화마켓 김프 매트릭스 (거래소마다 일괄 조회 1회 + NumPy 일괄 계산)
+premium_matrix = PremiumMatrix(monitor)
+matrix_poller = poller_from_env(premium_matrix.refresh, prefix="MATRIX", name="matrix", default_interval=10)
+
+def matrix_payload(matrix, updated_at, order=None):
+    return {
+        "rows": matrix_rows(matrix, order),
+        "count": len(matrix["symbols"]),
+        "fx_rate": matrix["fx_rate"],
+        "compute_ms": round(matrix["compute_ms"], 3),
+        "updated_at": updated_at,
+        "age": round(time.time() - updated_at, 3)
+    }
+
+matrix_poller.listeners.append(lambda matrix, updated_at: broadcaster.publish("matrix", matrix_payload(matrix, updated_at)))
+
+def record_matrix_stats(matrix, updated_at):
+    """BTC 와 웹소켓으로 받는 심볼은 더 촘촘한 소스가 있으므로 나머지 추적 심볼만"""
+    streamed = set(ticker_engine.symbols) if ticker_engine else set()
+    for i, symbol in enumerate(matrix["symbols"]):
+        if symbol != "BTC" and symbol not in streamed and premium_stats.tracks(symbol):
+            up, bit = float(matrix["upbit"][i]), float(matrix["bithumb"][i])
+            premium_stats.update(symbol, {"premium_up": up, "premium_bithumb": bit, "gap": up - bit}, updated_at)
+
+matrix_poller.listeners.append(record_matrix_stats)
+
+# 거래소 간 차익 순환 탐색 (KRW-USDT 시세를 다리로, 출금 수수료/시간 포함). 값이 바뀐 간선만 다시 반영
+arbitrage = arbitrage_from_env()
+
+def scan_arbitrage(matrix, updated_at):
+    if arbitrage.update(matrix):
+        broadcaster.publish("arbitrage", {**arbitrage.payload(limit=10), "updated_at": updated_at})
+
+matrix_poller.listeners.append(scan_arbitrage)
+
+# 호가 기준 실행 가능 김프 (주문 크기별 VWAP + 수수료). 호가가 바뀐 거래소 다리만 다시 계산
+executable_premium = executable_premium_from_env(monitor)
+book_poller = poller_from_env(executable_premium.refresh, prefix="BOOK", name="book", default_interval=3)
+
+# 거래소 웹소켓 실시간 시세 (TICKER_STREAM_SYMBOLS=BTC,ETH 처럼 설정했을 때만 사용)
+TICKER_STREAM_SYMBOLS = os.getenv("TICKER_STREAM_SYMBOLS")
+ticker_engine = TickerStreamEngine(TICKER_STREAM_SYMBOLS.split(",")) if TICKER_STREAM_SYMBOLS else None
+
+if ticker_engine:
+    # 환율은 스냅샷 폴러 값을 사용하고, 틱마다 움직인 심볼의 김프만 대시보드로 전파
+    market_poller.listeners.append(lambda data, updated_at: ticker_engine.set_fx_rate(data['fx_rate']))
+    ticker_engine.listeners.append(
+        lambda symbol, row: broadcaster.publish("ticker", {"symbol": symbol, **row}, key=f"ticker:{symbol}")
+    )
+    ticker_engine.listeners.append(lambda symbol, row: rule_engine.update(symbol, {
+        "premium_up": row["upbit"], "premium_bithumb": row["bithumb"], "gap": row["gap"]
+    }, row["ts"]))
+    ticker_engine.listeners.append(lambda symbol, row: premium_stats.update(symbol, {
+        "premium_up": row["upbit"], "premium_bithumb": row["bithumb"], "gap": row["gap"]
+    }, row["ts"]))
+
+    def record_ticker(symbol, row):
+        """틱마다 해당 심볼 한 줄을 틱 저장소에 기록"""
+        prices = ticker_engine.prices
+        tick_writer.append(time.time(), symbol, (
+            prices["upbit"].get(symbol), prices["bithumb"].get(symbol), prices["binance"].get(symbol),
+            ticker_engine.fx_rate, row["upbit"], row["bithumb"]
+        ))
+
+    if tick_writer:
+        ticker_engine.listeners.append(record_ticker)
+
+# Gemini AI 초기화 (SDK import 만 1초 가까이 걸려서 첫 호출/미리 생성 때로 미룸)
+GENAI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+def gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key=GENAI_API_KEY)
+    # 404 에러 방지를 위해 모델 경로를 더 명확히 지정하거나 안정적인 모델 사용
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+model = services.register("gemini", gemini_model) if GENAI_API_KEY else None
+
+# 모델 호출은 모두 게이트웨이를 거침 (스레드 실행 + 타임아웃 + 동시 실행 제한 + 캐시)
+llm = gateway_from_env(model)
+AI_SUGGESTION_TTL_SEC = float(os.getenv("AI_SUGGESTION_TTL_SEC", "120"))
 
 # 보안 설정 (단순 비밀번호)
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "1234") # 기본값은 1234
@@ -53,116 +272,292 @@ def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
 
 app = FastAPI()
 
-class ExchangeAPI:
-    def __init__(self):
-        self.upbit_access = os.getenv("UPBIT_ACCESS_KEY")
-        self.upbit_secret = os.getenv("UPBIT_SECRET_KEY")
-        self.bithumb_access = os.getenv("BITHUMB_ACCESS_KEY")
-        self.bithumb_secret = os.getenv("BITHUMB_SECRET_KEY")
-
-    def get_upbit_balance(self):
-        if not self.upbit_access or not self.upbit_secret: return []
-        payload = {'access_key': self.upbit_access, 'nonce': str(uuid.uuid4())}
-        token = jwt.encode(payload, self.upbit_secret)
-        headers = {"Authorization": f"Bearer {token}"}
-        res = requests.get("https://api.upbit.com/v1/accounts", headers=headers)
-        return res.json() if res.status_code == 200 else []
-
-    def get_bithumb_balance(self):
-        if not self.bithumb_access or not self.bithumb_secret: return []
-        payload = {'access_key': self.bithumb_access, 'nonce': str(uuid.uuid4()), 'timestamp': int(time.time() * 1000)}
-        token = jwt.encode(payload, self.bithumb_secret, algorithm='HS256')
-        headers = {"Authorization": f"Bearer {token}"}
-        res = requests.get("https://api.bithumb.com/v1/accounts", headers=headers)
-        return res.json() if res.status_code == 200 else []
-
-api_handler = ExchangeAPI()
+# 페이지는 시작 시 한 번 읽고 압축본까지 준비 (DEV_RELOAD=1 이면 파일이 바뀔 때 다시 읽음)
+pages = StaticPages(["index.html", "manual.html"], reload=os.getenv("DEV_RELOAD") == "1")
+# 폴링 JSON: 데이터 버전이 그대로면 304
+conditional_json = ConditionalJSON()
+
+# 업비트/빗썸 잔고 공용 서비스 (짧은 TTL 캐시 + 동시 요청 합치기)
+balance_service = BalanceService()
+
+# 업스트림 / AI / 엔드포인트 지연, 폴백·캐시 적중, 이벤트 루프 지연, 백그라운드 태스크 상태
+upstream_seconds = metrics.histogram("upstream_request_seconds", "외부 API 요청 시간", ("source",))
+upstream_results = metrics.counter("upstream_responses_total", "외부 API 응답 (HTTP 상태 또는 예외 이름)", ("source", "outcome"))
+
+def observe_upstream(source, seconds, outcome):
+    upstream_seconds.observe(seconds, source)
+    upstream_results.inc(source, outcome)
+
+monitor.scheduler.listeners.append(observe_upstream)
+llm_seconds = metrics.histogram("llm_request_seconds", "AI 모델 호출 시간", ("kind", "outcome"))
+llm.listeners.append(lambda kind, seconds, outcome: llm_seconds.observe(seconds, kind, outcome))
+app.add_middleware(FirstResponse, coldstart=coldstart)
+app.add_middleware(MetricsMiddleware,
+                   histogram=metrics.histogram("http_request_seconds", "엔드포인트별 응답 시작까지 시간", ("path",)),
+                   counter=metrics.counter("http_requests_total", "엔드포인트별 요청 수", ("method", "path", "status")))
+
+def scheduler_counters(field):
+    return lambda: {source: c[field] for source, c in monitor.scheduler.counters.items()}
+
+for field in ("requests", "cache_hits", "coalesced", "failures", "rate_limited"):
+    metrics.gauge(f"upstream_{field}_total", f"업스트림 스케줄러 {field}", scheduler_counters(field), ("source",), "counter")
+metrics.gauge("upstream_fallbacks_total", "조회 실패로 마지막 정상값(stale) 또는 값 없음(missing)으로 응답한 횟수",
+              lambda: {(s, kind): n for s, f in monitor.fallbacks.items() for kind, n in f.items()}, ("source", "kind"), "counter")
+metrics.gauge("upstream_circuit_open", "서킷 브레이커 차단 중 여부",
+              lambda: {s: int(b.state == "open") for s, b in monitor.scheduler.breakers.items()}, ("source",))
+metrics.gauge("cache_hits_total", "캐시 적중", lambda: {
+    "llm": llm.counters["hits"] + llm.counters["coalesced"],
+    "rules": rules_cache.counters["hits"],
+    "http_304": conditional_json.counters["not_modified"]
+}, ("cache",), "counter")
+metrics.gauge("cache_misses_total", "캐시 미스 (실제 조회/생성)", lambda: {
+    "llm": llm.counters["calls"],
+    "rules": rules_cache.counters["loads"],
+    "http_304": conditional_json.counters["built"] + conditional_json.counters["reused"]
+}, ("cache",), "counter")
+metrics.gauge("balance_requests_total", "거래소 잔고 API 호출 수", lambda: balance_service.requests, kind="counter")
+metrics.gauge("db_write_queue", "DB 저장 큐 통계", lambda: db_writes.stats(), ("stat",))
+metrics.gauge("snapshot_age_seconds", "스냅샷 마지막 갱신 후 경과 시간",
+              lambda: {"market": market_poller.age(), "matrix": matrix_poller.age(), "book": book_poller.age()},
+              ("poller",))
+metrics.gauge("sse_clients", "푸시 스트림 접속 수", lambda: len(broadcaster.clients))
+loop_lag = LoopLagMonitor(metrics.histogram("event_loop_lag_seconds", "이벤트 루프 지연", buckets=LAG_BUCKETS))
+metrics.gauge("event_loop_lag_max_seconds", "시작 이후 최대 이벤트 루프 지연", lambda: loop_lag.max)
+metrics.gauge("coldstart_seconds", "프로세스 시작부터 단계(imported/ready/first_response)까지 시간",
+              lambda: dict(coldstart.phases), ("phase",))
+metrics.gauge("service_init_seconds", "지연 생성 클라이언트 생성 시간", lambda: dict(services.init_seconds), ("service",))
+task_health = TaskHealth()
+task_health.register(metrics)
+market_poller.listeners.append(lambda data, updated_at: task_health.ok("market_poller"))
+matrix_poller.listeners.append(lambda matrix, updated_at: task_health.ok("matrix_poller"))
+book_poller.listeners.append(lambda version, updated_at: task_health.ok("book_poller"))
+db_writes.listeners.append(lambda table, rows: task_health.ok("db_writes"))
+profiler = None  # 시작 시 이벤트 루프 스레드 기준으로 생성 (PROFILER_ENABLED=1)
 
 @app.get("/api/market-data")
 async def get_market_data():
     try:
-        # Binance Price (BTC)
-        binance = requests.get("https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT").json()
-        # Upbit Price (BTC)
-        upbit = requests.get("https://api.upbit.com/v1/ticker?markets=KRW-BTC").json()
-        # Bithumb Price (BTC)
-        bithumb = requests.get("https://api.bithumb.com/v1/ticker?markets=KRW-BTC").json()
-        # Exchange Rate
-        fx = requests.get("https://api.exchangerate-api.com/v4/latest/USD").json()
-        
-        result = {
-            "binance": float(binance['price']),
-            "upbit": float(upbit[0]['trade_price']),
-            "bithumb": float(bithumb[0]['trade_price']),
-            "usd_krw": fx['rates']['KRW']
-        }
-        
-        # 히스토리 추가
-        price_history.append({
-            "time": time.strftime("%H:%M:%S"),
-            "upbit": result["upbit"],
-            "bithumb": result["bithumb"],
-            "premium_up": ((result["upbit"] / (result["binance"] * result["usd_krw"])) - 1) * 100
-        })
-        if len(price_history) > 50: price_history.pop(0)
-        
-        return result
+        market_data = await market_poller.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if market_data is None:
+        raise HTTPException(status_code=503, detail="시장 데이터 준비 중")
+
+    return market_payload(market_data, market_poller.updated_at)
+
+@app.get("/api/upstream-status")
+async def get_upstream_status():
+    """외부 API 소스별 TTL/요청 한도/서킷 브레이커 상태와 호출 통계"""
+    return {"sources": monitor.scheduler.status(), "health": monitor.health}
+
+@app.get("/api/ticker-premiums")
+async def get_ticker_premiums():
+    """웹소켓 틱 기준 심볼별 실시간 김프"""
+    if not ticker_engine:
+        return {"enabled": False, "premiums": {}}
+    return {
+        "enabled": True,
+        "premiums": ticker_engine.premiums,
+        "ticks": ticker_engine.tick_count,
+        "reconnects": ticker_engine.reconnects
+    }
+
+@app.get("/api/premium-matrix")
+async def get_premium_matrix(sort: str = "upbit", desc: bool = True, limit: int = 0):
+    """전 종목 업비트/빗썸 김프 및 업비트-빗썸 차이 (sort: 정렬 컬럼, limit: 상위 N개)"""
+    if sort not in MATRIX_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort는 {', '.join(MATRIX_COLUMNS)} 중 하나")
+    matrix = await matrix_poller.get()
+    if matrix is None:
+        raise HTTPException(status_code=503, detail="시장 데이터 준비 중")
+    order = sort_matrix(matrix, sort, desc, limit or None)
+    return matrix_payload(matrix, matrix_poller.updated_at, order)
+
+@app.get("/api/premium-stats")
+async def get_premium_stats(request: Request, symbols: str = None):
+    """심볼별 김프/차이 구간 통계 (개수, 평균, 표준편차, 최소/최대, p05/p50/p95, z-score, EWMA)"""
+    wanted = {s.strip().upper() for s in symbols.split(",") if s.strip()} if symbols else None
+    return await conditional_json.respond(request, premium_stats.version, lambda: {
+        "windows": [window_label(w) for w in premium_stats.windows],
+        "symbols": premium_stats.snapshot(wanted)
+    })
+
+@app.get("/api/arbitrage")
+async def get_arbitrage(request: Request, limit: int = 20, max_minutes: float = None):
+    """수익 순환 경로 (수익률 순). max_minutes: 출금 반영 시간 합이 이보다 긴 경로 제외"""
+    if arbitrage.result is None:
+        await matrix_poller.get()
+    if arbitrage.result is None:
+        raise HTTPException(status_code=503, detail="시장 데이터 준비 중")
+    return await conditional_json.respond(request, arbitrage.version, lambda: {
+        **arbitrage.payload(limit, max_minutes), "updated_at": matrix_poller.updated_at
+    })
+
+@app.get("/api/executable-premium")
+async def get_executable_premium(request: Request, symbols: str = None, sizes: str = None):
+    """주문 크기별 실행 가능 김프 곡선 (symbols=BTC,ETH / sizes=1000000,10000000 원, 없으면 기본 크기)"""
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
+    untracked = [s for s in wanted or [] if s not in executable_premium.symbols]
+    if untracked:
+        raise HTTPException(status_code=400, detail=f"추적 중인 심볼: {', '.join(executable_premium.symbols)}")
+    try:
+        size_list = [float(s) for s in sizes.split(",")] if sizes else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="sizes는 쉼표로 구분한 원화 금액")
+    if size_list is not None and not (0 < len(size_list) <= 50 and min(size_list) > 0):
+        raise HTTPException(status_code=400, detail="sizes는 1~50개의 양수")
+    await book_poller.get()
+
+    def build():
+        payload = executable_premium.payload(wanted, size_list)
+        payload["updated_at"] = book_poller.updated_at
+        payload["compute_ms"] = round(executable_premium.compute_ms, 3)
+        return payload
+
+    return await conditional_json.respond(request, executable_premium.version, build)
+
+@app.get("/api/stream")
+async def stream_updates():
+    """시세/차트/AI 생각/규칙 변경 푸시 (Server-Sent Events)"""
+    client = broadcaster.subscribe()
+    return StreamingResponse(
+        broadcaster.stream(client),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def after_tick_flush(fn, *args):
+    """틱 쓰기 버퍼를 디스크로 비운 뒤 조회 (스레드에서 실행)"""
+    tick_writer.flush()
+    return fn(*args)
 
 @app.get("/api/price-history")
-async def get_price_history():
-    return price_history
+async def get_price_history(request: Request, resolution: str = "raw", since: float = None, until: float = None,
+                            symbol: str = "BTC", limit: int = 0):
+    """resolution: raw/1m/5m/1h, since/until: epoch 초 구간. raw는 기본 최근 50개.
+    메모리 버퍼가 담지 못하는 과거 구간이나 until 지정 시에는 디스크 틱 저장소에서 조회"""
+    if resolution not in price_history.resolutions:
+        raise HTTPException(status_code=400, detail=f"resolution은 {', '.join(price_history.resolutions)} 중 하나")
+    if resolution == "raw" and since is None and not limit:
+        limit = 50
+    if symbol != "BTC" and not tick_store:
+        raise HTTPException(status_code=404, detail="BTC 외 심볼 히스토리는 틱 저장소(TICK_STORE_DIR)가 필요합니다")
+    if until is not None and not tick_store:
+        raise HTTPException(status_code=404, detail="until 구간 조회는 틱 저장소(TICK_STORE_DIR)가 필요합니다")
+    from_store = until is not None or symbol != "BTC" or not price_history.covers(resolution, since)
+    if from_store and tick_store:
+        records = await asyncio.to_thread(after_tick_flush, tick_store.range, since or 0, until, symbol)
+        return price_history.query_records(records, resolution, limit or None)
+    return await conditional_json.respond(request, price_history.version,
+                                          lambda: price_history.query(resolution, since, limit or None))
 
 @app.get("/api/rules")
-async def get_rules():
+async def get_rules(request: Request):
     try:
         if db:
-            res = db.table("trading_rules").select("*").order("created_at", desc=True).limit(20).execute()
-            return res.data
+            rows = await rules_cache.get()
+            return await conditional_json.respond(request, rules_cache.current_version(), lambda: rows)
     except Exception as e:
         print(f"DB Error: {e}")
     return [{"name": "기본 김프 매매 (관찰 중)", "status": "수익률: +0.00%"}]
 
+async def save_rule(name, status):
+    """규칙을 저장 큐에 넣고 접속 중인 대시보드에 변경 사항 전파 (DB 반영은 백그라운드)"""
+    await db_writes.put("trading_rules", {
+        "name": name,
+        "status": status,
+        "created_at": utc_now()
+    })
+    broadcaster.publish("rules", {"name": name, "status": status})
+    if state_mirror:
+        state_mirror.send("rule", {"name": name})  # 규칙 평가는 리더에서만 돌므로 리더 평가기에 등록
+    else:
+        rule_engine.load_rules([{"name": name}])
+
+@app.get("/api/rule-signals")
+async def get_rule_signals():
+    """최근 규칙 신호 + 평가기 상태 (등록 규칙 수, 틱당 평가 시간)"""
+    return {"signals": rule_engine.signals[::-1], **rule_engine.stats()}
+
+@app.get("/api/db-status")
+async def get_db_status():
+    """저장 큐(대기/일괄 저장/실패) 및 규칙 목록 캐시 통계"""
+    return {
+        "backend": "supabase" if SUPABASE_URL and SUPABASE_KEY else ("sqlite" if db else None),
+        "writes": db_writes.stats(),
+        "rules_cache": rules_cache.counters
+    }
+
 @app.post("/api/rules")
 async def add_rule(rule: dict):
     if db:
         # source가 없으면 '수동'이 기본값
         source = rule.get('source', '사용자 추가')
-        db.table("trading_rules").insert({
-            "name": rule['name'], 
-            "status": f"대기 중 (출처: {source})",
-            "created_at": "now()"
-        }).execute()
+        await save_rule(rule['name'], f"대기 중 (출처: {source})")
         return {"status": "success"}
     return {"status": "error", "message": "DB 미연결"}
 
+@app.post("/api/backtest")
+async def run_backtest(days: float = 7, symbol: str = "BTC"):
+    """틱 저장소의 최근 기록으로 rules.json + trading_rules 규칙을 백테스트하고 status에 결과 기록"""
+    if not tick_store:
+        return {"status": "error", "message": "틱 저장소 미사용 (TICK_STORE_DIR)"}
+    ts, premium_up, gap = await asyncio.to_thread(after_tick_flush, load_series, tick_store,
+                                                  time.time() - days * 86400, None, symbol)
+    if len(ts) < 2:
+        return {"status": "error", "message": "백테스트할 기록이 없습니다"}
+    with open("rules.json", "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    if db:
+        try:
+            names = {r["name"] for r in rules}
+            rows = await asyncio.to_thread(lambda: db.table("trading_rules").select("name").execute().data)
+            rules += [r for r in rows if r["name"] not in names]
+        except Exception as e:
+            print(f"DB Error: {e}")
+    results = await asyncio.to_thread(backtest_rules, rules, premium_up, gap)
+    if db:
+        try:
+            await asyncio.to_thread(update_rule_statuses, db, results)
+            rules_cache.invalidate()
+        except Exception as e:
+            print(f"백테스트 결과 저장 실패: {e}")
+    for name, result in results.items():
+        if result is not None:
+            broadcaster.publish("rules", {"name": name, "status": format_status(result)})
+    return {"status": "success", "points": len(ts), "results": results}
+
 @app.get("/api/ai-suggestion")
 async def get_ai_suggestion():
-    if not model:
+    if not llm.available:
         return {"suggestion": "제미나이 API 키가 설정되지 않았습니다."}
     
-    # 실시간 데이터 수집
-    market_data = monitor.get_combined_data()
+    # 실시간 데이터 수집 (팔로워 워커는 첫 스냅샷을 받기 전까지 None)
+    market_data = await market_poller.get()
+    if market_data is None:
+        return {"suggestion": "시장 데이터 준비 중입니다. 잠시 후 다시 시도해 주세요."}
     
     # 프롬프트 생성
     prompt = f"""
     당신은 전문 가상자산 트레이딩 AI입니다. 현재 시장 상황과 내 잔고를 분석해서 최적의 김치 프리미엄 전략을 한 문장으로 제안해 주세요.
-    바이낸스 BTC: ${market_data['prices']['binance']:,}, 업비트 BTC: ₩{market_data['prices']['upbit']:,}, 환율: ₩{market_data['fx_rate']:,}
-    현재 프리미엄: 업비트 {(((market_data['prices']['upbit'] / (market_data['prices']['binance'] * market_data['fx_rate'])) - 1) * 100):.2f}%
+    {market_summary(market_data)}
+    {premium_stats.prompt_context("BTC")}
     
+    현재 값 하나가 아니라 구간별 평균/범위/z-score 로 본 국면(평소 수준인지, 이례적으로 벌어졌는지)을 근거로 판단하세요.
     형식: "[액션] 이유 (예상 수익: +N%)"
     """
     
     try:
-        response = model.generate_content(prompt)
-        return {"suggestion": response.text.strip()}
+        # 김프가 0.1% 구간 안에 머무는 동안(같은 국면)은 모든 탭이 같은 제안을 공유
+        cache_key = f'{market_state_key("suggestion", market_data)}:{premium_stats.regime_key("BTC")}'
+        suggestion = await llm.generate(prompt, cache_key, AI_SUGGESTION_TTL_SEC)
+        return {"suggestion": suggestion}
     except Exception as e:
         return {"suggestion": f"AI 분석 중 오류 발생: {str(e)}"}
 
 @app.post("/api/extract-rule")
 async def extract_rule(data: dict):
-    if not model or not db:
+    if not llm.available or not db:
         return {"status": "error", "message": "AI 키 또는 DB 미연결"}
     
     raw_text = data.get('text', '')
@@ -175,9 +570,8 @@ async def extract_rule(data: dict):
     """
     
     try:
-        response = model.generate_content(prompt)
-        summarized_rule = response.text.strip()
-        db.table("trading_rules").insert({"name": summarized_rule, "status": "대기 중 (AI 추출)", "created_at": "now()"}).execute()
+        summarized_rule = await llm.generate(prompt, prompt_key("extract", raw_text), 86400)
+        await save_rule(summarized_rule, "대기 중 (AI 추출)")
         return {"status": "success", "extracted": summarized_rule}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -186,12 +580,15 @@ async def extract_rule(data: dict):
 async def ai_chat(data: dict):
     model_type = data.get('model_type', 'gemini')
     user_msg = data.get('message', '')
+    if not llm.available:
+        return {"status": "error", "message": "AI 모델이 설정되지 않았습니다."}
     
-    # 실시간 데이터 및 자산 현황 수집 (학습 데이터 보강)
-    market_data = monitor.get_combined_data()
-    kimpi = ((market_data['prices']['upbit'] / (market_data['prices']['binance'] * market_data['fx_rate'])) - 1) * 100
-    upbit_bal = api_handler.get_upbit_balance()
-    mock_bal = await get_mock_wallet() # 모의투자 잔고도 포함
+    # 실시간 데이터 및 자산 현황 수집 (학습 데이터 보강) - 시세/잔고를 동시에
+    market_data, upbit_bal = await asyncio.gather(market_poller.get(), balance_service.get_upbit_balance())
+    if market_data is None:
+        return {"status": "error", "message": "시장 데이터 준비 중입니다. 잠시 후 다시 시도해 주세요."}
+    await sync_mock_exchange()
+    mock_bal = mock_exchange.snapshot(1)
     
     system_prompt = f"""
     당신은 전 세계 상위 1% '알파 헌터(Alpha Hunter)' 트레이딩 매니저입니다.
@@ -203,99 +600,113 @@ async def ai_chat(data: dict):
     3. 델타 중립(Delta Neutral): 해외 1배 숏 + 국내 매수로 가격 하락 리스크를 0으로 만들고 '김프+펀딩비'만 챙기기.
     4. 거래소 간 스테이블 코인 역프리미엄: USDT 테더의 거래소별 미세한 차이를 이용한 무위험 차익.
 
-    현재 김프: {kimpi:.2f}% / 내 잔고: {upbit_bal} (Real)
+    {market_summary(market_data)} / 내 잔고: {upbit_bal} (Real), {mock_bal['krw']}원 (모의)
+    {premium_stats.prompt_context("BTC")}
     
     위의 특수 지식을 활용하여 지금 이 순간 가장 '남다른' 돈 되는 아이디어를 제안하세요.
     반드시 [RULE: 규칙명] 형식을 포함해야 자동 연동됩니다.
     """
 
-    reply = ""
+    prefix = ""
+    if model_type != 'gemini' and os.getenv("EXTERNAL_AI_API_KEY"):
+        # Meta (Llama 3) 또는 GPT (OpenAI 호환 API 사용)
+        # 렌더 환경변수에서 OPENROUTER_API_KEY 등을 가져와서 처리 가능하도록 구조만 추가
+        prefix = f"(알림: {model_type} 모델 연동 준비 중입니다. 현재는 제미나이로 응답합니다.)\n"
+    return StreamingResponse(
+        chat_stream(system_prompt + "\n사용자: " + user_msg, model_type, prefix),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def chat_stream(prompt, model_type, prefix=""):
+    """모델 응답을 받는 대로 흘려보내고, [RULE: ...] 태그는 닫히는 즉시 걸러내서 규칙으로 등록"""
+    tags = RuleTagFilter()
+    registered = []
+    if prefix:
+        yield prefix
     try:
-        if model_type == 'gemini' and model:
-            response = model.generate_content(system_prompt + "\n사용자: " + user_msg)
-            reply = response.text.strip()
-        else:
-            # Meta (Llama 3) 또는 GPT (OpenAI 호환 API 사용)
-            # 렌더 환경변수에서 OPENROUTER_API_KEY 등을 가져와서 처리 가능하도록 구조만 추가
-            api_key = os.getenv("EXTERNAL_AI_API_KEY") # 통합 키 사용 가정
-            if api_key:
-                # 여기에 OpenAI SDK 또는 requests로 멀티 모델 연동 가능
-                reply = f"(알림: {model_type} 모델 연동 준비 중입니다. 현재는 제미나이로 응답합니다.)\n"
-                response = model.generate_content(system_prompt + "\n사용자: " + user_msg)
-                reply += response.text.strip()
-            else:
-                response = model.generate_content(system_prompt + "\n사용자: " + user_msg)
-                reply = response.text.strip()
-        
-        # 규칙 자동 감지 및 저장 (기존 로직 유지)
-        if "[RULE:" in reply and db:
-            rule_part = reply.split("[RULE:")[1].split("]")[0].strip()
-            db.table("trading_rules").insert({
-                "name": f"[{model_type.upper()} 제안] {rule_part}",
-                "status": "대기 중 (채팅 자동등록)",
-                "created_at": "now()"
-            }).execute()
-            reply = reply.replace(f"[RULE: {rule_part}]", "").replace(f"[RULE:{rule_part}]", "") + f"\n\n✅ '{rule_part}' 규칙이 {model_type.upper()}를 통해 등록되었습니다!"
-
-        return {"reply": reply}
+        async for chunk in llm.stream(prompt):
+            text, rules = tags.feed(chunk)
+            if text:
+                yield text
+            for rule_part in rules:
+                if db:
+                    await save_rule(f"[{model_type.upper()} 제안] {rule_part}", "대기 중 (채팅 자동등록)")
+                    registered.append(rule_part)
+        rest = tags.flush()
+        if rest:
+            yield rest
+        for rule_part in registered:
+            yield f"\n\n✅ '{rule_part}' 규칙이 {model_type.upper()}를 통해 등록되었습니다!"
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        yield f"\n\n⚠️ AI 응답 오류: {e}"
 
-# AI의 '생각' 기록용 (UI 표시용)
+# AI의 '생각' 기록용 (UI 표시용), 버전은 기록이 추가될 때마다 증가 (ETag 용)
 ai_thought_log = []
+ai_thought_version = 0
 
 async def autonomous_rule_generation():
-    if not model or not db: return
+    global ai_thought_version
+    if not llm.available or not db: return
 
     try:
         # 1. 과거 규칙들을 더 많이 불러와서 '장기 기억'으로 사용 (학습 범위 확대)
         existing_rules = []
         if db:
-            res = db.table("trading_rules").select("name").limit(15).execute()
-            existing_rules = [r['name'] for r in res.data]
+            existing_rules = [r['name'] for r in (await rules_cache.get())[:15]]
 
-        market_data = monitor.get_combined_data()
-        kimpi = ((market_data['prices']['upbit'] / (market_data['prices']['binance'] * market_data['fx_rate'])) - 1) * 100
-        upbit_bal = api_handler.get_upbit_balance()
-        mock_bal = await get_mock_wallet()
+        market_data = await market_poller.get()
+        if market_data is None or market_data['premiums']['upbit'] is None:
+            print("AI 자율 진화 보류: 시세 조회 실패로 김프 계산 불가")
+            return
+        kimpi = market_data['premiums']['upbit']
+        upbit_bal = await balance_service.get_upbit_balance()
+        mock_bal = mock_exchange.snapshot(1)
 
         # 2. 자율 진화 프롬프트 (자산 기반 맞춤형 학습)
         prompt = f"""
         당신은 '2주간의 시장 흐름을 학습 중인' 트레이딩 전문가입니다. 
         현재 김프: {kimpi:.2f}%
+        {premium_stats.prompt_context("BTC")}
         보유 자산: {upbit_bal} (실전), {mock_bal['krw']}원 (모의)
         과거 15개 규칙 기록: {existing_rules}
         
         [학습 지침]
         - 위 기록들을 2주간의 '빅데이터'로 간주하고, 중복되지 않으면서도 수익률이 점진적으로 개선되는 '숙성된' 규칙 1개를 제안하세요.
         - 시장의 변동성을 고려하여 장기적으로 안정적인 수익을 낼 수 있는 전략을 우선시합니다.
+        - 위 구간 통계(평균/범위/z-score/EWMA)로 지금이 어떤 국면인지 판단하고, 그 국면에 맞는 진입/청산 임계값을 정하세요.
         
         형식: {{"name": "2주 숙성 전략", "thought": "과거 {len(existing_rules)}개 기록을 분석하여 개선한 포인트"}}
         """
         
-        response = model.generate_content(prompt)
-        text = response.text.replace('```json', '').replace('```', '').strip()
+        text = (await llm.generate(prompt)).replace('```json', '').replace('```', '').strip()
         result = json.loads(text)
         
         # 3. DB 저장 및 로그 추가
         rule_name = f"[자율진화] {result['name']}"
-        db.table("trading_rules").insert({
-            "name": rule_name,
-            "status": "AI 자율 학습 가동 중",
-            "created_at": "now()"
-        }).execute()
+        await save_rule(rule_name, "AI 자율 학습 가동 중")
         
         log_msg = f"🤖 **AI 생각:** {result['thought']}\n➡️ 신규 규칙 '{result['name']}'을 스스로 학습하여 등록했습니다."
-        ai_thought_log.append({"time": time.strftime("%H:%M:%S"), "msg": log_msg})
+        thought = {"time": time.strftime("%H:%M:%S"), "msg": log_msg}
+        ai_thought_log.append(thought)
         if len(ai_thought_log) > 10: ai_thought_log.pop(0)
+        ai_thought_version += 1
+        broadcaster.publish("thought", thought)
 
         print(f"AI 자율 진화 완료: {rule_name}")
+        task_health.ok("autonomous")
     except Exception as e:
         print(f"AI 자율 진화 오류: {str(e)}")
+        task_health.fail("autonomous", e)
+
+@app.get("/api/ai-gateway")
+async def get_ai_gateway_stats():
+    """LLM 게이트웨이 호출/캐시 적중/지연 통계"""
+    return llm.stats()
 
 @app.get("/api/ai-thoughts")
-async def get_ai_thoughts():
-    return ai_thought_log
+async def get_ai_thoughts(request: Request):
+    return await conditional_json.respond(request, ai_thought_version, lambda: ai_thought_log)
 
 async def autonomous_loop():
     # 서버 시작 직후 바로 한 번 실행하도록 지연 시간 단축
@@ -307,84 +718,221 @@ async def autonomous_loop():
             print(f"Loop Error: {e}")
         await asyncio.sleep(3600) # 1시간마다 실행
 
-import asyncio
+# 멀티 워커: 리더 한 곳만 수집/자율 진화/지갑 저장을 실행하고, 나머지는 공유 파일에서 상태를 받아 읽기 요청만 처리
+shared_state, state_mirror = shared_state_from_env()
+
+# 워커 안에서의 순서 보장 (파일 잠금/읽기/쓰기는 스레드에서 하므로 그 사이에 다른 요청이 끼어들 수 있음)
+mock_lock = asyncio.Lock()
+
+async def sync_mock_exchange():
+    """다른 워커가 체결해서 발행한 지갑 상태가 있으면 반영"""
+    if shared_state:
+        async with mock_lock:
+            state, changed = await asyncio.to_thread(shared_state.load, "mock_exchange")
+            if changed:
+                mock_exchange.restore_state(state)
+
+@asynccontextmanager
+async def mock_transaction():
+    """지갑을 바꾸는 구간: 워커 간 잠금 → 최신 상태 반영 → 변경 → 발행 (단일 워커면 그냥 실행).
+    잠금 대기와 pickle 읽기/쓰기는 스레드에서 (이벤트 루프를 막지 않음)"""
+    if not shared_state:
+        yield
+        return
+    async with mock_lock:
+        await asyncio.to_thread(shared_state.acquire, "mock_exchange")
+        try:
+            state, changed = await asyncio.to_thread(shared_state.load, "mock_exchange")
+            if changed:
+                mock_exchange.restore_state(state)
+            yield
+            await asyncio.to_thread(shared_state.publish, "mock_exchange", mock_exchange.export_state())
+        finally:
+            shared_state.release("mock_exchange")
+
+async def load_mock_wallets():
+    """공유 상태가 있으면 그것(DB 보다 최신)을, 없으면 DB 에서 복원"""
+    async with mock_transaction():
+        if mock_exchange.wallets or not db:
+            return
+        try:
+            count = mock_exchange.load(await asyncio.to_thread(lambda: db.table("mock_wallet").select("*").execute().data))
+            print(f"[mock] 모의 지갑 {count}개 복원")
+        except Exception as e:
+            print(f"DB Error: {e}")
+
+async def flush_mock_wallets():
+    """바뀐 지갑을 한 번의 upsert 로 저장 (실패하면 다음 주기에 다시)"""
+    async with mock_transaction():
+        rows = mock_exchange.drain_dirty()
+    if not rows:
+        return
+    try:
+        await asyncio.to_thread(lambda: db.table("mock_wallet").upsert(rows).execute())
+    except Exception as e:
+        print(f"모의 지갑 저장 실패: {e}")
+        async with mock_transaction():
+            mock_exchange.mark_dirty(r["id"] for r in rows)
+
+async def persist_mock_wallets():
+    """바뀐 지갑만 MOCK_FLUSH_SEC 마다 한 번에 저장 (주문마다 DB 왕복하지 않음)"""
+    while True:
+        await asyncio.sleep(MOCK_FLUSH_SEC)
+        await flush_mock_wallets()
+
+def apply_thoughts(state):
+    global ai_thought_version
+    ai_thought_log[:] = state["log"]
+    ai_thought_version = state["version"]
+
+def handle_worker_request(topic, payload):
+    """팔로워가 state_mirror.send 로 보낸 요청 (리더에서 실행)"""
+    if topic == "rule":
+        rule_engine.load_rules([payload])
+
+if state_mirror:
+    # 리더가 발행 (버전이 바뀐 것만), 팔로워는 바뀐 파일만 읽어서 자기 메모리 객체에 반영
+    for key, poller in (("market", market_poller), ("matrix", matrix_poller), ("book", book_poller)):
+        poller.passive = True
+        state_mirror.register_attrs(key, poller, ("snapshot", "updated_at"), lambda poller=poller: poller.updated_at)
+    state_mirror.register_attrs("book_curves", executable_premium, ("books", "curves", "fx_rate", "version", "compute_ms"),
+                                lambda: executable_premium.version)
+    state_mirror.register_attrs("history", price_history, ("raw", "rollups", "version"), lambda: price_history.version)
+    state_mirror.register_attrs("arbitrage", arbitrage, ("result", "version"), lambda: arbitrage.version)
+    state_mirror.register("premium_stats", premium_stats.export, premium_stats.load_export, lambda: premium_stats.version)
+    state_mirror.register("thoughts", lambda: {"log": ai_thought_log, "version": ai_thought_version}, apply_thoughts,
+                          lambda: ai_thought_version)
+    if ticker_engine:
+        state_mirror.register_attrs("ticker", ticker_engine, ("premiums", "tick_count", "reconnects", "fx_rate"))
+    state_mirror.on_event = broadcaster.publish   # 리더의 SSE 이벤트를 팔로워 접속자에게도
+    state_mirror.on_request = handle_worker_request
+    state_mirror.listeners.append(lambda: asyncio.create_task(start_leader_jobs()))
+    metrics.gauge("worker_is_leader", "이 워커가 리더인지", lambda: int(state_mirror.election.is_leader))
+
+async def start_leader_jobs():
+    """한 프로세스에서만 돌아야 하는 작업: 시세 수집, 웹소켓, 규칙 평가, AI 자율 진화, 지갑 저장"""
+    if state_mirror:
+        for poller in (market_poller, matrix_poller, book_poller):
+            poller.passive = False
+        premium_stats.published = None
+        broadcaster.listeners.append(state_mirror.events.append)
+    await asyncio.to_thread(load_rule_engine)
+    task_health.watch("market_poller", market_poller.start())
+    task_health.watch("matrix_poller", matrix_poller.start())
+    if executable_premium.symbols:
+        task_health.watch("book_poller", book_poller.start())
+    if ticker_engine:
+        for venue, task in zip(ticker_engine.venues, ticker_engine.start()):
+            task_health.watch(f"ticker_{venue}", task)
+    task_health.watch("autonomous", asyncio.create_task(autonomous_loop()))
+    if db:
+        task_health.watch("mock_persist", asyncio.create_task(persist_mock_wallets()))
+
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(autonomous_loop())
+    global profiler
+    await load_mock_wallets()
+    if db:
+        db_writes.start()
+        task_health.watch("db_writes", db_writes._task)
+    task_health.watch("loop_lag", loop_lag.start())
+    if os.getenv("PROFILER_ENABLED") == "1":
+        profiler = SamplingProfiler()
+    if state_mirror:
+        # 첫 주기에 리더 잠금을 시도하고, 잡으면 start_leader_jobs 실행 / 못 잡으면 팔로워로 동기화
+        task_health.watch("shared_state", asyncio.create_task(state_mirror.run()))
+    else:
+        await start_leader_jobs()
+    if SERVICE_WARMUP == "background":
+        # startup 이 끝나야 연결을 받기 시작하므로 태스크로 넘기고 바로 반환
+        asyncio.create_task(services.warm(delay=SERVICE_WARMUP_DELAY_SEC))
+    coldstart.mark("ready")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if db:
+        await flush_mock_wallets()
+        await db_writes.stop()
+    if tick_writer:
+        tick_writer.close()
+    if ticker_engine:
+        await ticker_engine.stop()
+    await monitor.aclose()
+    await balance_service.aclose()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 텍스트 형식 지표"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/health")
+async def get_health():
+    """백그라운드 태스크 / 스냅샷 / 이벤트 루프 상태 요약"""
+    return {
+        "pid": os.getpid(),
+        "role": state_mirror.role if state_mirror else "single",
+        "tasks": task_health.status(),
+        "snapshot_age": {"market": market_poller.age(), "matrix": matrix_poller.age(), "book": book_poller.age()},
+        "event_loop_lag_ms": {"last": round(loop_lag.last * 1000, 3), "max": round(loop_lag.max * 1000, 3)},
+        "upstream_fallbacks": monitor.fallbacks,
+        "coldstart": coldstart.phases,
+        "services": services.status()
+    }
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def get_profile(seconds: float = 5, token: str = Depends(authenticate)):
+    """이벤트 루프 스레드 샘플링 결과 (flamegraph collapsed 형식). PROFILER_ENABLED=1 일 때만"""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="PROFILER_ENABLED=1 로 실행하세요")
+    try:
+        return await profiler.profile(min(seconds, 60))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 @app.get("/api/mock-wallet")
-async def get_mock_wallet():
-    if db:
-        res = db.table("mock_wallet").select("*").eq("id", 1).maybe_single().execute()
-        if res.data:
-            return res.data
-        # 데이터가 없으면 초기화
-        initial = {"id": 1, "krw": 10000000, "assets": {}}
-        db.table("mock_wallet").insert(initial).execute()
-        return initial
-    return {"krw": 0, "assets": {}, "message": "DB 미연결"}
+async def get_mock_wallet(request: Request, wallet_id: int = 1):
+    """메모리 지갑 조회 (없으면 초기 자금으로 생성), 체결이 없었으면 304"""
+    await sync_mock_exchange()
+    wallet = mock_exchange.snapshot(wallet_id)
+    return await conditional_json.respond(request, wallet["trades"], lambda: wallet)
+
+@app.get("/api/mock-fills")
+async def get_mock_fills(limit: int = 50):
+    """최근 모의 체결 (평균 체결가, 슬리피지, 수수료)"""
+    await sync_mock_exchange()
+    return {"fills": mock_exchange.fills[-limit:][::-1], "orders": mock_exchange.orders}
 
 @app.post("/api/mock-trade")
 async def mock_trade(order: dict):
-    if not db: return {"status": "error", "message": "DB 미연결"}
-    
-    res = db.table("mock_wallet").select("*").eq("id", 1).single().execute()
-    wallet = res.data
-    
-    market_data = monitor.get_combined_data()
-    current_price = market_data['prices']['upbit']
-    
-    if order['side'] == 'buy':
-        if wallet['krw'] < order['amount_krw']:
-            return {"status": "error", "message": "잔액 부족"}
-        coin_amount = order['amount_krw'] / current_price
-        wallet['krw'] -= order['amount_krw']
-        wallet['assets'][order['symbol']] = wallet['assets'].get(order['symbol'], 0) + coin_amount
-    else: # sell
-        coin_amount = wallet['assets'].get(order['symbol'], 0)
-        if coin_amount <= 0: return {"status": "error", "message": "보유 수량 부족"}
-        wallet['krw'] += coin_amount * current_price
-        wallet['assets'][order['symbol']] = 0
-
-    db.table("mock_wallet").update(wallet).eq("id", 1).execute()
-    return {"status": "success", "wallet": wallet}
+    """업비트 호가를 훑어서 체결 (매수: amount_krw, 매도: qty 또는 전량)"""
+    symbol = order.get('symbol', 'BTC')
+    book, real = await book_cache.get(symbol)
+    if book is None:
+        return {"status": "error", "message": "업비트 호가 조회 실패 - 주문 보류"}
+    async with mock_transaction():
+        result = mock_exchange.place_order(order.get('wallet_id', 1), order['side'], symbol, book,
+                                           amount_krw=order.get('amount_krw'), qty=order.get('qty'))
+    if result['status'] == 'success':
+        result['book'] = "upbit" if real else "synthetic"
+    return result
 
 @app.get("/api/balances")
-async def get_balances():
-    upbit_raw = api_handler.get_upbit_balance()
-    bithumb_raw = api_handler.get_bithumb_balance()
-    
-    # 빗썸 응답 구조 표준화
-    bithumb_balances = []
-    if isinstance(bithumb_raw, list):
-        bithumb_balances = bithumb_raw
-    elif isinstance(bithumb_raw, dict) and 'data' in bithumb_raw:
-        for curr, val in bithumb_raw['data'].items():
-            if curr != 'total_krw':
-                bithumb_balances.append({"currency": curr, "balance": val})
-
-    # API 키가 연동되지 않았을 때의 메시지 처리 (필요시)
-    messages = []
-    if not upbit_raw and (not os.getenv("UPBIT_ACCESS_KEY")):
-        messages.append("업비트 API 키가 설정되지 않았습니다.")
-    if not bithumb_balances and (not os.getenv("BITHUMB_ACCESS_KEY")):
-        messages.append("빗썸 API 키가 설정되지 않았습니다.")
-
-    return {
-        "upbit": upbit_raw,
-        "bithumb": bithumb_balances,
-        "messages": messages
-    }
+async def get_balances(request: Request):
+    # 탭이 여러 개여도 거래소 호출은 BALANCE_CACHE_SEC 당 한 번, 잔고가 그대로면 304
+    balances = await balance_service.get_balances()
+    return await conditional_json.respond(request, balance_service.version, lambda: balances)
 
 @app.get("/", response_class=HTMLResponse)
-async def read_index(token: str = Depends(authenticate)):
-    with open("index.html", "r", encoding="utf-8") as f:
-        return f.read()
+async def read_index(request: Request, token: str = Depends(authenticate)):
+    return pages.response(request, "index.html", "private, no-cache")
 
 @app.get("/manual", response_class=HTMLResponse)
-async def read_manual():
-    with open("manual.html", "r", encoding="utf-8") as f:
-        return f.read()
+async def read_manual(request: Request):
+    return pages.response(request, "manual.html")
+
+if SERVICE_WARMUP == "eager":
+    services.warm_now()
+coldstart.mark("imported")
 
 if __name__ == "__main__":
     import uvicorn
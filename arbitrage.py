@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import numpy as np
+from executable_premium import DEFAULT_FEES
+
+# 거래소 간 차익 경로 탐색. 노드 = (거래소, 자산), 간선 = 거래소 안의 매수/매도 또는 거래소 간 출금.
+# 간선 가중치 = -log(환산 비율) 이라 한 바퀴 가중치 합이 음수면 수익이 나는 순환 (음수 사이클).
+# 원화 기준 환산은 소매 환율 대신 각 국내 거래소의 KRW-USDT 시세를 다리로 사용
+
+VENUES = ("upbit", "bithumb", "binance")
+QUOTES = {"upbit": "KRW", "bithumb": "KRW", "binance": "USDT"}
+PRICE_COLUMNS = {"upbit": "upbit_krw", "bithumb": "bithumb_krw", "binance": "binance_usdt"}
+
+# 출금 수수료(코인 수량)와 대략적인 입금 반영 시간(분). 목록에 없는 코인은 기본값으로 추정
+WITHDRAWAL = {
+    "BTC": (0.0005, 30), "ETH": (0.003, 10), "XRP": (0.4, 2), "USDT": (1.0, 5), "SOL": (0.01, 2),
+    "DOGE": (4.0, 10), "TRX": (1.0, 2), "ADA": (1.0, 10), "XLM": (0.02, 2), "EOS": (0.1, 3)
+}
+DEFAULT_WITHDRAWAL_KRW = 3000   # 목록에 없는 코인의 출금 수수료 추정 (원화 환산)
+DEFAULT_WITHDRAWAL_MIN = 30
+
+
+def withdrawal_table():
+    """ARB_WITHDRAWAL_FILE (JSON {"코인": [수수료 수량, 분]}) 로 기본 표를 덮어씀"""
+    table = dict(WITHDRAWAL)
+    path = os.getenv("ARB_WITHDRAWAL_FILE")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            table.update({k.upper(): tuple(v) for k, v in json.load(f).items()})
+    return table
+
+
+class ArbitrageGraph:
+    """심볼 목록이 바뀌거나 시세가 없던 (거래소, 코인)이 살아날 때만 그래프 구조(노드/간선)를 다시 만들고, 시세 갱신 때는
+    간선 비율을 한 번에 계산해서 값이 바뀐 간선만 가중치를 고침. 바뀐 간선이 없으면 탐색도 생략"""
+
+    def __init__(self, fees=None, notional_krw=10_000_000, half_spread_bps=5.0, max_legs=6,
+                 min_profit_pct=0.0, withdrawal=None, top=30):
+        self.fees = {**DEFAULT_FEES, **(fees or {})}
+        self.notional_krw = notional_krw          # 출금 수수료(고정 수량)를 비율로 바꿀 기준 금액
+        self.half_spread = half_spread_bps / 1e4  # 최근 체결가 → 매수/매도 호가 근사
+        self.max_legs = max_legs                  # 탐색할 순환 최대 길이 (간선 수)
+        self.min_profit_pct = min_profit_pct
+        self.withdrawal = withdrawal if withdrawal is not None else withdrawal_table()
+        self.top = top
+        self.symbols = None
+        self.version = 0
+        self.result = None
+        self.counters = {"updates": 0, "dirty_edges": 0, "searches": 0, "skipped": 0}
+
+    # ---------------- 그래프 구조 ----------------
+
+    def _build(self, symbols, prices):
+        """노드/간선 배열 생성. 간선 비율은 (종류, 가격 인덱스, 상수) 로 표현해서 갱신 때 벡터 계산"""
+        n = len(symbols)
+        nodes, index = [], {}
+
+        def node(venue, asset):
+            key = (venue, asset)
+            if key not in index:
+                index[key] = len(nodes)
+                nodes.append(key)
+            return index[key]
+
+        src, dst, kind, ref, const, minutes = [], [], [], [], [], []
+
+        def edge(a, b, k, r, c, m=0.0):
+            src.append(a), dst.append(b), kind.append(k), ref.append(r), const.append(c), minutes.append(m)
+
+        for v, venue in enumerate(VENUES):
+            fee = self.fees[venue]
+            quote = node(venue, QUOTES[venue])
+            for i, symbol in enumerate(symbols):
+                if symbol == QUOTES[venue] or np.isnan(prices[v, i]):
+                    continue
+                asset = node(venue, symbol)
+                edge(quote, asset, 0, v * n + i, 1 - fee)   # 매수: (1-수수료) / 매도호가
+                edge(asset, quote, 1, v * n + i, 1 - fee)   # 매도: 매수호가 × (1-수수료)
+        for i, symbol in enumerate(symbols):
+            fee_qty, mins = self.withdrawal.get(symbol, (None, DEFAULT_WITHDRAWAL_MIN))
+            for a in VENUES:
+                for b in VENUES:
+                    if a != b and (a, symbol) in index and (b, symbol) in index:
+                        # 출금: 1 - 수수료 수량 × 원화 가격 / 기준 금액 (수수료를 모르면 원화 고정값으로 추정)
+                        edge(index[(a, symbol)], index[(b, symbol)], 2, i,
+                             fee_qty if fee_qty is not None else -DEFAULT_WITHDRAWAL_KRW, mins)
+
+        self.symbols = list(symbols)
+        self.listed = ~np.isnan(prices)  # 간선을 만든 (거래소, 코인) - 시세가 없던 곳이 살아나면 다시 구성
+        self.nodes, self.index = nodes, index
+        self.src, self.dst = np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64)
+        self.kind, self.ref = np.array(kind, dtype=np.int8), np.array(ref, dtype=np.int64)
+        self.const, self.minutes = np.array(const, dtype=np.float64), np.array(minutes, dtype=np.float64)
+        self.rates = np.full(len(src), np.nan)
+        self.weights = np.full(len(src), np.inf)
+        self.roots = [index[(venue, "KRW")] for venue in VENUES if QUOTES[venue] == "KRW" and (venue, "KRW") in index]
+
+    def _rates(self, prices, usdt_krw):
+        """모든 간선의 현재 환산 비율 (시세가 없으면 NaN → 간선 비활성)"""
+        flat = prices.ravel()
+        px = flat[self.ref]
+        rates = np.empty(len(self.kind))
+        buy, sell, transfer = self.kind == 0, self.kind == 1, self.kind == 2
+        rates[buy] = self.const[buy] / (px[buy] * (1 + self.half_spread))
+        rates[sell] = px[sell] * (1 - self.half_spread) * self.const[sell]
+        # 코인별 원화 기준가: 업비트 → 빗썸 → 바이낸스 × USDT 원화 시세 순으로 있는 것
+        krw_ref = np.where(np.isnan(prices[0]), prices[1], prices[0])
+        krw_ref = np.where(np.isnan(krw_ref), prices[2] * usdt_krw, krw_ref)
+        c = self.const[transfer]
+        fee_krw = np.where(c >= 0, c * krw_ref[self.ref[transfer]], -c)
+        rates[transfer] = 1 - fee_krw / self.notional_krw
+        rates[~(rates > 0)] = np.nan
+        return rates
+
+    # ---------------- 갱신 / 탐색 ----------------
+
+    def update(self, matrix):
+        """김프 매트릭스(PremiumMatrix.refresh 결과) 한 번 → 바뀐 간선만 반영 후 필요하면 재탐색"""
+        started = time.perf_counter()
+        self.counters["updates"] += 1
+        symbols = matrix["symbols"]
+        prices = np.vstack([np.asarray(matrix[PRICE_COLUMNS[venue]], dtype=np.float64) for venue in VENUES])
+        if self.symbols != list(symbols) or (~np.isnan(prices) & ~self.listed).any():
+            self._build(symbols, prices)
+        usdt = self.symbols.index("USDT") if "USDT" in self.symbols else None
+        usdt_krw = np.nanmean(prices[:2, usdt]) if usdt is not None and not np.isnan(prices[:2, usdt]).all() else np.nan
+        rates = self._rates(prices, usdt_krw)
+        dirty = np.flatnonzero(~((rates == self.rates) | (np.isnan(rates) & np.isnan(self.rates))))
+        self.counters["dirty_edges"] += len(dirty)
+        if len(dirty) == 0 and self.result is not None:
+            self.counters["skipped"] += 1
+            return False
+        self.rates[dirty] = rates[dirty]
+        r = rates[dirty]
+        self.weights[dirty] = np.where(np.isnan(r), np.inf, -np.log(np.where(np.isnan(r), 1.0, r)))
+        opportunities = self.search()
+        self.result = {
+            "opportunities": opportunities,
+            "bridge": {
+                venue: None if usdt is None or np.isnan(prices[v, usdt]) else float(prices[v, usdt])
+                for v, venue in enumerate(VENUES[:2])
+            },
+            "fx_rate": matrix.get("fx_rate"),
+            "assets": len(self.symbols),
+            "nodes": len(self.nodes),
+            "edges": len(self.src),
+            "dirty_edges": len(dirty),
+            "compute_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+        fx = matrix.get("fx_rate")
+        self.result["usdt_premium"] = {
+            venue: None if px is None or not fx else round((px / fx - 1) * 100, 3)
+            for venue, px in self.result["bridge"].items()
+        }
+        self.version += 1
+        return True
+
+    def _layers(self, root, forward):
+        """root 에서 나가는(forward) / root 로 들어오는 정확히 k 개 간선 경로의 최소 가중치와 직전 간선 (k=0..max_legs).
+        간선 전체를 한 번에 완화하는 벡터화 Bellman-Ford"""
+        count = len(self.nodes)
+        frm, to = (self.src, self.dst) if forward else (self.dst, self.src)
+        dist = np.full((self.max_legs + 1, count), np.inf)
+        via = np.full((self.max_legs + 1, count), -1, dtype=np.int64)
+        dist[0, root] = 0.0
+        for k in range(1, self.max_legs + 1):
+            cand = dist[k - 1][frm] + self.weights
+            np.minimum.at(dist[k], to, cand)
+            hit = np.flatnonzero(np.isfinite(cand) & (cand == dist[k][to]))
+            via[k][to[hit]] = hit
+        return dist, via
+
+    def _path(self, via, k, node, forward):
+        """층별 직전 간선을 따라 경로 복원 → 간선 인덱스 목록 (root → node 또는 node → root 순서)"""
+        edges = []
+        for layer in range(k, 0, -1):
+            e = via[layer][node]
+            edges.append(e)
+            node = self.src[e] if forward else self.dst[e]
+        return edges[::-1] if forward else edges
+
+    def search(self):
+        """국내 원화 노드마다 정방향/역방향 층별 탐색 후, 노드별로 '가는 길 + 돌아오는 길' 이 음수인 순환을 모아 수익순 정렬"""
+        self.counters["searches"] += 1
+        threshold = -np.log1p(self.min_profit_pct / 100)
+        found = {}
+        for root in self.roots:
+            fwd, fwd_via = self._layers(root, True)
+            bwd, bwd_via = self._layers(root, False)
+            best = np.full(len(self.nodes), np.inf)
+            split = np.zeros((len(self.nodes), 2), dtype=np.int64)
+            for k1 in range(1, self.max_legs):
+                for k2 in range(1, self.max_legs - k1 + 1):
+                    total = fwd[k1] + bwd[k2]
+                    better = total < best
+                    best[better] = total[better]
+                    split[better] = (k1, k2)
+            for node in np.flatnonzero(best < threshold).tolist():
+                k1, k2 = split[node]
+                edges = self._path(fwd_via, k1, node, True) + self._path(bwd_via, k2, node, False)
+                visited = [self.src[e] for e in edges]
+                if len(set(visited)) != len(visited):
+                    continue  # 같은 노드를 두 번 지나는 경로는 더 짧은 순환으로 따로 잡힘
+                key = tuple(sorted(edges))
+                if key not in found:
+                    found[key] = (best[node], edges)
+        ranked = sorted(found.values(), key=lambda item: item[0])[:self.top]
+        return [self._describe(weight, edges) for weight, edges in ranked]
+
+    def _describe(self, weight, edges):
+        kinds = ("buy", "sell", "transfer")
+        legs = []
+        for e in edges:
+            (va, a), (vb, b) = self.nodes[self.src[e]], self.nodes[self.dst[e]]
+            leg = {"kind": kinds[self.kind[e]], "from": f"{va}:{a}", "to": f"{vb}:{b}", "rate": float(self.rates[e])}
+            if self.kind[e] == 2:
+                leg["minutes"] = float(self.minutes[e])
+                leg["fee_estimated"] = bool(self.const[e] < 0)
+            legs.append(leg)
+        assets = sorted({self.nodes[self.dst[e]][1] for e in edges} - {"KRW", "USDT"})
+        return {
+            "profit_pct": round(float(np.expm1(-weight)) * 100, 4),
+            "route": " → ".join([legs[0]["from"]] + [leg["to"] for leg in legs]),
+            "assets": assets,
+            "legs": legs,
+            "transfer_minutes": sum(leg.get("minutes", 0) for leg in legs),
+            "fee_estimated": any(leg.get("fee_estimated") for leg in legs)
+        }
+
+    def payload(self, limit=None, max_minutes=None):
+        if self.result is None:
+            return None
+        opportunities = self.result["opportunities"]
+        if max_minutes is not None:
+            opportunities = [o for o in opportunities if o["transfer_minutes"] <= max_minutes]
+        return {**self.result, "opportunities": opportunities[:limit] if limit else opportunities}
+
+
+def arbitrage_from_env():
+    """ARB_NOTIONAL_KRW / ARB_HALF_SPREAD_BPS / ARB_MAX_LEGS / ARB_MIN_PROFIT_PCT / FEE_* 환경변수로 설정"""
+    fees = {venue: float(os.getenv(f"FEE_{venue.upper()}")) for venue in DEFAULT_FEES if os.getenv(f"FEE_{venue.upper()}")}
+    return ArbitrageGraph(
+        fees,
+        float(os.getenv("ARB_NOTIONAL_KRW", "10000000")),
+        float(os.getenv("ARB_HALF_SPREAD_BPS", "5")),
+        int(os.getenv("ARB_MAX_LEGS", "6")),
+        float(os.getenv("ARB_MIN_PROFIT_PCT", "0"))
+    )
+
+
+def synthetic_matrix(assets=300, seed=7, fx_rate=1400.0):
+    """벤치마크용 가짜 매트릭스: 코인마다 김프가 조금씩 다르고 일부 거래소에는 상장되지 않음"""
+    rng = np.random.default_rng(seed)
+    symbols = ["USDT"] + [f"C{i}" for i in range(assets - 1)]
+    usd = np.r_[1.0, rng.lognormal(0, 2, assets - 1)]
+    premium = 1 + rng.normal(0.02, 0.01, (2, assets))
+    domestic = usd * fx_rate * premium
+    domestic[rng.random((2, assets)) < 0.2] = np.nan
+    binance = usd.copy()
+    binance[0] = np.nan
+    binance[rng.random(assets) < 0.3] = np.nan
+    return {"symbols": symbols, "upbit_krw": domestic[0], "bithumb_krw": domestic[1], "binance_usdt": binance,
+            "fx_rate": fx_rate}
+
+
+def bench(assets=400, updates=20, seed=7):
+    graph = ArbitrageGraph(withdrawal={})
+    matrix = synthetic_matrix(assets, seed)
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    graph.update(matrix)
+    first = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for _ in range(updates):
+        moved = rng.random(assets) < 0.1  # 한 번에 10% 종목만 움직임
+        matrix["upbit_krw"] = np.where(moved, matrix["upbit_krw"] * (1 + rng.normal(0, 0.002, assets)), matrix["upbit_krw"])
+        graph.update(matrix)
+    per_update = (time.perf_counter() - started) * 1000 / updates
+    graph.update(matrix)  # 변화 없음 → 탐색 생략
+    result = graph.result
+    print(f"코인 {assets}개: 노드 {result['nodes']} / 간선 {result['edges']}, 첫 계산 {first:.1f}ms, "
+          f"갱신당 {per_update:.1f}ms, 수익 순환 {len(result['opportunities'])}개, 생략 {graph.counters['skipped']}회")
+    for o in result["opportunities"][:3]:
+        print(f"  {o['profit_pct']:+.3f}%  {o['route']}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,477 @@
+import os
+import re
+import sys
+import time
+import json
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# rules.json 규칙 → 백테스트 가능한 파라미터 전략
+# threshold: entry_below=True면 김프가 entry 아래에서 진입/exit 위에서 청산 (저김프 매수)
+#            entry_below=False면 entry 위에서 진입/exit 아래에서 청산 (추세 추종 + 손절)
+# pyramid:   level 아래에서 step마다 1단위씩 최대 max_units까지 추가, exit 위에서 전량 청산
+# spread:    업비트-빗썸 차이가 entry 이상이면 (빗썸 매수/업비트 매도) 진입, exit 이하에서 청산
+RULE_PRESETS = {
+    "rule_1": ("threshold", {"entry": 1.0, "exit": 3.0, "entry_below": True}),
+    "rule_2": ("threshold", {"entry": 0.0, "exit": 2.0, "entry_below": True}),
+    "rule_3": ("spread", {"entry": 0.5, "exit": 0.1}),
+    "rule_9": ("threshold", {"entry": 2.0, "exit": 5.0, "entry_below": True}),
+    "rule_10": ("pyramid", {"level": 2.5, "step": 0.5, "max_units": 4, "exit": 4.0}),
+    "rule_18": ("threshold", {"entry": 2.0, "exit": 1.0, "entry_below": False})
+}
+
+# 왕복 비용 (% 포인트): 국내 매수 0.05 + 바이낸스 헷지 0.1, 청산 시 동일
+DEFAULT_FEE = 0.15
+
+
+# ---- 기준 구현: 전체 시계열 벡터 연산 (검증용) ----
+def latch(enter, leave):
+    """진입/청산 신호 → 상태 유지 포지션 (마지막 신호가 진입이면 1). 루프 없이 누적 최대 인덱스로 계산"""
+    events = enter | leave
+    last = np.where(events, np.arange(len(events), dtype=np.int64), -1)
+    np.maximum.accumulate(last, out=last)
+    position = enter[last].astype(np.float64)
+    position[last < 0] = 0.0
+    return position
+
+
+def threshold_position(premium, entry, exit, entry_below=True):
+    if entry_below:
+        return latch(premium < entry, premium > exit)
+    return latch(premium > entry, premium < exit)
+
+
+def pyramid_position(premium, level, step, max_units, exit):
+    """레벨 아래로 내려갈수록 단위 추가, 한 번 늘린 물량은 청산 전까지 유지"""
+    target = np.clip(np.floor((level - premium) / step) + 1, 0, max_units)
+    exits = premium > exit
+    episode = np.cumsum(exits)
+    # 청산 구간마다 누적 최대값을 다시 시작하기 위해 episode 오프셋을 더해 한 번에 accumulate
+    offset = episode * (max_units + 1)
+    held = np.maximum.accumulate(np.where(exits, 0, target) + offset) - offset
+    return np.where(exits, 0.0, held).astype(np.float64)
+
+
+def evaluate(series, position, fee=DEFAULT_FEE, sign=1.0):
+    """포지션 시계열 → 수익률/MDD/거래 횟수 (단위: 김프 % 포인트)"""
+    position = position * sign
+    pnl = np.zeros(len(series))
+    pnl[1:] = position[:-1] * np.diff(series)
+    pnl -= np.abs(np.diff(position, prepend=0.0)) * fee / 2
+    equity = np.cumsum(pnl)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    held = position != 0
+    return {
+        "return_pct": float(equity[-1]) if len(equity) else 0.0,
+        "max_drawdown_pct": float(drawdown.max()) if len(drawdown) else 0.0,
+        "trades": int(np.count_nonzero(held[1:] & ~held[:-1]) + (held[0] if len(held) else 0)),
+        "exposure": float(np.count_nonzero(held) / len(held)) if len(held) else 0.0
+    }
+
+
+# ---- 고속 경로: 블록 인덱스 + 거래 단위 계산 ----
+def _fold(maxs, mins, mdds, mrus):
+    """시간순 구간 통계들을 하나로 합침 (최대/최소/최대 낙폭/최대 상승폭)"""
+    mdd, mru = mdds.max(), mrus.max()
+    if len(maxs) > 1:
+        mdd = max(mdd, (np.maximum.accumulate(maxs)[:-1] - mins[1:]).max())
+        mru = max(mru, (maxs[1:] - np.minimum.accumulate(mins)[:-1]).max())
+    return maxs.max(), mins.min(), mdd, mru
+
+
+def _stats(x):
+    """원소 구간 직접 계산"""
+    return (x.max(), x.min(),
+            (np.maximum.accumulate(x) - x).max(),
+            (x - np.minimum.accumulate(x)).max())
+
+
+class SeriesIndex:
+    """시계열을 블록 / 슈퍼블록 통계로 한 번 전처리해 두고, 파라미터마다 전체를 다시 훑지 않고
+    '다음 임계 돌파 지점'과 '구간 최대/최소/낙폭'만 질의"""
+
+    def __init__(self, series, block=1024, fanout=64):
+        self.s = np.ascontiguousarray(series, dtype=np.float64)
+        self.n = len(self.s)
+        self.block = block
+        self.fanout = fanout
+        self.blocks = self._level_stats(self.s, block)
+        self.supers = self._fold_level(self.blocks, fanout)
+
+    @staticmethod
+    def _level_stats(s, size):
+        nb = -(-len(s) // size)
+        padded = np.empty(nb * size)
+        padded[:len(s)] = s
+        # 끝 블록 패딩은 마지막 값으로 채워 통계에 영향이 없도록 함
+        padded[len(s):] = s[-1]
+        x = padded.reshape(nb, size)
+        return (x.max(1), x.min(1),
+                (np.maximum.accumulate(x, 1) - x).max(1),
+                (x - np.minimum.accumulate(x, 1)).max(1))
+
+    @staticmethod
+    def _fold_level(level, fanout):
+        nb = -(-len(level[0]) // fanout)
+        out = [np.empty(nb) for _ in range(4)]
+        for i in range(nb):
+            sl = slice(i * fanout, (i + 1) * fanout)
+            for k, v in enumerate(_fold(*(arr[sl] for arr in level))):
+                out[k][i] = v
+        return tuple(out)
+
+    def range_stats(self, a, b):
+        """[a, b] 구간 (최대, 최소, 최대 낙폭, 최대 상승폭)"""
+        B, F = self.block, self.fanout
+        if b - a < 2 * B:
+            return _stats(self.s[a:b + 1])
+        pieces = []
+        b0, b1 = -(-a // B), (b + 1) // B   # 완전히 포함되는 블록 [b0, b1)
+        if a < b0 * B:
+            pieces.append(_stats(self.s[a:b0 * B]))
+        if b1 - b0 <= 2 * F:
+            pieces.append(_fold(*(arr[b0:b1] for arr in self.blocks)))
+        else:
+            s0, s1 = -(-b0 // F), b1 // F
+            if b0 < s0 * F:
+                pieces.append(_fold(*(arr[b0:s0 * F] for arr in self.blocks)))
+            pieces.append(_fold(*(arr[s0:s1] for arr in self.supers)))
+            if s1 * F < b1:
+                pieces.append(_fold(*(arr[s1 * F:b1] for arr in self.blocks)))
+        if b1 * B <= b:
+            pieces.append(_stats(self.s[b1 * B:b + 1]))
+        return _fold(*(np.array(col) for col in zip(*pieces)))
+
+    def next_below(self, start, thr):
+        """start 이후 s < thr 인 첫 인덱스 (없으면 None)"""
+        return self._next(start, lambda x: x < thr, key=1)
+
+    def next_above(self, start, thr):
+        """start 이후 s > thr 인 첫 인덱스 (없으면 None)"""
+        return self._next(start, lambda x: x > thr, key=0)
+
+    def _next(self, start, hit, key):
+        """key: 블록 최대값(0) / 최소값(1)으로 조건이 불가능한 블록을 건너뜀"""
+        if start >= self.n:
+            return None
+        B, F = self.block, self.fanout
+        # 1) 시작 블록 안
+        found = np.flatnonzero(hit(self.s[start:(start // B + 1) * B]))
+        if len(found):
+            return start + int(found[0])
+        blk = start // B + 1
+        nblocks = len(self.blocks[0])
+        if blk >= nblocks:
+            return None
+        # 2) 같은 슈퍼블록의 나머지 블록
+        found = np.flatnonzero(hit(self.blocks[key][blk:min((blk // F + 1) * F, nblocks)]))
+        if not len(found):
+            # 3) 이후 슈퍼블록 → 그 안의 블록
+            sb = blk // F + 1
+            found_sb = np.flatnonzero(hit(self.supers[key][sb:]))
+            if not len(found_sb):
+                return None
+            blk = (sb + int(found_sb[0])) * F
+            found = np.flatnonzero(hit(self.blocks[key][blk:blk + F]))
+        blk += int(found[0])
+        found = np.flatnonzero(hit(self.s[blk * B:(blk + 1) * B]))
+        return blk * B + int(found[0])
+
+
+def threshold_changes(index, entry, exit, entry_below=True):
+    """latch() 와 같은 결과를 포지션 변경 지점 [(인덱스, 새 포지션)] 으로만 계산"""
+    # 진입/청산 조건이 동시에 참이면 진입 우선 → 청산은 '청산이면서 진입 아님'으로 임계값 조정
+    if entry_below:
+        enter = lambda i: index.next_below(i, entry)
+        leave = lambda i: index.next_above(i, max(exit, np.nextafter(entry, -np.inf)))
+    else:
+        enter = lambda i: index.next_above(i, entry)
+        leave = lambda i: index.next_below(i, min(exit, np.nextafter(entry, np.inf)))
+    changes = []
+    i = enter(0)
+    while i is not None:
+        changes.append((i, 1.0))
+        j = leave(i + 1)
+        if j is None:
+            break
+        changes.append((j, 0.0))
+        i = enter(j + 1)
+    return changes
+
+
+def pyramid_changes(index, level, step, max_units, exit):
+    """pyramid_position() 과 같은 결과를 변경 지점으로만 계산"""
+    def units_at(i):
+        return int(np.clip(np.floor((level - index.s[i]) / step) + 1, 0, max_units))
+
+    def next_units(start, k):
+        # 목표 단위 >= k 이면서 청산 조건이 아닌 첫 지점: s <= min(level-(k-1)*step, exit)
+        return index.next_below(start, np.nextafter(min(level - (k - 1) * step, exit), np.inf))
+
+    changes = []
+    i = next_units(0, 1)
+    while i is not None:
+        units = units_at(i)
+        changes.append((i, float(units)))
+        exit_at = index.next_above(i + 1, exit)
+        while units < max_units:
+            j = next_units(i + 1, units + 1)
+            if j is None or (exit_at is not None and j >= exit_at):
+                break
+            i, units = j, units_at(j)
+            changes.append((i, float(units)))
+        if exit_at is None:
+            break
+        changes.append((exit_at, 0.0))
+        i = next_units(exit_at + 1, 1)
+    return changes
+
+
+def evaluate_changes(index, changes, fee=DEFAULT_FEE, sign=1.0):
+    """변경 지점 목록 → evaluate() 와 같은 지표. 보유 구간마다 블록 통계 질의 한 번"""
+    s, n = index.s, index.n
+    equity, peak, mdd = 0.0, 0.0, 0.0
+    position, trades, held = 0.0, 0, 0
+    for k, (i, new) in enumerate(changes):
+        new *= sign
+        equity -= abs(new - position) * fee / 2
+        mdd = max(mdd, peak - equity)
+        peak = max(peak, equity)
+        if new and not position:
+            trades += 1
+        position = new
+        if not position:
+            continue
+        last = k + 1 == len(changes)
+        end = n - 1 if last else changes[k + 1][0]
+        held += n - i if last else end - i
+        base = equity - position * s[i]
+        # 다음 변경 지점의 값은 수수료를 뺀 뒤 다음 반복에서 반영
+        hi, lo, dd, du = index.range_stats(i, end if last else end - 1)
+        if position > 0:
+            top, bottom, seg_dd = position * hi, position * lo, position * dd
+        else:
+            top, bottom, seg_dd = position * lo, position * hi, -position * du
+        mdd = max(mdd, seg_dd, peak - (base + bottom))
+        peak = max(peak, base + top)
+        equity = base + position * s[end]
+    return {
+        "return_pct": float(equity),
+        "max_drawdown_pct": float(mdd),
+        "trades": trades,
+        "exposure": held / n if n else 0.0
+    }
+
+
+def run_strategy(strategy, params, indexes, fee=DEFAULT_FEE):
+    """indexes: {"premium_up": SeriesIndex, "gap": SeriesIndex}"""
+    if strategy == "threshold":
+        index = indexes["premium_up"]
+        return evaluate_changes(index, threshold_changes(index, **params), fee)
+    if strategy == "pyramid":
+        index = indexes["premium_up"]
+        return evaluate_changes(index, pyramid_changes(index, **params), fee)
+    if strategy == "spread":
+        # 빗썸 매수/업비트 매도 포지션은 차이가 줄어들 때 이익
+        index = indexes["gap"]
+        changes = threshold_changes(index, params["entry"], params["exit"], entry_below=False)
+        return evaluate_changes(index, changes, fee, sign=-1.0)
+    raise ValueError(f"알 수 없는 전략: {strategy}")
+
+
+def run_strategy_dense(strategy, params, premium_up, gap, fee=DEFAULT_FEE):
+    """기준 구현 (검증용)"""
+    if strategy == "threshold":
+        return evaluate(premium_up, threshold_position(premium_up, **params), fee)
+    if strategy == "pyramid":
+        return evaluate(premium_up, pyramid_position(premium_up, **params), fee)
+    if strategy == "spread":
+        return evaluate(gap, threshold_position(gap, params["entry"], params["exit"], entry_below=False), fee, sign=-1.0)
+    raise ValueError(f"알 수 없는 전략: {strategy}")
+
+
+def preset_for_rule(rule):
+    """rules.json id 또는 규칙명 안의 수치로 백테스트 전략 추정 (없으면 None)"""
+    if rule.get("id") in RULE_PRESETS:
+        return RULE_PRESETS[rule["id"]]
+    name = rule.get("name", "")
+    numbers = [float(n) for n in re.findall(r"(-?\d+(?:\.\d+)?)\s*%", name)]
+    if "빗썸" in name and "업비트" in name and numbers:
+        return "spread", {"entry": numbers[0], "exit": numbers[0] / 5}
+    if "김프" in name and len(numbers) >= 2:
+        return "threshold", {"entry": numbers[0], "exit": numbers[1], "entry_below": numbers[0] < numbers[1]}
+    return None
+
+
+def format_status(result):
+    """trading_rules.status 에 기록할 문구"""
+    return f"수익률: {result['return_pct']:+.2f}% | MDD {result['max_drawdown_pct']:.2f}% | 거래 {result['trades']}회"
+
+
+# ---- 병렬 파라미터 스윕 (워커마다 시계열을 한 번만 전달·전처리) ----
+_indexes = {}
+
+
+def _init_worker(premium_up, gap, fee):
+    _indexes["premium_up"] = SeriesIndex(premium_up)
+    _indexes["gap"] = SeriesIndex(gap)
+    _indexes["fee"] = fee
+
+
+def _run_chunk(chunk):
+    return [(params, run_strategy(strategy, params, _indexes, _indexes["fee"])) for strategy, params in chunk]
+
+
+def expand_grid(grid):
+    """{"entry": [..], "exit": [..]} → 파라미터 dict 목록"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def sweep(strategy, grid, premium_up, gap, fee=DEFAULT_FEE, workers=None, chunk_size=32, sort_by="return_pct"):
+    """파라미터 격자 전체를 프로세스 풀로 나눠 실행, 결과는 sort_by 내림차순"""
+    jobs = [(strategy, params) for params in expand_grid(grid)]
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(premium_up, gap, fee)) as pool:
+        for part in pool.map(_run_chunk, chunks):
+            results.extend(part)
+    results.sort(key=lambda r: r[1][sort_by], reverse=True)
+    return results
+
+
+# ---- 데이터 ----
+def load_series(store, since, until=None, symbol="BTC"):
+    """틱 저장소에서 (ts, 업비트 김프, 업비트-빗썸 차이) 배열 로드"""
+    records = store.range(since, until, symbol)
+    premium_up = np.asarray(records["premium_up"], dtype=np.float64)
+    premium_bithumb = np.asarray(records["premium_bithumb"], dtype=np.float64)
+    valid = ~np.isnan(premium_up) & ~np.isnan(premium_bithumb)
+    return np.asarray(records["ts"])[valid], premium_up[valid], (premium_up - premium_bithumb)[valid]
+
+
+def ar1(shocks, phi, start=0.0, chunk=4096):
+    """x[t] = phi * x[t-1] + shocks[t] 를 청크 단위 누적합으로 계산 (파이썬 루프는 청크 수만큼)"""
+    out = np.empty_like(shocks)
+    powers = phi ** np.arange(chunk)
+    prev = start
+    for i in range(0, len(shocks), chunk):
+        s = shocks[i:i + chunk]
+        p = powers[:len(s)]
+        # x[k] = phi^k * (phi * prev + sum_{j<=k} s[j] / phi^j)
+        out[i:i + len(s)] = p * (phi * prev + np.cumsum(s / p))
+        prev = out[i + len(s) - 1]
+    return out
+
+
+def synthetic_series(days=365, interval=5.0, seed=7):
+    """오프라인 측정용 평균회귀 김프/스프레드 시계열"""
+    rng = np.random.default_rng(seed)
+    n = int(days * 86400 / interval)
+    ts = time.time() - n * interval + np.arange(n) * interval
+    # 김프: 평균 2.5%, 반감기 6시간 / 업비트-빗썸 차이: 평균 0.1%, 반감기 10분
+    premium_up = 2.5 + ar1(rng.normal(0, 0.03, n), 0.5 ** (interval / (6 * 3600)))
+    gap = 0.1 + ar1(rng.normal(0, 0.02, n), 0.5 ** (interval / 600))
+    return ts, premium_up, gap
+
+
+def backtest_rules(rules, premium_up, gap, fee=DEFAULT_FEE):
+    """규칙 목록 각각에 대해 프리셋 전략 실행 → {규칙명: 결과 또는 None}"""
+    indexes = {"premium_up": SeriesIndex(premium_up), "gap": SeriesIndex(gap)}
+    results = {}
+    for rule in rules:
+        preset = preset_for_rule(rule)
+        results[rule["name"]] = run_strategy(preset[0], preset[1], indexes, fee) if preset else None
+    return results
+
+
+def update_rule_statuses(db, results):
+    """백테스트 결과를 trading_rules.status 에 반영"""
+    for name, result in results.items():
+        if result is not None:
+            db.table("trading_rules").update({"status": format_status(result)}).eq("name", name).execute()
+
+
+# 스윕 기본 격자: 진입 -1~3% (0.1 간격) x 청산 1~6% (0.2 간격) = 1000개 조합
+DEFAULT_GRID = {
+    "entry": [round(x, 2) for x in np.arange(-1.0, 3.0, 0.1)],
+    "exit": [round(x, 2) for x in np.arange(1.0, 6.0, 0.2)],
+    "entry_below": [True]
+}
+
+
+def verify(premium_up, gap, trials=200, seed=1):
+    """고속 경로와 기준 구현의 결과가 같은지 무작위 파라미터로 확인 → 최대 오차"""
+    rng = np.random.default_rng(seed)
+    # 작은 블록으로 블록/슈퍼블록 경계 처리까지 확인
+    indexes = {"premium_up": SeriesIndex(premium_up, block=64, fanout=8), "gap": SeriesIndex(gap, block=64, fanout=8)}
+    worst = 0.0
+    for _ in range(trials):
+        kind = str(rng.choice(["threshold", "pyramid", "spread"]))
+        if kind == "threshold":
+            params = {"entry": rng.uniform(0, 4), "exit": rng.uniform(0, 5), "entry_below": bool(rng.integers(2))}
+        elif kind == "pyramid":
+            params = {"level": rng.uniform(1.5, 3), "step": rng.uniform(0.1, 0.6),
+                      "max_units": int(rng.integers(1, 5)), "exit": rng.uniform(2.5, 4.5)}
+        else:
+            params = {"entry": rng.uniform(0.2, 0.6), "exit": rng.uniform(-0.2, 0.2)}
+        fast = run_strategy(kind, params, indexes)
+        dense = run_strategy_dense(kind, params, premium_up, gap)
+        if fast["trades"] != dense["trades"]:
+            raise AssertionError(f"{kind} {params}: 거래 횟수 불일치 {fast} != {dense}")
+        for key in ("return_pct", "max_drawdown_pct", "exposure"):
+            worst = max(worst, abs(fast[key] - dense[key]))
+    return worst
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="김프 규칙 백테스트 / 파라미터 스윕")
+    parser.add_argument("command", choices=["rules", "sweep", "verify"])
+    parser.add_argument("--days", type=float, default=7, help="틱 저장소에서 불러올 최근 일수")
+    parser.add_argument("--synthetic", type=float, metavar="DAYS", help="저장소 대신 합성 데이터 사용 (일수)")
+    parser.add_argument("--fee", type=float, default=DEFAULT_FEE, help="왕복 수수료 (%% 포인트)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--update-db", action="store_true", help="결과를 trading_rules.status 에 기록")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        ts, premium_up, gap = synthetic_series(args.synthetic)
+    else:
+        from tick_store import TickStore, store_dir_from_env
+        ts, premium_up, gap = load_series(TickStore(store_dir_from_env()), time.time() - args.days * 86400)
+    if len(ts) < 2:
+        print("백테스트할 데이터가 없습니다. (--synthetic 로 합성 데이터 사용 가능)")
+        return
+    print(f"데이터: {len(ts):,}개 ({(ts[-1] - ts[0]) / 86400:.1f}일)")
+
+    if args.command == "verify":
+        print(f"기준 구현 대비 최대 오차: {verify(premium_up, gap):.2e}")
+        return
+
+    if args.command == "sweep":
+        grid_size = len(expand_grid(DEFAULT_GRID))
+        started = time.perf_counter()
+        results = sweep("threshold", DEFAULT_GRID, premium_up, gap, args.fee, args.workers)
+        print(f"{grid_size}개 조합 / {time.perf_counter() - started:.1f}초")
+        for params, result in results[:args.top]:
+            print(f"  진입 {params['entry']:+.1f}% 청산 {params['exit']:.1f}% → {format_status(result)}")
+        return
+
+    with open("rules.json", "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    results = backtest_rules(rules, premium_up, gap, args.fee)
+    for name, result in results.items():
+        print(f"{name}: {format_status(result) if result else '백테스트 불가 (가격 조건 없음)'}")
+    if args.update_db:
+        from dotenv import load_dotenv
+        from supabase import create_client
+        load_dotenv()
+        update_rule_statuses(create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY")), results)
+        print("trading_rules 상태 갱신 완료")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
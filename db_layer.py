@@ -0,0 +1,253 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+
+# DB 접근 계층: 요청 경로에서는 큐에 넣기만 하고 (write-behind) 실제 insert 는 백그라운드에서 묶어서 실행.
+# trading_rules 목록은 읽기 캐시에서 바로 응답하고, 로컬에서 쓴 행은 DB 반영 전이라도 캐시에 합쳐서 보여줌
+
+
+def utc_now():
+    """DB 의 now() 대신 요청 시각을 바로 기록 (큐에서 기다리는 동안 시각이 밀리지 않도록)"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class WriteQueue:
+    """테이블별 insert 를 모아서 batch_size 개 또는 interval 초마다 한 번에 저장.
+    큐가 max_size 만큼 차면 put 이 기다림 (메모리 무한 증가 대신 요청 쪽으로 역압력)"""
+
+    def __init__(self, db, max_size=1000, batch_size=100, interval=0.5, retries=3):
+        self.db = db
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retries = retries
+        self.pending = {}   # table -> DB 반영 전 행 목록 (읽기 캐시가 합쳐서 보여줌)
+        self.listeners = []  # 저장 완료 시 (table, rows)
+        self.counters = {"queued": 0, "written": 0, "batches": 0, "failures": 0, "dropped": 0}
+        self._queue = None
+        self._task = None
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_size)
+        return self._queue
+
+    async def put(self, table, row):
+        self.pending.setdefault(table, []).append(row)
+        self.counters["queued"] += 1
+        await self.queue.put((table, row, 0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """남은 행을 모두 저장하고 종료"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            # 첫 행을 받은 뒤 interval 동안 (또는 batch_size 가 찰 때까지) 더 모음
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def flush(self):
+        """큐에 남은 행 즉시 저장"""
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+            if len(batch) >= self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+    async def _write(self, batch):
+        by_table = {}
+        for table, row, attempt in batch:
+            by_table.setdefault(table, []).append((row, attempt))
+        for table, items in by_table.items():
+            rows = [row for row, _ in items]
+            try:
+                await asyncio.to_thread(lambda: self.db.table(table).insert(rows).execute())
+            except Exception as e:
+                self.counters["failures"] += 1
+                print(f"DB 일괄 저장 실패 ({table} {len(rows)}건): {e}")
+                for row, attempt in items:
+                    if attempt + 1 < self.retries and not self.queue.full():
+                        self.queue.put_nowait((table, row, attempt + 1))
+                    else:
+                        self.counters["dropped"] += 1
+                        self._done(table, row)
+                continue
+            self.counters["written"] += len(rows)
+            self.counters["batches"] += 1
+            for row in rows:
+                self._done(table, row)
+            for listener in self.listeners:
+                listener(table, rows)
+
+    def _done(self, table, row):
+        pending = self.pending.get(table, [])
+        for i, r in enumerate(pending):
+            if r is row:
+                del pending[i]
+                break
+
+    def stats(self):
+        return {**self.counters, "backlog": self.queue.qsize() if self._queue else 0}
+
+
+class RulesCache:
+    """trading_rules 최근 목록 읽기 캐시. TTL 이 지나야 DB 를 다시 읽고 (동시 요청은 한 번으로 합침),
+    아직 큐에 있는 로컬 쓰기는 항상 앞에 합쳐서 반환"""
+
+    def __init__(self, db, writes, ttl=30.0, limit=20, table="trading_rules"):
+        self.db = db
+        self.writes = writes
+        self.ttl = ttl
+        self.limit = limit
+        self.table = table
+        self.rows = None
+        self.fetched_at = 0.0
+        self.counters = {"hits": 0, "loads": 0}
+        self.version = 0  # 목록 내용이 바뀔 수 있을 때마다 증가 (HTTP ETag 용)
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.rows = None
+        self.version += 1
+
+    def _fetch(self):
+        return self.db.table(self.table).select("*").order("created_at", desc=True).limit(self.limit).execute().data
+
+    async def get(self):
+        if self.rows is None or time.time() - self.fetched_at >= self.ttl:
+            async with self._lock:
+                if self.rows is None or time.time() - self.fetched_at >= self.ttl:
+                    rows = await asyncio.to_thread(self._fetch)
+                    if rows != self.rows:
+                        self.version += 1
+                    self.rows = rows
+                    self.fetched_at = time.time()
+                    self.counters["loads"] += 1
+                    return self._merged()
+        self.counters["hits"] += 1
+        return self._merged()
+
+    def _merged(self):
+        pending = self.writes.pending.get(self.table, [])
+        if not pending:
+            return self.rows
+        # 조회와 저장이 겹치면 같은 행이 양쪽에 있을 수 있음
+        seen = {(r.get("name"), r.get("created_at")) for r in self.rows}
+        fresh = [r for r in reversed(pending) if (r.get("name"), r.get("created_at")) not in seen]
+        return (fresh + self.rows)[:self.limit]
+
+    def on_written(self, table, rows):
+        """저장이 끝난 행은 캐시 본문으로 옮김 (DB 를 다시 읽지 않음)"""
+        if table == self.table and self.rows is not None:
+            self.rows = (list(reversed(rows)) + self.rows)[:self.limit]
+            self.version += 1
+
+    def current_version(self):
+        """DB 반영 전 로컬 쓰기까지 포함한 버전"""
+        return f"{self.version}.{self.writes.counters['queued']}"
+
+
+def data_layer_from_env(db):
+    """DB_WRITE_BATCH, DB_WRITE_INTERVAL_SEC, DB_WRITE_QUEUE_SIZE, RULES_CACHE_SEC"""
+    writes = WriteQueue(
+        db,
+        max_size=int(os.getenv("DB_WRITE_QUEUE_SIZE", "1000")),
+        batch_size=int(os.getenv("DB_WRITE_BATCH", "100")),
+        interval=float(os.getenv("DB_WRITE_INTERVAL_SEC", "0.5"))
+    )
+    rules = RulesCache(db, writes, ttl=float(os.getenv("RULES_CACHE_SEC", "30")))
+    writes.listeners.append(rules.on_written)
+    return writes, rules
+
+
+async def bench(path, count=2000, latency=0.0):
+    """로컬 SQLite 로 규칙 저장/목록 조회 지연 비교 (latency: 원격 DB 왕복 시간 흉내, 초)"""
+    from local_db import LocalDB
+
+    class SlowDB:
+        def __init__(self, inner):
+            self.inner = inner
+
+        def table(self, name):
+            if latency:
+                time.sleep(latency)
+            return self.inner.table(name)
+
+    db = SlowDB(LocalDB(path))
+
+    def pct(samples, q):
+        samples = sorted(samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+    direct = []
+    for i in range(count):
+        t0 = time.perf_counter()
+        await asyncio.to_thread(lambda: db.table("trading_rules").insert(
+            {"name": f"direct {i}", "status": "bench", "created_at": utc_now()}).execute())
+        direct.append(time.perf_counter() - t0)
+    print(f"직접 insert {count}건: p50 {pct(direct, 0.5):.3f}ms / p99 {pct(direct, 0.99):.3f}ms")
+
+    writes, rules = data_layer_from_env(db)
+    writes.start()
+    queued = []
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        await writes.put("trading_rules", {"name": f"queued {i}", "status": "bench", "created_at": utc_now()})
+        queued.append(time.perf_counter() - t0)
+    await writes.stop()
+    elapsed = time.perf_counter() - started
+    print(f"큐 insert {count}건: p50 {pct(queued, 0.5):.3f}ms / p99 {pct(queued, 0.99):.3f}ms, "
+          f"전체 저장 {elapsed:.2f}초 ({writes.counters['batches']}회 일괄 저장)")
+
+    reads = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        await asyncio.to_thread(rules._fetch)
+        reads.append(time.perf_counter() - t0)
+    cached = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        await rules.get()
+        cached.append(time.perf_counter() - t0)
+    print(f"목록 조회 직접: p50 {pct(reads, 0.5):.3f}ms / 캐시: p50 {pct(cached, 0.5):.4f}ms "
+          f"(DB 조회 {rules.counters['loads']}회)")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(description="write-behind 큐 / 규칙 캐시 벤치마크 (로컬 SQLite)")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="원격 DB 왕복 시간 흉내")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(bench(os.path.join(tmp, "bench.db"), args.count, args.latency_ms / 1000))
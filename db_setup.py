@@ -1,50 +1,339 @@
 import os
+import sys
 import json
-from supabase import create_client, Client
+import gzip
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
 
-load_dotenv()
-
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_SERVICE_KEY")
-supabase: Client = create_client(url, key)
-
-def setup_database():
-    print("=== 슈파베이스 데이터베이스 자동 구축 시작 ===")
-    
-    # 1. 매매 규칙(rules) 데이터 이관
-    if os.path.exists("rules.json"):
-        with open("rules.json", "r", encoding="utf-8") as f:
-            rules = json.load(f)
-            
-        print(f"매매 규칙 {len(rules)}개 발견. 클라우드로 이관 중...")
-        for rule in rules:
+# 대량 가져오기/내보내기: 파일을 통째로 읽지 않고 스트리밍 → 청크 단위 upsert (작은 워커 풀)
+# upsert 키가 있어서 여러 번 실행해도 같은 결과이고, 체크포인트로 중단된 지점부터 이어서 실행
+
+CHECKPOINT_DIR = os.path.join("data", "import_checkpoints")
+
+# 파일 이름별 기본 대상 테이블 / upsert 키 / 행 변환 / 이미 있으면 건너뛸 컬럼
+# trading_rules.name 에는 UNIQUE 제약이 없고 (AI 가 같은 이름을 다시 저장하기도 함) 파일의 규칙에는 DB id 가 없으므로
+# id 기준 upsert(= insert) 하되, 이미 있는 이름은 미리 걸러서 여러 번 실행해도 중복되지 않게 함
+def rule_row(rule):
+    return {
+        "name": rule['name'],
+        "description": rule.get('description', ''),
+        "status": rule.get('status', '대기 중...')
+    }
+
+def wallet_row(wallet):
+    return {
+        "id": wallet.get("id", 1), # 단일 지갑
+        "krw": wallet.get("krw", 10000000),
+        "assets": json.dumps(wallet.get("assets", {}))
+    }
+
+PRESETS = {
+    "rules.json": ("trading_rules", "id", rule_row, "name"),
+    "wallet.json": ("mock_wallet", "id", wallet_row, None),
+    ".ticks": ("price_ticks", "ts,symbol", None, None)
+}
+
+
+def open_text(path, mode="r"):
+    """.gz 면 gzip 으로 열기"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8", newline="\n" if "w" in mode else None)
+
+
+def iter_json(path, bufsize=1 << 16):
+    """JSON 배열을 원소 단위로 읽기 (최상위가 객체 하나면 그 객체만)"""
+    decoder = json.JSONDecoder()
+    with open_text(path) as f:
+        buf = f.read(bufsize).lstrip()
+        while not buf:
+            more = f.read(bufsize)
+            if not more:
+                break
+            buf = more.lstrip()
+        if not buf.startswith("["):
+            yield json.loads(buf + f.read())
+            return
+        buf, pos, eof = buf[1:], 0, False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                buf, pos = f.read(bufsize), 0
+                if not buf:
+                    raise ValueError(f"{path}: JSON 배열이 닫히지 않았습니다")
+                continue
+            if buf[pos] == "]":
+                return
             try:
-                # 테이블이 없을 경우를 대비해 RPC 대신 직접 삽입 시도 (PostgREST 자동 생성 활용)
-                supabase.table("trading_rules").upsert({
-                    "name": rule['name'],
-                    "description": rule.get('description', ''),
-                    "status": rule.get('status', '대기 중...')
-                }).execute()
-            except Exception as e:
-                print(f"규칙 이관 중 알림: {e} (테이블이 아직 없거나 설정이 필요할 수 있습니다)")
-
-    # 2. 가상 지갑(wallet) 데이터 이관
-    if os.path.exists("wallet.json"):
-        with open("wallet.json", "r", encoding="utf-8") as f:
-            wallet = json.load(f)
-            
-        print("가상 지갑 데이터 이관 중...")
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = len(buf)
+            if not eof and (end == len(buf) or buf[end] not in " \t\r\n,]"):
+                # 원소가 버퍼 경계에 걸림 (숫자는 잘린 채로도 해석됨: 123 → 12, 7.25 → 7) → 더 읽어서 다시
+                more = f.read(bufsize)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield record
+            pos = end
+
+
+def iter_jsonl(path):
+    with open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_ticks(path, block=65536):
+    """틱 저장소 파일(.ticks)을 memmap 블록 단위로 읽어 행 dict 로 (NaN 은 null)"""
+    from tick_store import TickStore
+    from history_buffer import HISTORY_FIELDS
+    records = TickStore(os.path.dirname(path) or ".").open_day(os.path.basename(path)[:8])
+    if records is None:
+        return
+    for start in range(0, len(records), block):
+        part = records[start:start + block]
+        ts, symbols = part["ts"].tolist(), part["symbol"].tolist()
+        columns = [part[name].tolist() for name in HISTORY_FIELDS]
+        for i in range(len(part)):
+            row = {"ts": ts[i], "symbol": symbols[i].decode("ascii")}
+            for name, values in zip(HISTORY_FIELDS, columns):
+                row[name] = None if values[i] != values[i] else values[i]
+            yield row
+
+
+def iter_records(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".jsonl"):
+        return iter_jsonl(path)
+    if name.endswith(".ticks"):
+        return iter_ticks(path)
+    return iter_json(path)
+
+
+def with_key(row, key):
+    """복합 키(ts,symbol 등)는 key 컬럼 하나로 합쳐서 upsert 기준으로 사용"""
+    fields = key.split(",")
+    if len(fields) == 1:
+        return row
+    return {**row, "key": ":".join(str(row.get(f)) for f in fields)}
+
+
+def chunks(records, size, skip=0):
+    """(청크 번호, 행 목록). 체크포인트 이전 청크는 읽기만 하고 건너뜀"""
+    chunk, index = [], 0
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            if index >= skip:
+                yield index, chunk
+            chunk, index = [], index + 1
+    if chunk and index >= skip:
+        yield index, chunk
+
+
+class Checkpoint:
+    """완료된 청크 번호 기록 (순서 상관없이 끝나도, 앞에서부터 연속으로 끝난 지점까지만 저장).
+    원본 파일 크기/수정 시각이 바뀌면 처음부터"""
+
+    def __init__(self, path, table, chunk_size, directory=CHECKPOINT_DIR):
+        stat = os.stat(path)
+        self.source = {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime,
+                       "table": table, "chunk_size": chunk_size}
+        name = f"{table}.{os.path.basename(path)}.json"
+        self.file = os.path.join(directory, name)
+        self.next_chunk = 0
+        self.rows = 0
+        self._done = {}
+        if os.path.exists(self.file):
+            with open(self.file, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("source") == self.source:
+                self.next_chunk, self.rows = saved["next_chunk"], saved["rows"]
+
+    def complete(self, index, rows):
+        self._done[index] = rows
+        advanced = False
+        while self.next_chunk in self._done:
+            self.rows += self._done.pop(self.next_chunk)
+            self.next_chunk += 1
+            advanced = True
+        if advanced:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        tmp = self.file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "next_chunk": self.next_chunk, "rows": self.rows}, f)
+        os.replace(tmp, self.file)
+
+    def reset(self):
+        self.next_chunk, self.rows, self._done = 0, 0, {}
+        if os.path.exists(self.file):
+            os.remove(self.file)
+
+
+def upsert_chunk(db, table, key, rows, retries=3):
+    for attempt in range(retries):
         try:
-            supabase.table("mock_wallet").upsert({
-                "id": 1, # 단일 지갑
-                "krw": wallet.get("krw", 10000000),
-                "assets": json.dumps(wallet.get("assets", {}))
-            }).execute()
+            if key == "id":
+                db.table(table).upsert(rows).execute()
+            else:
+                db.table(table).upsert(rows, on_conflict=key if "," not in key else "key").execute()
+            return len(rows)
         except Exception as e:
-            print(f"지갑 이관 중 알림: {e}")
+            if attempt + 1 == retries:
+                raise
+            print(f"{table} 청크 저장 재시도 ({attempt + 1}/{retries - 1}): {e}")
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def import_file(db, path, table=None, key=None, chunk_size=500, workers=4, fresh=False, report_every=2.0):
+    """파일 → 테이블 대량 upsert. 진행 중 초당 행 수를 주기적으로 출력 → (처리 행 수, 초)"""
+    preset = next((p for suffix, p in PRESETS.items() if path.endswith(suffix) or path.endswith(suffix + ".gz")),
+                  (None, None, None, None))
+    table = table or preset[0]
+    key = key or preset[1] or "id"
+    transform, unique = (preset[2], preset[3]) if table == preset[0] else (None, None)
+    if not table:
+        raise ValueError(f"{path}: 대상 테이블을 지정하세요 (--table)")
+
+    checkpoint = Checkpoint(path, table, chunk_size)
+    if fresh or unique:
+        # 이미 있는 행을 걸러내면 청크 번호가 실행마다 달라지므로 체크포인트 대신 그 필터로 이어서 실행
+        checkpoint.reset()
+    resumed = checkpoint.rows
+    if resumed:
+        print(f"체크포인트에서 이어서: 청크 {checkpoint.next_chunk}개 ({resumed:,}행) 건너뜀")
+
+    records = iter_records(path)
+    if transform:
+        records = map(transform, records)
+    if unique:
+        existing = existing_values(db, table, unique)
+        records = (r for r in records if r.get(unique) not in existing)
+    if "," in key:
+        records = (with_key(r, key) for r in records)
+
+    started = time.perf_counter()
+    last_report = started
+    rows = 0
+    with ThreadPoolExecutor(workers) as pool:
+        running = {}
+        for index, chunk in chunks(records, chunk_size, checkpoint.next_chunk):
+            # 진행 중인 청크를 워커 수의 2배로 제한 (파일이 커도 메모리 일정)
+            while len(running) >= workers * 2:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    count = future.result()
+                    checkpoint.complete(running.pop(future), count)
+                    rows += count
+            running[pool.submit(upsert_chunk, db, table, key, chunk)] = index
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                print(f"  {table}: {rows:,}행 ({rows / (now - started):,.0f} rows/s)")
+                last_report = now
+        for future in list(running):
+            count = future.result()
+            checkpoint.complete(running.pop(future), count)
+            rows += count
+    elapsed = time.perf_counter() - started
+    print(f"{path} → {table}: {rows:,}행 / {elapsed:.2f}초 ({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+          + (f", 이전 실행분 {resumed:,}행 포함 총 {checkpoint.rows:,}행" if resumed else ""))
+    return rows, elapsed
+
+
+def existing_values(db, table, column, page=1000):
+    """테이블에 이미 있는 column 값 집합 (한 번에 돌려주는 행 수 제한이 있으므로 페이지 단위 조회)"""
+    values = set()
+    start = 0
+    while True:
+        data = db.table(table).select(column).order(column).range(start, start + page - 1).execute().data
+        values.update(row.get(column) for row in data)
+        start += len(data)
+        if len(data) < page:
+            return values
+
+
+def export_table(db, table, path, page=1000):
+    """테이블 → JSONL (.gz 면 압축), id 순으로 페이지 단위 조회 → (행 수, 초)"""
+    started = time.perf_counter()
+    rows = 0
+    with open_text(path, "w") as f:
+        while True:
+            data = db.table(table).select("*").order("id").range(rows, rows + page - 1).execute().data
+            for row in data:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+            rows += len(data)
+            if len(data) < page:
+                break
+    elapsed = time.perf_counter() - started
+    print(f"{table} → {path}: {rows:,}행 / {elapsed:.2f}초 ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return rows, elapsed
+
+
+def setup_database(db):
+    print("=== 데이터베이스 자동 구축 시작 ===")
+
+    # 1. 매매 규칙(rules) 데이터 이관 / 2. 가상 지갑(wallet) 데이터 이관
+    for path in ("rules.json", "wallet.json"):
+        if os.path.exists(path):
+            try:
+                import_file(db, path, fresh=True)
+            except Exception as e:
+                print(f"{path} 이관 중 알림: {e} (테이블이 아직 없거나 설정이 필요할 수 있습니다)")
 
     print("=== 구축 완료! 이제 도메인 서버가 이 데이터를 사용합니다. ===")
 
+
+def connect(sqlite_path=None):
+    """--sqlite 지정 시 로컬 SQLite, 아니면 슈파베이스"""
+    if sqlite_path:
+        from local_db import LocalDB
+        return LocalDB(sqlite_path)
+    from supabase import create_client
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY")
+    if not url or not key:
+        sys.exit("SUPABASE_URL / SUPABASE_SERVICE_KEY 가 없습니다 (로컬 테스트는 --sqlite 경로)")
+    return create_client(url, key)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="DB 초기 구축 / 대량 가져오기·내보내기")
+    parser.add_argument("--sqlite", help="슈파베이스 대신 로컬 SQLite 파일 사용")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("setup", help="rules.json, wallet.json 이관 (기본)")
+    imp = sub.add_parser("import", help="JSON/JSONL(.gz)/틱 파일 → 테이블")
+    imp.add_argument("path")
+    imp.add_argument("--table")
+    imp.add_argument("--key", help="upsert 기준 컬럼 (복합 키는 ts,symbol 처럼 쉼표로)")
+    imp.add_argument("--chunk", type=int, default=500)
+    imp.add_argument("--workers", type=int, default=4)
+    imp.add_argument("--fresh", action="store_true", help="체크포인트 무시하고 처음부터")
+    exp = sub.add_parser("export", help="테이블 → JSONL(.gz)")
+    exp.add_argument("table")
+    exp.add_argument("path")
+    exp.add_argument("--page", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = connect(args.sqlite)
+    if args.command == "import":
+        import_file(db, args.path, args.table, args.key, args.chunk, args.workers, args.fresh)
+    elif args.command == "export":
+        export_table(db, args.table, args.path, args.page)
+    else:
+        setup_database(db)
+
+
 if __name__ == "__main__":
-    setup_database()
+    main(sys.argv[1:])
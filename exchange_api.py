@@ -1,60 +1,140 @@
 import os
+import sys
 import time
 import jwt
 import uuid
-import hashlib
-import requests
-from urllib.parse import urlencode
+import asyncio
+import httpx
 from dotenv import load_dotenv
+from upstream import base_url
 
-load_dotenv()
-
-class ExchangeAPI:
-    def __init__(self):
-        # 업비트 키
-        self.upbit_access = os.getenv("UPBIT_ACCESS_KEY")
-        self.upbit_secret = os.getenv("UPBIT_SECRET_KEY")
-        
-        # 빗썸 키
-        self.bithumb_access = os.getenv("BITHUMB_ACCESS_KEY")
-        self.bithumb_secret = os.getenv("BITHUMB_SECRET_KEY")
-
-    def get_upbit_balance(self):
-        """업비트 잔고 조회 (Private API)"""
-        if not self.upbit_access or not self.upbit_secret:
-            return "업비트 키가 설정되지 않았습니다."
-            
-        payload = {
-            'access_key': self.upbit_access,
-            'nonce': str(uuid.uuid4()),
+
+def _float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def normalize_balances(raw):
+    """거래소 잔고 응답 → [{"currency", "balance", "locked", "avg_buy_price"}] 공통 형식
+    (업비트/빗썸 v1 은 목록, 구버전 빗썸은 {"data": {"total_krw": .., ...}} 형태)"""
+    if isinstance(raw, dict) and isinstance(raw.get("data"), dict):
+        raw = [{"currency": curr, "balance": val} for curr, val in raw["data"].items() if curr != "total_krw"]
+    if not isinstance(raw, list):
+        return []
+    return [{
+        "currency": item.get("currency"),
+        "balance": _float(item.get("balance")),
+        "locked": _float(item.get("locked")),
+        "avg_buy_price": _float(item.get("avg_buy_price"))
+    } for item in raw if isinstance(item, dict)]
+
+
+class BalanceService:
+    """업비트/빗썸 잔고 조회 공용 서비스: 커넥션 풀 + 짧은 TTL 캐시 + 동시 요청 합치기.
+    대시보드를 몇 개 열어 두든 거래소 Private API 호출은 TTL당 거래소별 한 번"""
+
+    def __init__(self, ttl=None, timeout=3.0):
+        self.urls = {
+            "upbit": base_url("upbit") + "/v1/accounts",
+            "bithumb": base_url("bithumb") + "/v1/accounts"
         }
-        jwt_token = jwt.encode(payload, self.upbit_secret)
-        headers = {"Authorization": f"Bearer {jwt_token}"}
-        
-        res = requests.get("https://api.upbit.com/v1/accounts", headers=headers)
-        return res.json()
-
-    def get_bithumb_balance(self):
-        """빗썸 잔고 조회 (Private API - JWT 방식)"""
-        if not self.bithumb_access or not self.bithumb_secret:
-            return "빗썸 키가 설정되지 않았습니다."
-            
-        payload = {
-            'access_key': self.bithumb_access,
-            'nonce': str(uuid.uuid4()),
-            'timestamp': int(time.time() * 1000)
+        self.ttl = ttl if ttl is not None else float(os.getenv("BALANCE_CACHE_SEC", "5"))
+        self.timeout = timeout
+        self.keys = {
+            "upbit": (os.getenv("UPBIT_ACCESS_KEY"), os.getenv("UPBIT_SECRET_KEY")),
+            "bithumb": (os.getenv("BITHUMB_ACCESS_KEY"), os.getenv("BITHUMB_SECRET_KEY"))
         }
-        # 빗썸은 HS256 알고리즘 사용
-        jwt_token = jwt.encode(payload, self.bithumb_secret, algorithm='HS256')
-        headers = {"Authorization": f"Bearer {jwt_token}"}
-        
-        res = requests.get("https://api.bithumb.com/v1/accounts", headers=headers)
-        return res.json()
+        self.snapshot = None
+        self.updated_at = 0.0
+        self.version = 0  # 잔고 내용이 바뀔 때만 증가 (HTTP ETag 용)
+        self.requests = 0
+        self._client = None
+        self._lock = asyncio.Lock()
 
-# 테스트 실행부
-if __name__ == "__main__":
-    api = ExchangeAPI()
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=4, max_keepalive_connections=4))
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _token(self, exchange):
+        """요청마다 nonce 가 달라야 하므로 JWT 는 매번 서명 (빗썸은 timestamp 추가)"""
+        access, secret = self.keys[exchange]
+        payload = {'access_key': access, 'nonce': str(uuid.uuid4())}
+        if exchange == "bithumb":
+            payload['timestamp'] = int(time.time() * 1000)
+        return jwt.encode(payload, secret, algorithm='HS256')
+
+    async def _fetch(self, exchange):
+        """(정규화된 잔고 목록, 오류 메시지 또는 None)"""
+        access, secret = self.keys[exchange]
+        label = "업비트" if exchange == "upbit" else "빗썸"
+        if not access or not secret:
+            return [], f"{label} API 키가 설정되지 않았습니다."
+        self.requests += 1
+        try:
+            res = await self.client.get(self.urls[exchange], headers={"Authorization": f"Bearer {self._token(exchange)}"},
+                                        timeout=self.timeout)
+            if res.status_code != 200:
+                return None, f"{label} 잔고 조회 실패 (HTTP {res.status_code})"
+            return normalize_balances(res.json()), None
+        except Exception as e:
+            print(f"{label} 잔고 조회 실패: {e!r}")
+            return None, f"{label} 잔고 조회 실패"
+
+    async def refresh(self):
+        """두 거래소 동시 조회. 실패한 쪽은 직전 정상값을 유지하고 메시지만 추가"""
+        (upbit, upbit_err), (bithumb, bithumb_err) = await asyncio.gather(self._fetch("upbit"), self._fetch("bithumb"))
+        previous = self.snapshot or {"upbit": [], "bithumb": []}
+        snapshot = {
+            "upbit": previous["upbit"] if upbit is None else upbit,
+            "bithumb": previous["bithumb"] if bithumb is None else bithumb,
+            "messages": [m for m in (upbit_err, bithumb_err) if m]
+        }
+        if snapshot != self.snapshot:
+            self.version += 1
+        self.snapshot = snapshot
+        self.updated_at = time.time()
+        return self.snapshot
+
+    async def get_balances(self):
+        """TTL 안이면 캐시, 아니면 한 번만 조회 (동시 호출은 락에서 합쳐짐)"""
+        if self.snapshot is not None and time.time() - self.updated_at < self.ttl:
+            return self.snapshot
+        async with self._lock:
+            if self.snapshot is not None and time.time() - self.updated_at < self.ttl:
+                return self.snapshot
+            return await self.refresh()
+
+    async def get_upbit_balance(self):
+        return (await self.get_balances())["upbit"]
+
+    async def get_bithumb_balance(self):
+        return (await self.get_balances())["bithumb"]
+
+
+async def _main():
+    service = BalanceService()
+    try:
+        balances = await service.get_balances()
+    finally:
+        await service.aclose()
     print("--- 업비트 잔고 ---")
-    print(api.get_upbit_balance())
+    print(balances["upbit"])
     print("\n--- 빗썸 잔고 ---")
-    print(api.get_bithumb_balance())
+    print(balances["bithumb"])
+    for message in balances["messages"]:
+        print(message, file=sys.stderr)
+
+
+# 테스트 실행부
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(_main())
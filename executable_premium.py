@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import numpy as np
+from upstream import base_url
+from orderbook import synthetic_book, parse_upbit_orderbooks, parse_binance_depth
+
+# 실행 가능 김프: 최근 체결가 대신 실제 호가를 주문 크기만큼 훑은 평균 체결가(VWAP) + 수수료 기준.
+#   kimchi  : 바이낸스에서 N원어치 매수 → 국내 거래소에서 전량 매도했을 때 수익률 (%)
+#   reverse : 국내 거래소에서 N원어치 매수 → 바이낸스에서 전량 매도했을 때 수익률 (%)
+# 호가가 N을 감당하지 못하면 None
+
+DOMESTIC = ("upbit", "bithumb")
+DEFAULT_SIZES_KRW = (1e6, 5e6, 1e7, 3e7, 1e8, 3e8)
+DEFAULT_FEES = {"upbit": 0.0005, "bithumb": 0.0004, "binance": 0.001}  # 시장가(테이커) 수수료율
+
+
+def _percent(values):
+    """수익률 배열 → % (소수 넷째 자리, NaN → None)"""
+    return [None if v != v else v for v in np.round(values * 100, 4).tolist()]
+
+
+class ExecutablePremium:
+    """심볼별 업비트/빗썸/바이낸스 호가 → 주문 크기별 실행 가능 김프 곡선.
+    거래소마다 '주문 크기별 매수 수량' 다리(leg)를 캐시해 두고, 호가가 바뀐 거래소의 다리와
+    그 거래소가 들어가는 곡선만 다시 계산 (호가가 그대로면 아무것도 하지 않음)"""
+
+    def __init__(self, monitor=None, symbols=("BTC",), sizes=DEFAULT_SIZES_KRW, fees=None, depth=50):
+        self.monitor = monitor  # AsyncKimchiPremiumMonitor (업스트림 스케줄러/환율 재사용)
+        self.symbols = list(symbols)
+        self.sizes = np.asarray(sizes, dtype=np.float64)
+        self.fees = {**DEFAULT_FEES, **(fees or {})}
+        self.depth = depth
+        self.orderbook_urls = {venue: base_url(venue) + "/v1/orderbook" for venue in DOMESTIC}
+        self.depth_url = base_url("binance") + "/api/v3/depth"
+        self.fx_rate = None
+        self.books = {}    # (venue, symbol) -> OrderBook
+        self.legs = {}     # (venue, symbol) -> 주문 크기별 수수료 뗀 매수 수량
+        self.curves = {}   # symbol -> {venue: {"kimchi", "reverse", "top"}}
+        self.version = 0
+        self.compute_ms = 0.0
+        self.counters = {"updates": 0, "unchanged": 0, "legs": 0, "curves": 0}
+
+    # ---------------- 증분 계산 ----------------
+
+    def _leg(self, venue, symbol, sizes):
+        """venue 에서 sizes(원화) 만큼 매수했을 때 수수료 뗀 수량 (바이낸스는 환율로 USDT 환산)"""
+        book = self.books.get((venue, symbol))
+        if book is None or (venue == "binance" and not self.fx_rate):
+            return None
+        amounts = sizes / self.fx_rate if venue == "binance" else sizes
+        self.counters["legs"] += 1
+        return book.buy_many(amounts) * (1 - self.fees[venue])
+
+    def _curve(self, symbol, venue, sizes, domestic_qty, abroad_qty):
+        """다리 두 개(국내/해외 매수 수량)와 반대편 호가 → 방향별 수익률 곡선"""
+        domestic = self.books.get((venue, symbol))
+        binance = self.books.get(("binance", symbol))
+        if domestic is None or binance is None or domestic_qty is None or abroad_qty is None:
+            return None
+        fx = self.fx_rate
+        kimchi = domestic.sell_many(abroad_qty) * (1 - self.fees[venue]) / sizes - 1
+        reverse = binance.sell_many(domestic_qty) * (1 - self.fees["binance"]) * fx / sizes - 1
+        top = None
+        if len(domestic.bid_px) and len(binance.ask_px):
+            top = round(float(domestic.bid_px[0] / (binance.ask_px[0] * fx) - 1) * 100, 4)
+        self.counters["curves"] += 1
+        return {"kimchi": kimchi, "reverse": reverse, "top": top}
+
+    def _recompute(self, symbol, venues):
+        """venues 의 다리를 새로 계산하고 영향을 받는 국내 거래소 곡선만 갱신"""
+        for venue in venues:
+            self.legs[(venue, symbol)] = self._leg(venue, symbol, self.sizes)
+        targets = DOMESTIC if "binance" in venues else venues
+        curves = self.curves.setdefault(symbol, {})
+        abroad = self.legs.get(("binance", symbol))
+        for venue in targets:
+            curves[venue] = self._curve(symbol, venue, self.sizes, self.legs.get((venue, symbol)), abroad)
+        self.version += 1
+
+    def update_book(self, venue, symbol, book):
+        """호가 갱신 한 건 반영 → 다시 계산했으면 True"""
+        self.counters["updates"] += 1
+        if book is None or book.same_levels(self.books.get((venue, symbol))):
+            self.counters["unchanged"] += 1
+            return False
+        self.books[(venue, symbol)] = book
+        self._recompute(symbol, (venue,))
+        return True
+
+    def update_fx(self, fx_rate):
+        """환율이 바뀌면 바이낸스 다리만 다시 계산"""
+        if not fx_rate or fx_rate == self.fx_rate:
+            return False
+        self.fx_rate = fx_rate
+        for symbol in {s for venue, s in self.books if venue == "binance"}:
+            self._recompute(symbol, ("binance",))
+        return True
+
+    # ---------------- 조회 ----------------
+
+    async def _domestic_books(self, venue):
+        """국내 거래소 호가를 한 번의 다중 마켓 요청으로 조회"""
+        try:
+            markets = ",".join(f"KRW-{s}" for s in self.symbols)
+            data = await self.monitor._get_json(venue, self.orderbook_urls[venue], {"markets": markets}, 0)
+            return venue, parse_upbit_orderbooks(data)
+        except Exception as e:
+            print(f"{venue} 호가 조회 실패: {e!r}")
+            return venue, {}
+
+    async def _binance_book(self, symbol):
+        try:
+            data = await self.monitor._get_json("binance", self.depth_url,
+                                                {"symbol": f"{symbol}USDT", "limit": self.depth}, 0)
+            return symbol, parse_binance_depth(data)
+        except Exception as e:
+            print(f"바이낸스 {symbol} 호가 조회 실패: {e!r}")
+            return symbol, None
+
+    async def refresh(self):
+        """세 거래소 호가 + 환율을 동시에 받아서 바뀐 것만 반영 (SnapshotPoller 의 fetch)"""
+        fx_rate, *results = await asyncio.gather(
+            self.monitor.get_exchange_rate(),
+            *(self._domestic_books(venue) for venue in DOMESTIC),
+            *(self._binance_book(symbol) for symbol in self.symbols)
+        )
+        started = time.perf_counter()
+        self.update_fx(fx_rate)
+        for venue, books in results[:len(DOMESTIC)]:
+            for symbol, book in books.items():
+                self.update_book(venue, symbol, book)
+        for symbol, book in results[len(DOMESTIC):]:
+            self.update_book("binance", symbol, book)
+        self.compute_ms = (time.perf_counter() - started) * 1000
+        return self.version
+
+    def book_ages(self, symbol, now):
+        return {
+            venue: round(now - self.books[(venue, symbol)].ts, 1) if (venue, symbol) in self.books else None
+            for venue in DOMESTIC + ("binance",)
+        }
+
+    def payload(self, symbols=None, sizes=None):
+        """JSON 응답. sizes 를 따로 주면 저장된 호가로 그 크기만 즉석 계산 (캐시된 곡선은 그대로)"""
+        now = time.time()
+        size_list = self.sizes if sizes is None else np.asarray(sizes, dtype=np.float64)
+        result = {}
+        for symbol in symbols or self.symbols:
+            if sizes is None:
+                curves = self.curves.get(symbol, {})
+            else:
+                legs = {venue: self._leg(venue, symbol, size_list) for venue in DOMESTIC + ("binance",)}
+                curves = {venue: self._curve(symbol, venue, size_list, legs[venue], legs["binance"])
+                          for venue in DOMESTIC}
+            result[symbol] = {venue: None if curves.get(venue) is None else {
+                "kimchi": _percent(curves[venue]["kimchi"]),
+                "reverse": _percent(curves[venue]["reverse"]),
+                "top_of_book": curves[venue]["top"]
+            } for venue in DOMESTIC}
+            result[symbol]["book_age"] = self.book_ages(symbol, now)
+        return {
+            "sizes_krw": size_list.tolist(),
+            "fx_rate": self.fx_rate,
+            "fees": self.fees,
+            "symbols": result
+        }
+
+
+def executable_premium_from_env(monitor):
+    """EXEC_PREMIUM_SYMBOLS / EXEC_PREMIUM_SIZES_KRW / EXEC_PREMIUM_DEPTH / FEE_UPBIT 등 환경변수로 설정"""
+    symbols = os.getenv("EXEC_PREMIUM_SYMBOLS", "BTC,ETH,XRP").split(",")
+    sizes = os.getenv("EXEC_PREMIUM_SIZES_KRW")
+    fees = {venue: float(os.getenv(f"FEE_{venue.upper()}")) for venue in DEFAULT_FEES if os.getenv(f"FEE_{venue.upper()}")}
+    return ExecutablePremium(
+        monitor, [s.strip().upper() for s in symbols if s.strip()],
+        [float(s) for s in sizes.split(",")] if sizes else DEFAULT_SIZES_KRW,
+        fees, int(os.getenv("EXEC_PREMIUM_DEPTH", "50"))
+    )
+
+
+def bench(symbols=50, updates=20_000, levels=30):
+    """호가 갱신 한 건당 재계산 시간 (합성 호가, 네트워크 없음)"""
+    engine = ExecutablePremium(symbols=[f"S{i}" for i in range(symbols)])
+    engine.update_fx(1400.0)
+    rng = np.random.default_rng(1)
+    mids = rng.uniform(1e3, 1e8, symbols)
+    for i, symbol in enumerate(engine.symbols):
+        engine.update_book("binance", symbol, synthetic_book(mids[i] / 1400.0, levels))
+        for venue in DOMESTIC:
+            engine.update_book(venue, symbol, synthetic_book(mids[i] * 1.02, levels))
+    books = [(DOMESTIC[n % 2] if n % 3 else "binance", engine.symbols[n % symbols],
+              synthetic_book((mids[n % symbols] if n % 3 else mids[n % symbols] / 1400.0) * (1 + rng.normal(0, 1e-3)), levels))
+             for n in range(updates)]
+    started = time.perf_counter()
+    for venue, symbol, book in books:
+        engine.update_book(venue, symbol, book)
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    engine.payload()
+    payload_ms = (time.perf_counter() - started) * 1000
+    print(f"호가 갱신 {updates:,}건 재계산 {elapsed:.3f}초 (건당 {elapsed / updates * 1e6:.1f}µs, "
+          f"곡선 {engine.counters['curves']:,}개) / 전체 {symbols}종목 응답 생성 {payload_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    bench()
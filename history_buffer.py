@@ -0,0 +1,186 @@
+import time
+import numpy as np
+
+# 스냅샷 한 점에 저장하는 값 (배열 행 순서)
+HISTORY_FIELDS = ("upbit", "bithumb", "binance", "usd_krw", "premium_up", "premium_bithumb")
+
+# 롤업 해상도 (버킷 초, 보관 개수): 1분 1일치, 5분 1주일치, 1시간 30일치
+ROLLUPS = {
+    "1m": (60, 1440),
+    "5m": (300, 2016),
+    "1h": (3600, 720)
+}
+
+
+def _clean(v):
+    return None if v != v else v
+
+
+def snapshot_values(data):
+    """monitor.get_combined_data() 결과 → HISTORY_FIELDS 순서 값 (시세 없음은 NaN)"""
+    prices, premiums = data['prices'], data['premiums']
+    values = (prices['upbit'], prices['bithumb'], prices['binance'], data['fx_rate'], premiums['upbit'], premiums['bithumb'])
+    return tuple(np.nan if v is None else v for v in values)
+
+
+def resample_ohlc(ts, values, bucket_sec, ohlc_index):
+    """시간순 (ts, 값 배열)을 버킷 OHLC로 일괄 집계 - 틱 저장소 조회 결과용"""
+    if not len(ts):
+        return ts, np.zeros((values.shape[0] + 3, 0))
+    buckets = ts - ts % bucket_sec
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:] - 1, len(ts) - 1]
+    v = values[ohlc_index]
+    ohlc = np.vstack([v[starts], np.fmax.reduceat(v, starts), np.fmin.reduceat(v, starts)])
+    return buckets[starts], np.vstack([values[:, ends], ohlc])
+
+
+class PriceRingBuffer:
+    """고정 용량 원형 버퍼 (타임스탬프 + 필드별 float64 배열). append O(1), 메모리 고정"""
+
+    def __init__(self, capacity=720, fields=HISTORY_FIELDS):
+        self.capacity = capacity
+        self.fields = fields
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((len(fields), capacity), np.nan, dtype=np.float64)
+        self.head = 0   # 다음에 쓸 위치
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, ts, values):
+        self.ts[self.head] = ts
+        self.values[:, self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _order(self):
+        """오래된 것부터의 인덱스"""
+        start = (self.head - self.size) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+    def last(self):
+        if not self.size:
+            return None
+        idx = (self.head - 1) % self.capacity
+        return self.ts[idx], self.values[:, idx]
+
+    def window(self, since=None, limit=None):
+        """(ts 배열, 값 2차원 배열)을 시간순으로 반환"""
+        order = self._order()
+        ts = self.ts[order]
+        if since is not None:
+            order = order[np.searchsorted(ts, since, side="right"):]
+        if limit:
+            order = order[-limit:]
+        return self.ts[order], self.values[:, order]
+
+
+class OhlcRollup:
+    """버킷 단위 OHLC 집계 (김프는 OHLC, 나머지 필드는 종가) - 자체 원형 버퍼로 용량 고정"""
+
+    def __init__(self, bucket_sec, capacity, fields=HISTORY_FIELDS, ohlc_field="premium_up"):
+        self.bucket_sec = bucket_sec
+        self.fields = fields
+        self.ohlc_index = fields.index(ohlc_field)
+        # 종가 행(fields) 뒤에 open/high/low 3행을 덧붙여 한 버퍼에 보관
+        self.buffer = PriceRingBuffer(capacity, fields + ("open", "high", "low"))
+        self._bucket = None
+        self._row = None
+
+    def add(self, ts, values):
+        bucket = ts - ts % self.bucket_sec
+        v = values[self.ohlc_index]
+        if bucket != self._bucket:
+            if self._row is not None:
+                self.buffer.append(self._bucket, self._row)
+            self._bucket = bucket
+            self._row = np.concatenate([values, (v, v, v)])
+            return
+        row = self._row
+        row[:len(values)] = values
+        n = len(values)
+        # resample_ohlc 와 같은 규칙: NaN(조회 실패)은 고가/저가에서 무시
+        row[n + 1] = np.fmax(row[n + 1], v)
+        row[n + 2] = np.fmin(row[n + 2], v)
+
+    def window(self, since=None, limit=None):
+        """완료된 버킷 + 진행 중인 버킷"""
+        ts, values = self.buffer.window(since)
+        if self._row is not None and (since is None or self._bucket > since):
+            ts = np.append(ts, self._bucket)
+            values = np.column_stack([values, self._row])
+        if limit:
+            ts, values = ts[-limit:], values[:, -limit:]
+        return ts, values
+
+
+class PriceHistory:
+    """원시 스냅샷 링버퍼 + 1m/5m/1h OHLC 롤업. 수집 주기에 맞춰 채워지고 메모리는 업타임과 무관"""
+
+    def __init__(self, raw_capacity=720, rollups=ROLLUPS):
+        self.raw = PriceRingBuffer(raw_capacity)
+        self.rollups = {name: OhlcRollup(sec, cap) for name, (sec, cap) in rollups.items()}
+        self.version = 0  # 추가될 때마다 증가 (HTTP ETag 용)
+
+    @property
+    def resolutions(self):
+        return ("raw",) + tuple(self.rollups)
+
+    def append(self, ts, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.raw.append(ts, values)
+        for rollup in self.rollups.values():
+            rollup.add(ts, values)
+        self.version += 1
+
+    def covers(self, resolution, since):
+        """since 이후 구간을 메모리 버퍼만으로 응답할 수 있는지"""
+        buffer = self.raw if resolution == "raw" else self.rollups[resolution].buffer
+        if since is None or buffer.size < buffer.capacity:
+            return True  # 아직 한 바퀴도 안 돌았으면 가진 것이 전부
+        return since >= buffer.ts[buffer.head]
+
+    def latest_point(self):
+        last = self.raw.last()
+        if last is None:
+            return None
+        ts, values = last
+        return self._rows(np.array([ts]), values.reshape(-1, 1), HISTORY_FIELDS, "%H:%M:%S")[0]
+
+    def query(self, resolution="raw", since=None, limit=None):
+        if resolution == "raw":
+            ts, values = self.raw.window(since, limit)
+            return self._rows(ts, values, HISTORY_FIELDS, "%H:%M:%S")
+        rollup = self.rollups[resolution]
+        ts, values = rollup.window(since, limit)
+        time_fmt = "%m-%d %H:%M" if rollup.bucket_sec >= 3600 else "%H:%M"
+        return self._rows(ts, values, rollup.buffer.fields, time_fmt)
+
+    def query_records(self, records, resolution="raw", limit=None):
+        """틱 저장소 레코드를 같은 응답 형식으로 변환 (롤업 해상도면 일괄 리샘플)"""
+        ts = np.asarray(records["ts"])
+        values = np.vstack([records[name] for name in HISTORY_FIELDS]) if len(ts) else np.zeros((len(HISTORY_FIELDS), 0))
+        if resolution == "raw":
+            fields, time_fmt = HISTORY_FIELDS, "%m-%d %H:%M:%S"
+        else:
+            rollup = self.rollups[resolution]
+            ts, values = resample_ohlc(ts, values, rollup.bucket_sec, rollup.ohlc_index)
+            fields = rollup.buffer.fields
+            time_fmt = "%m-%d %H:%M"
+        if limit:
+            ts, values = ts[-limit:], values[:, -limit:]
+        return self._rows(ts, values, fields, time_fmt)
+
+    @staticmethod
+    def _rows(ts, values, fields, time_fmt):
+        """차트용 행 목록 (기존 응답과 같은 time/upbit/bithumb/premium_up 키 유지)"""
+        columns = [np.round(row, 4).tolist() for row in values]
+        rows = []
+        for i, t in enumerate(ts.tolist()):
+            row = {"ts": t, "time": time.strftime(time_fmt, time.localtime(t))}
+            for name, column in zip(fields, columns):
+                row[name] = _clean(column[i])
+            rows.append(row)
+        return rows
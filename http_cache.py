@@ -0,0 +1,124 @@
+import os
+import time
+import gzip
+import json
+import zlib
+import hashlib
+from collections import OrderedDict
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import brotli
+except ImportError:  # 선택 의존성 - 없으면 gzip 만 사용
+    brotli = None
+
+# 정적 페이지는 시작 시 한 번 읽어서 압축본까지 미리 만들어 두고,
+# 폴링 JSON 은 데이터 소스의 버전 번호로 ETag 를 만들어 바뀌지 않았으면 304 (본문 없음)
+
+# 재시작하면 버전 번호가 0부터 다시 시작하므로 ETag 에 프로세스 구분값을 섞음
+BOOT_ID = f"{int(time.time() * 1000):x}"
+COMPRESS_MIN_BYTES = 1024
+
+
+def accepted_encodings(request):
+    header = request.headers.get("accept-encoding", "")
+    return {part.split(";")[0].strip() for part in header.split(",")}
+
+
+def not_modified(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip() for t in header.split(","))
+
+
+def encoded_variants(body):
+    """원본 + gzip (+ brotli) 압축본, 압축이 이득일 때만"""
+    variants = {"identity": body}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        variants["gzip"] = gzip.compress(body, 9, mtime=0)
+        if brotli:
+            variants["br"] = brotli.compress(body, quality=11)
+    return variants
+
+
+def pick_variant(request, variants):
+    accepted = accepted_encodings(request)
+    for encoding in ("br", "gzip"):
+        if encoding in variants and encoding in accepted:
+            return encoding, variants[encoding]
+    return "identity", variants["identity"]
+
+
+def make_response(request, variants, etag, media_type, cache_control):
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    encoding, body = pick_variant(request, variants)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+
+class StaticPages:
+    """HTML 페이지를 메모리에 올려 두고 압축본/ETag 와 함께 응답.
+    reload=True(개발용)면 요청마다 수정 시각을 확인해서 바뀐 파일만 다시 읽음"""
+
+    def __init__(self, paths, reload=False):
+        self.paths = paths
+        self.reload = reload
+        self.pages = {}   # path -> (mtime, etag, variants)
+        for path in paths:
+            self._load(path)
+
+    def _load(self, path):
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        self.pages[path] = (os.path.getmtime(path), etag, encoded_variants(body))
+
+    def response(self, request, path, cache_control="no-cache"):
+        if self.reload and os.path.getmtime(path) != self.pages[path][0]:
+            self._load(path)
+        _, etag, variants = self.pages[path]
+        return make_response(request, variants, etag, "text/html; charset=utf-8", cache_control)
+
+
+class ConditionalJSON:
+    """버전 번호가 같으면 직렬화 없이 304, 아니면 한 번 직렬화/압축한 본문을 버전별로 재사용.
+    같은 경로라도 쿼리 문자열이 다르면 다른 ETag"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.bodies = OrderedDict()   # etag -> variants
+        self.counters = {"not_modified": 0, "reused": 0, "built": 0}
+
+    def etag(self, request, version):
+        variant = zlib.crc32(f"{request.url.path}?{request.url.query}".encode())
+        return f'W/"{BOOT_ID}-{variant:x}-{version}"'
+
+    async def respond(self, request, version, build, cache_control="private, no-cache"):
+        """build: 본문이 필요할 때만 호출되는 (async 가능) 함수"""
+        etag = self.etag(request, version)
+        if not_modified(request, etag):
+            self.counters["not_modified"] += 1
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control,
+                                                      "Vary": "Accept-Encoding"})
+        variants = self.bodies.get(etag)
+        if variants is None:
+            data = build()
+            if hasattr(data, "__await__"):
+                data = await data
+            if isinstance(data, Response):
+                return data  # 오류 응답 등은 그대로
+            body = json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False,
+                              separators=(",", ":")).encode("utf-8")
+            variants = self.bodies[etag] = encoded_variants(body)
+            if len(self.bodies) > self.max_entries:
+                self.bodies.popitem(last=False)
+            self.counters["built"] += 1
+        else:
+            self.bodies.move_to_end(etag)
+            self.counters["reused"] += 1
+        return make_response(request, variants, etag, "application/json", cache_control)
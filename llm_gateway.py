@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+
+def market_state_key(kind, data, step=0.1):
+    """시장 상태를 양자화한 캐시 키 (김프를 step% 단위로 버킷팅, 지연 소스 포함)
+    → 김프가 같은 구간에 머무는 동안은 같은 제안을 재사용"""
+    def bucket(v):
+        return "na" if v is None else f"{round(v / step) * step:.2f}"
+    premiums = data['premiums']
+    stale = ",".join(data.get('stale', []))
+    return f"{kind}:{bucket(premiums['upbit'])}:{bucket(premiums['bithumb'])}:{stale}"
+
+
+def prompt_key(kind, text):
+    return f"{kind}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class RuleTagFilter:
+    """스트리밍 응답에서 [RULE: ...] 태그를 걸러내고, 태그가 닫히는 즉시 규칙명을 돌려줌.
+    청크 경계에 걸친 태그 시작 부분은 다음 청크가 올 때까지 보류"""
+
+    tag = "[RULE:"
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, text):
+        """→ (바로 내보낼 텍스트, 이번에 닫힌 규칙명 목록)"""
+        self.pending += text
+        out, rules = [], []
+        while True:
+            i = self.pending.find(self.tag)
+            if i < 0:
+                keep = next((k for k in range(min(len(self.tag) - 1, len(self.pending)), 0, -1)
+                             if self.tag.startswith(self.pending[-k:])), 0)
+                out.append(self.pending[:len(self.pending) - keep])
+                self.pending = self.pending[len(self.pending) - keep:]
+                break
+            out.append(self.pending[:i])
+            j = self.pending.find("]", i)
+            if j < 0:
+                self.pending = self.pending[i:]
+                break
+            rules.append(self.pending[i + len(self.tag):j].strip())
+            self.pending = self.pending[j + 1:]
+        return "".join(out), rules
+
+    def flush(self):
+        """응답이 끝났는데 닫히지 않은 태그는 원문 그대로 반환"""
+        rest, self.pending = self.pending, ""
+        return rest
+
+
+class FakeModel:
+    """오프라인 측정용 가짜 모델 - generate_content 호환, 블로킹 지연을 흉내냄"""
+
+    def __init__(self, latency=1.5, jitter=0.5, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if stream:
+            return self._stream(prompt)
+        time.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        return self._reply(prompt)
+
+    def _stream(self, prompt):
+        """첫 토큰까지 latency/3, 이후 토큰마다 조금씩 (실제 스트리밍 응답의 시간 분포 흉내)"""
+        time.sleep(max(0.0, (self.latency + self._rng.uniform(-self.jitter, self.jitter)) / 3))
+        words = self._reply(prompt).text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.latency / 3 / len(words))
+            yield FakeResponse(word if i == len(words) - 1 else word + " ")
+
+    def _reply(self, prompt):
+        if '"name"' in prompt and '"thought"' in prompt:
+            return FakeResponse(json.dumps({"name": f"김프 {self._rng.uniform(0, 3):.1f}% 이하 분할 매수",
+                                            "thought": "가짜 모델 응답"}, ensure_ascii=False))
+        if "[RULE:" in prompt:
+            return FakeResponse("가짜 모델 응답입니다. 현재 김프 구간에서는 분할 진입이 유리합니다. "
+                                "[RULE: 김프 1% 미만 진입] 펀딩비가 양수일 때만 헷지를 유지하세요.")
+        return FakeResponse("[관망] 가짜 모델 응답 (예상 수익: +0.0%)")
+
+
+class LLMGateway:
+    """모델 호출 단일 창구: 이벤트 루프 밖(스레드)에서 실행 + 타임아웃 + 동시 실행 수 제한
+    + 키 기반 TTL/LRU 응답 캐시 + 같은 키의 진행 중 호출 합치기"""
+
+    def __init__(self, model, timeout=30.0, max_concurrency=2, cache_size=256):
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.cache_size = cache_size
+        self.cache = OrderedDict()   # key -> (text, expires_at)
+        self._inflight = {}          # key -> Future
+        self._running = 0
+        self._slot_freed = None
+        self.counters = {"calls": 0, "hits": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+        self.latencies = []          # 최근 모델 호출 시간 (초)
+        self.listeners = []          # 모델 호출마다 (종류, 소요 초, 결과) - 지표 수집용
+        self.first_tokens = []       # 최근 스트리밍 첫 청크까지 시간 (초)
+
+    @property
+    def available(self):
+        # 지연 생성 모델(services.LazyService)이 생성에 실패했으면 없는 것으로 취급
+        return self.model is not None and not getattr(self.model, "init_failed", False)
+
+    def _cache_get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return entry[0]
+
+    def _cache_put(self, key, text, ttl):
+        self.cache[key] = (text, time.time() + ttl)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def _acquire_slot(self):
+        while self._running >= self.max_concurrency:
+            if self._slot_freed is None or self._slot_freed.is_set():
+                self._slot_freed = asyncio.Event()
+            await self._slot_freed.wait()
+        self._running += 1
+
+    def _release_slot(self, loop):
+        def release(_):
+            # 스레드 작업이 끝난 시점(타임아웃 이후라도)에만 자리를 돌려줌 → 실제 동시 실행 수 보장
+            self._running -= 1
+            if self._slot_freed is not None:
+                loop.call_soon_threadsafe(self._slot_freed.set)
+        return release
+
+    async def _start(self, fn):
+        """자리를 잡고 fn 을 스레드에서 시작. 자리는 스레드 작업이 끝날 때 돌려주고, 시작도 못 했으면 바로 돌려줌"""
+        await self._acquire_slot()
+        release = self._release_slot(asyncio.get_running_loop())
+        try:
+            job = asyncio.ensure_future(asyncio.to_thread(fn))
+        except BaseException:
+            release(None)
+            raise
+        job.add_done_callback(release)
+        return job
+
+    async def _call(self, prompt):
+        # self.model 속성 조회도 스레드에서 (지연 생성 모델은 이때 SDK import + 생성)
+        job = await self._start(lambda: self.model.generate_content(prompt))
+        started = time.perf_counter()
+        self.counters["calls"] += 1
+        try:
+            response = await asyncio.wait_for(asyncio.shield(job), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            self._notify("generate", started, "timeout")
+            raise TimeoutError(f"AI 응답 시간 초과 ({self.timeout:.0f}초)")
+        except Exception:
+            self.counters["errors"] += 1
+            self._notify("generate", started, "error")
+            raise
+        self._notify("generate", started, "ok")
+        self.latencies.append(time.perf_counter() - started)
+        if len(self.latencies) > 200:
+            del self.latencies[:-200]
+        return response.text.strip()
+
+    async def stream(self, prompt):
+        """청크 단위 응답 (async generator). 첫 청크와 청크 사이 간격이 각각 timeout 을 넘으면 중단.
+        캐시/합치기 없이 매번 호출하지만 동시 실행 수 제한은 같이 적용"""
+        if not self.available:
+            raise RuntimeError("AI 모델이 설정되지 않았습니다.")
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def produce():
+            def put(item):
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                except RuntimeError:
+                    pass  # 서버 종료로 루프가 닫힘
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if chunk.text:
+                        put(chunk.text)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        await self._start(produce)
+        self.counters["calls"] += 1
+        started = time.perf_counter()
+        first = None
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), self.timeout)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                self._notify("stream", started, "timeout")
+                raise TimeoutError(f"AI 응답 시간 초과 ({self.timeout:.0f}초)")
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                self.counters["errors"] += 1
+                self._notify("stream", started, "error")
+                raise item
+            if first is None:
+                first = time.perf_counter() - started
+                self.first_tokens.append(first)
+                del self.first_tokens[:-200]
+            yield item
+        self._notify("stream", started, "ok")
+        self.latencies.append(time.perf_counter() - started)
+        del self.latencies[:-200]
+
+    def _notify(self, kind, started, outcome):
+        elapsed = time.perf_counter() - started
+        for listener in self.listeners:
+            listener(kind, elapsed, outcome)
+
+    async def generate(self, prompt, key=None, ttl=None):
+        """key 가 있으면 캐시 사용 (ttl 초), 없으면 프롬프트가 같은 진행 중 호출만 합침"""
+        if not self.available:
+            raise RuntimeError("AI 모델이 설정되지 않았습니다.")
+        if key is not None and ttl:
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.counters["hits"] += 1
+                return cached
+        flight_key = key or prompt_key("prompt", prompt)
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            text = await self._call(prompt)
+            if key is not None and ttl:
+                self._cache_put(key, text, ttl)
+            future.set_result(text)
+            return text
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[flight_key]
+
+    def stats(self):
+        def pct(samples, q):
+            samples = sorted(samples)
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 1) if samples else None
+        requests = self.counters["calls"] + self.counters["hits"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "hit_rate": round((self.counters["hits"] + self.counters["coalesced"]) / requests, 3) if requests else 0.0,
+            "running": self._running,
+            "cached": len(self.cache),
+            "p50_ms": pct(self.latencies, 0.5),
+            "p95_ms": pct(self.latencies, 0.95),
+            "first_token_p50_ms": pct(self.first_tokens, 0.5)
+        }
+
+
+def gateway_from_env(model):
+    """LLM_FAKE=1 이면 키 없이 가짜 모델 사용 (오프라인 측정/개발용)"""
+    if os.getenv("LLM_FAKE") == "1":
+        model = FakeModel(latency=float(os.getenv("LLM_FAKE_LATENCY_SEC", "1.5")))
+    return LLMGateway(
+        model,
+        timeout=float(os.getenv("LLM_TIMEOUT_SEC", "30")),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "2")),
+        cache_size=int(os.getenv("LLM_CACHE_SIZE", "256"))
+    )
+
+
+async def bench(tabs=50, rounds=40, latency=0.2, ttl=2.0, interval=0.25, seed=5):
+    """탭 여러 개가 제안을 주기적으로 요청하는 상황을 가짜 모델로 재현 (시간 축소: 1라운드 = interval초)"""
+    rng = random.Random(seed)
+    model = FakeModel(latency=latency, jitter=latency / 4, seed=seed)
+    gateway = LLMGateway(model, timeout=latency * 10, max_concurrency=2)
+    premium, bithumb = 2.5, 2.4
+    waits = []
+
+    async def tab(data):
+        t0 = time.perf_counter()
+        await gateway.generate(f"김프 {data['premiums']['upbit']:.4f}", market_state_key("suggestion", data), ttl)
+        waits.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        premium += rng.gauss(0, 0.03)
+        bithumb += rng.gauss(0, 0.03)
+        data = {"premiums": {"upbit": premium, "bithumb": bithumb}}
+        await asyncio.gather(*(tab(data) for _ in range(tabs)))
+        await asyncio.sleep(interval)
+    elapsed = time.perf_counter() - started
+    waits.sort()
+    stats = gateway.stats()
+    print(f"탭 {tabs}개 × {rounds}라운드 = 요청 {tabs * rounds:,}건 / {elapsed:.1f}초")
+    print(f"모델 호출 {model.calls}회 (캐시 적중 {stats['hits']}, 합치기 {stats['coalesced']}, 적중률 {stats['hit_rate']:.1%})")
+    print(f"요청 대기 p50 {waits[len(waits) // 2] * 1000:.1f}ms / p95 {waits[int(len(waits) * 0.95)] * 1000:.1f}ms"
+          f" / 모델 p50 {stats['p50_ms']}ms")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="LLM 게이트웨이 캐시/합치기 측정 (가짜 모델)")
+    parser.add_argument("--tabs", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="가짜 모델 응답 시간 (초)")
+    parser.add_argument("--ttl", type=float, default=2.0, help="캐시 TTL (초, 축소된 시간 기준)")
+    args = parser.parse_args(sys.argv[1:])
+    asyncio.run(bench(args.tabs, args.rounds, args.latency, args.ttl))
@@ -0,0 +1,492 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter, defaultdict
+import httpx
+
+# 오프라인 부하 테스트: 거래소/환율 가짜 서버 + 앱(별도 프로세스) + 대시보드 N개 흉내.
+# DB 는 로컬 SQLite, AI 는 LLM_FAKE 가짜 모델을 사용하므로 외부 네트워크 없이 실행됨
+#
+#   python loadtest.py run --clients 50 --duration 60 --speed 5
+#   python loadtest.py compare data/loadtest/이전.json data/loadtest/이번.json
+
+USD_KRW = 1400.0
+BASE_SYMBOLS = {"BTC": 97000.0, "ETH": 3400.0, "XRP": 2.3, "SOL": 190.0, "DOGE": 0.38}
+USDT_PREMIUM = 0.012  # 국내 KRW-USDT 시세는 코인보다 김프가 낮음 (차익 경로 탐색용)
+
+
+# ---------------- 가짜 업스트림 서버 ----------------
+
+class FakeMarket:
+    """시간에 따라 움직이는 가짜 시세 (바이낸스 USDT 가격 기준, 국내는 김프를 얹음)"""
+
+    def __init__(self, extra_symbols=60, seed=1):
+        rng = random.Random(seed)
+        self.base = dict(BASE_SYMBOLS)
+        for i in range(extra_symbols):
+            self.base[f"SYM{i}"] = rng.uniform(0.01, 50)
+        self.premium = {"upbit": 0.025, "bithumb": 0.022}
+        self.started = time.time()
+
+    def usdt(self, symbol):
+        if symbol == "USDT":
+            return 1.0
+        t = time.time() - self.started
+        phase = hash(symbol) % 100
+        return self.base[symbol] * (1 + 0.002 * ((t + phase) % 60 - 30) / 30)
+
+    def krw(self, venue, symbol):
+        if symbol == "USDT":
+            return round(USD_KRW * (1 + USDT_PREMIUM), 2)
+        return round(self.usdt(symbol) * USD_KRW * (1 + self.premium[venue]), 2)
+
+
+def fake_upstream_app(latency_ms=30.0, jitter=0.3, error_rate=0.0, rate_limit=0.0, seed=1):
+    """업비트/빗썸/바이낸스/환율 API 흉내. 경로 앞부분이 소스 이름 (/upbit/v1/ticker 등).
+    rate_limit > 0 이면 소스별 초당 요청 수를 넘으면 429 + Retry-After"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    market = FakeMarket(seed=seed)
+    rng = random.Random(seed)
+    calls = Counter()
+    statuses = Counter()
+    windows = defaultdict(lambda: [0.0, 0])  # source -> [초 시작, 요청 수]
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        source = request.url.path.strip("/").split("/")[0]
+        if source == "__stats":
+            return await call_next(request)
+        calls[f"{source} {request.url.path}"] += 1
+        await asyncio.sleep(latency_ms / 1000 * rng.lognormvariate(0, jitter))
+        if rate_limit:
+            window = windows[source]
+            now = time.time()
+            if now - window[0] >= 1:
+                window[0], window[1] = now, 0
+            window[1] += 1
+            if window[1] > rate_limit:
+                statuses[f"{source} 429"] += 1
+                return JSONResponse({"error": "too many requests"}, status_code=429, headers={"Retry-After": "1"})
+        if rng.random() < error_rate:
+            statuses[f"{source} 500"] += 1
+            return JSONResponse({"error": "fake failure"}, status_code=500)
+        statuses[f"{source} 200"] += 1
+        return await call_next(request)
+
+    def markets_param(request):
+        markets = request.query_params.get("markets", "KRW-BTC")
+        return [m for m in markets.split(",") if m[4:] in market.base or m == "KRW-USDT"]
+
+    @app.get("/fx/v4/latest/USD")
+    async def fx():
+        return {"base": "USD", "rates": {"KRW": USD_KRW}}
+
+    @app.get("/{venue}/v1/market/all")
+    async def market_all(venue: str):
+        return [{"market": f"KRW-{s}"} for s in ["USDT", *market.base]]
+
+    @app.get("/{venue}/v1/ticker")
+    async def ticker(venue: str, request: Request):
+        return [{"market": m, "trade_price": market.krw(venue, m[4:])} for m in markets_param(request)]
+
+    @app.get("/{venue}/v1/orderbook")
+    async def orderbook(venue: str, request: Request):
+        books = []
+        for m in markets_param(request):
+            mid = market.krw(venue, m[4:])
+            units = [{
+                "ask_price": round(mid * (1 + 0.0002 * i), 2), "ask_size": 0.2 * 1.3 ** i,
+                "bid_price": round(mid * (1 - 0.0002 * i), 2), "bid_size": 0.2 * 1.3 ** i
+            } for i in range(1, 16)]
+            books.append({"market": m, "timestamp": int(time.time() * 1000), "orderbook_units": units})
+        return books
+
+    @app.get("/{venue}/v1/accounts")
+    async def accounts(venue: str, request: Request):
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"error": "unauthorized"}, status_code=401)
+        return [
+            {"currency": "KRW", "balance": "1000000", "locked": "0", "avg_buy_price": "0"},
+            {"currency": "BTC", "balance": "0.01", "locked": "0", "avg_buy_price": "140000000"}
+        ]
+
+    @app.get("/binance/api/v3/ticker/price")
+    async def binance(request: Request):
+        symbol = request.query_params.get("symbol")
+        if symbol:
+            return {"symbol": symbol, "price": f"{market.usdt(symbol[:-4]):.8f}"}
+        return [{"symbol": f"{s}USDT", "price": f"{market.usdt(s):.8f}"} for s in market.base]
+
+    @app.get("/binance/api/v3/depth")
+    async def depth(symbol: str, limit: int = 100):
+        mid = market.usdt(symbol[:-4])
+        levels = range(1, min(limit, 50) + 1)
+        return {
+            "lastUpdateId": int(time.time() * 1000),
+            "asks": [[f"{mid * (1 + 0.0001 * i):.8f}", f"{0.5 * 1.2 ** i:.8f}"] for i in levels],
+            "bids": [[f"{mid * (1 - 0.0001 * i):.8f}", f"{0.5 * 1.2 ** i:.8f}"] for i in levels]
+        }
+
+    @app.get("/__stats")
+    async def stats(reset: bool = False):
+        result = {"calls": dict(calls), "statuses": dict(statuses)}
+        if reset:
+            calls.clear()
+            statuses.clear()
+        return result
+
+    return app
+
+
+# ---------------- 측정 대상 앱 (이벤트 루프 지연 측정 포함) ----------------
+
+class LagSamples:
+    """metrics.LoopLagMonitor 의 히스토그램 자리에 넣는 원시 값 수집기 (버킷 대신 백분위 계산용, ms)"""
+
+    def __init__(self):
+        self.samples = []
+
+    def observe(self, value, *labels):
+        self.samples.append(value * 1000)
+
+    def report(self, reset=False):
+        result = summarize(self.samples)
+        if reset:
+            self.samples = []
+        return result
+
+
+def serve_app(port):
+    """app.py 를 그대로 띄우고 /__loadtest/lag 경로만 덧붙임"""
+    import uvicorn
+    import app as target
+    from metrics import LoopLagMonitor
+
+    lag = LagSamples()
+    probe = LoopLagMonitor(lag, interval=0.05)
+
+    @target.app.on_event("startup")
+    async def start_lag_probe():
+        probe.start()
+
+    @target.app.get("/__loadtest/lag")
+    async def loop_lag(reset: bool = False):
+        return lag.report(reset)
+
+    uvicorn.run(target.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# ---------------- 대시보드 클라이언트 ----------------
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize(samples):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.5), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(values[-1], 3)
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = defaultdict(list)   # endpoint -> ms
+        self.statuses = defaultdict(Counter)
+        self.bytes = Counter()
+        self.sse_events = Counter()
+        self.sse_bytes = 0
+
+    def record(self, endpoint, ms, status, size):
+        self.latency[endpoint].append(ms)
+        self.statuses[endpoint][status] += 1
+        self.bytes[endpoint] += size
+
+    def report(self):
+        return {
+            endpoint: {
+                **summarize(samples),
+                "statuses": dict(self.statuses[endpoint]),
+                "bytes": self.bytes[endpoint]
+            }
+            for endpoint, samples in sorted(self.latency.items())
+        }
+
+
+class Dashboard:
+    """index.html 의 호출 순서/주기를 흉내 내는 가상 브라우저 (ETag 캐시 포함)"""
+
+    def __init__(self, base, auth, recorder, speed=1.0, chat=False):
+        self.base = base
+        self.auth = auth
+        self.recorder = recorder
+        self.speed = speed
+        self.chat = chat
+        self.etags = {}
+        self.http = None
+
+    async def get(self, path, endpoint=None):
+        endpoint = endpoint or path.split("?")[0]
+        headers = {"Accept-Encoding": "gzip"}
+        if path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        started = time.perf_counter()
+        try:
+            res = await self.http.get(path, headers=headers)
+            size = res.num_bytes_downloaded  # 압축된 전송 크기
+            status = res.status_code
+            if "etag" in res.headers:
+                self.etags[path] = res.headers["etag"]
+        except httpx.HTTPError as e:
+            size, status = 0, type(e).__name__
+        self.recorder.record(endpoint, (time.perf_counter() - started) * 1000, status, size)
+
+    async def post(self, path, body):
+        started = time.perf_counter()
+        try:
+            res = await self.http.post(path, json=body)
+            size, status = len(res.content), res.status_code
+        except httpx.HTTPError as e:
+            size, status = 0, type(e).__name__
+        self.recorder.record(f"POST {path}", (time.perf_counter() - started) * 1000, status, size)
+
+    async def every(self, seconds, *paths):
+        while True:
+            await asyncio.sleep(seconds / self.speed)
+            for path in paths:
+                await self.get(path)
+
+    async def stream(self):
+        """SSE 구독 유지 (이벤트 종류별 수신 개수)"""
+        try:
+            async with self.http.stream("GET", "/api/stream", timeout=None) as res:
+                event = "message"
+                async for line in res.aiter_lines():
+                    self.recorder.sse_bytes += len(line) + 1
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        self.recorder.sse_events[event] += 1
+                        event = "message"
+        except httpx.HTTPError:
+            self.recorder.sse_events["disconnect"] += 1
+
+    async def run(self, until):
+        async with httpx.AsyncClient(base_url=self.base, auth=self.auth, timeout=30,
+                                     limits=httpx.Limits(max_connections=6)) as http:
+            self.http = http
+            # 페이지 로드 직후 (index.html 하단 초기화 순서)
+            await self.get("/")
+            await asyncio.gather(
+                self.get("/api/balances"), self.get("/api/mock-wallet"), self.get("/api/ai-suggestion"),
+                self.get("/api/price-history?resolution=raw"), self.get("/api/market-data")
+            )
+            # SSE 연결 시 resync
+            await asyncio.gather(self.get("/api/rules"), self.get("/api/rule-signals"))
+            tasks = [
+                asyncio.create_task(self.stream()),
+                asyncio.create_task(self.every(10, "/api/balances", "/api/mock-wallet")),
+                asyncio.create_task(self.every(120, "/api/ai-suggestion"))
+            ]
+            if self.chat:
+                await self.post("/api/ai-chat", {"message": "지금 김프 전략 하나만", "model_type": "gemini"})
+            await asyncio.sleep(max(0.0, until - time.time()))
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# ---------------- 실행 ----------------
+
+async def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.time() < deadline:
+            try:
+                if (await http.get(url, timeout=2)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.3)
+    raise RuntimeError(f"서버 응답 없음: {url}")
+
+
+def spawn(args, env=None):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)] + args, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run(args):
+    fake = f"http://127.0.0.1:{args.fake_port}"
+    base = f"http://127.0.0.1:{args.app_port}"
+    password = "loadtest"
+    workdir = tempfile.mkdtemp(prefix="kimp-loadtest-")
+    env = dict(os.environ)
+    env.update({
+        "UPBIT_API_URL": f"{fake}/upbit", "BITHUMB_API_URL": f"{fake}/bithumb",
+        "BINANCE_API_URL": f"{fake}/binance", "FX_API_URL": f"{fake}/fx",
+        "UPBIT_ACCESS_KEY": "loadtest", "UPBIT_SECRET_KEY": "loadtest",
+        "BITHUMB_ACCESS_KEY": "loadtest", "BITHUMB_SECRET_KEY": "loadtest",
+        "SUPABASE_URL": "", "SUPABASE_SERVICE_KEY": "",
+        "LOCAL_DB_PATH": os.path.join(workdir, "local.db"),
+        "TICK_STORE_DIR": os.path.join(workdir, "ticks"),
+        "TICKER_STREAM_SYMBOLS": "",
+        "GEMINI_API_KEY": "", "LLM_FAKE": "1", "LLM_FAKE_LATENCY_SEC": str(args.llm_latency),
+        "ADMIN_PASSWORD": password
+    })
+    processes = [spawn(["fake-upstream", "--port", str(args.fake_port), "--latency-ms", str(args.latency_ms),
+                        "--error-rate", str(args.error_rate), "--rate-limit", str(args.rate_limit)])]
+    try:
+        await wait_ready(f"{fake}/__stats")
+        processes.append(spawn(["serve-app", "--port", str(args.app_port)], env))
+        await wait_ready(f"{base}/manual")
+        await asyncio.sleep(args.warmup)
+        async with httpx.AsyncClient(base_url=base) as http:
+            await http.get(f"{fake}/__stats", params={"reset": True})
+            await http.get("/__loadtest/lag", params={"reset": True})
+
+        recorder = Recorder()
+        started = time.time()
+        until = started + args.duration
+        clients = []
+        for i in range(args.clients):
+            dashboard = Dashboard(base, ("loadtest", password), recorder, args.speed, chat=i < args.chat_clients)
+            clients.append(asyncio.create_task(dashboard.run(until)))
+            await asyncio.sleep(args.ramp / max(args.clients, 1))
+        await asyncio.gather(*clients)
+        elapsed = time.time() - started
+
+        async with httpx.AsyncClient(base_url=base) as http:
+            upstream = (await http.get(f"{fake}/__stats")).json()
+            lag = (await http.get("/__loadtest/lag")).json()
+            app_status = (await http.get("/api/upstream-status")).json()
+            gateway = (await http.get("/api/ai-gateway")).json()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    endpoints = recorder.report()
+    result = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "config": {k: v for k, v in vars(args).items() if k not in ("command", "out")},
+        "elapsed_sec": round(elapsed, 2),
+        "endpoints": endpoints,
+        "requests": sum(e["count"] for e in endpoints.values()),
+        "response_bytes": sum(e["bytes"] for e in endpoints.values()),
+        "sse": {"events": dict(recorder.sse_events), "bytes": recorder.sse_bytes},
+        "upstream_calls": upstream["calls"],
+        "upstream_statuses": upstream["statuses"],
+        "loop_lag_ms": lag,
+        "app": {"upstream": app_status, "ai_gateway": gateway}
+    }
+    out = args.out or os.path.join("data", "loadtest", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print_report(result)
+    print(f"\n결과 저장: {out}")
+    return result
+
+
+def print_report(result):
+    print(f"대시보드 {result['config']['clients']}개 × {result['elapsed_sec']}초 "
+          f"(배속 {result['config']['speed']}), 요청 {result['requests']:,}건 / 응답 {result['response_bytes']:,}바이트")
+    print(f"{'endpoint':<28}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'bytes':>11}  statuses")
+    for endpoint, e in result["endpoints"].items():
+        print(f"{endpoint:<28}{e['count']:>7}{e['p50']:>9.1f}{e['p95']:>9.1f}{e['p99']:>9.1f}{e['bytes']:>11,}  {e['statuses']}")
+    lag = result["loop_lag_ms"]
+    if lag.get("count"):
+        print(f"이벤트 루프 지연(ms): p50 {lag['p50']} / p95 {lag['p95']} / p99 {lag['p99']} / max {lag['max']}")
+    calls = Counter()
+    for route, n in result["upstream_calls"].items():
+        calls[route.split(" ")[0]] += n
+    print("업스트림 호출:", dict(calls), "| SSE 이벤트:", result["sse"]["events"])
+
+
+def compare(before_path, after_path):
+    """두 실행 결과의 엔드포인트별 p50/p95/p99 비교 (ms, 변화율)"""
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{'endpoint':<28}" + "".join(f"{q:>22}" for q in ("p50", "p95", "p99")))
+    for endpoint in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        b, a = before["endpoints"].get(endpoint, {}), after["endpoints"].get(endpoint, {})
+        cells = []
+        for q in ("p50", "p95", "p99"):
+            if b.get(q) is None or a.get(q) is None:
+                cells.append(f"{'-':>22}")
+                continue
+            change = (a[q] / b[q] - 1) * 100 if b[q] else 0.0
+            cells.append(f"{b[q]:>8.1f} → {a[q]:>7.1f} {change:+5.0f}%")
+        print(f"{endpoint:<28}" + "".join(cells))
+    for key in ("p95", "p99"):
+        b, a = before["loop_lag_ms"].get(key), after["loop_lag_ms"].get(key)
+        if b is not None and a is not None:
+            print(f"이벤트 루프 지연 {key}: {b} → {a} ms")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="오프라인 부하 테스트 (가짜 거래소/AI + 가상 대시보드)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--clients", type=int, default=20)
+    r.add_argument("--duration", type=float, default=60, help="측정 시간(초)")
+    r.add_argument("--ramp", type=float, default=5, help="클라이언트를 나눠서 접속시키는 시간(초)")
+    r.add_argument("--speed", type=float, default=1.0, help="폴링 주기 배속 (5면 10초 주기를 2초로)")
+    r.add_argument("--chat-clients", type=int, default=0, help="접속 직후 AI 채팅을 한 번 보내는 클라이언트 수")
+    r.add_argument("--latency-ms", type=float, default=30, help="가짜 업스트림 응답 지연")
+    r.add_argument("--error-rate", type=float, default=0.0, help="가짜 업스트림 500 비율")
+    r.add_argument("--rate-limit", type=float, default=0, help="가짜 업스트림 소스별 초당 한도 (0이면 없음)")
+    r.add_argument("--llm-latency", type=float, default=1.5, help="가짜 AI 응답 시간(초)")
+    r.add_argument("--warmup", type=float, default=3, help="앱 기동 후 측정 전 대기(초)")
+    r.add_argument("--fake-port", type=int, default=9100)
+    r.add_argument("--app-port", type=int, default=9200)
+    r.add_argument("--out", help="결과 JSON 경로 (기본 data/loadtest/시각.json)")
+    c = sub.add_parser("compare")
+    c.add_argument("before")
+    c.add_argument("after")
+    f = sub.add_parser("fake-upstream")
+    f.add_argument("--port", type=int, default=9100)
+    f.add_argument("--latency-ms", type=float, default=30)
+    f.add_argument("--error-rate", type=float, default=0.0)
+    f.add_argument("--rate-limit", type=float, default=0)
+    a = sub.add_parser("serve-app")
+    a.add_argument("--port", type=int, default=9200)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        asyncio.run(run(args))
+    elif args.command == "compare":
+        compare(args.before, args.after)
+    elif args.command == "fake-upstream":
+        import uvicorn
+        app = fake_upstream_app(args.latency_ms, error_rate=args.error_rate, rate_limit=args.rate_limit)
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        serve_app(args.port)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,220 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# 슈파베이스(PostgREST) 클라이언트에서 앱이 쓰는 부분만 흉내 낸 SQLite 대체 저장소.
+# 테이블마다 (id, data JSON) 한 쌍으로 저장하므로 스키마 없이 아무 테이블이나 사용 가능
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class Query:
+    """db.table(name).select(...).eq(...).order(...).limit(...).execute() 형태의 체인"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table_name = table
+        self.action = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.orders = []
+        self.limit_n = None
+        self.offset_n = 0
+        self.single_mode = None
+
+    # ---- 동작 ----
+    def select(self, columns="*"):
+        self.action = "select"
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict="id"):
+        self.action, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, values):
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # ---- 조건 ----
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        """PostgREST 방식 페이지 조회 (start~end 포함)"""
+        self.offset_n, self.limit_n = start, end - start + 1
+        return self
+
+    def single(self):
+        self.single_mode = "single"
+        return self
+
+    def maybe_single(self):
+        self.single_mode = "maybe"
+        return self
+
+    def execute(self):
+        with self.db.lock:
+            result = getattr(self, f"_{self.action}")()
+            self.db.conn.commit()
+        return Result(result)
+
+    # ---- 실행 ----
+    def _where(self):
+        if not self.filters:
+            return "", []
+        clauses, params = [], []
+        for column, value in self.filters:
+            if column == "id":
+                clauses.append("id = ?")
+            else:
+                clauses.append(f"json_extract(data, '$.{column}') = ?")
+            params.append(value)
+        return " WHERE " + " AND ".join(clauses), params
+
+    def _rows(self, sql, params):
+        rows = []
+        for row_id, data in self.db.conn.execute(sql, params):
+            row = json.loads(data)
+            row["id"] = row_id
+            rows.append(row)
+        return rows
+
+    def _select(self):
+        where, params = self._where()
+        sql = f"SELECT id, data FROM {self.db.ensure(self.table_name)}{where}"
+        if self.orders:
+            sql += " ORDER BY " + ", ".join(
+                ("id" if c == "id" else f"json_extract(data, '$.{c}')") + (" DESC" if desc else "") for c, desc in self.orders
+            )
+        if self.limit_n:
+            sql += f" LIMIT {int(self.limit_n)} OFFSET {int(self.offset_n)}"
+        rows = self._rows(sql, params)
+        if self.single_mode == "single":
+            if len(rows) != 1:
+                raise ValueError(f"{self.table_name}: 결과가 1건이 아닙니다 ({len(rows)}건)")
+            return rows[0]
+        if self.single_mode == "maybe":
+            return rows[0] if rows else None
+        return rows
+
+    def _prepare(self, row):
+        """'now()' 는 저장 시각으로 치환 (PostgREST 기본값 흉내)"""
+        return {k: _now() if v == "now()" else v for k, v in row.items() if k != "id"}
+
+    def _insert(self):
+        table = self.db.ensure(self.table_name)
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        out = []
+        for row in rows:
+            data = self._prepare(row)
+            if "id" in row:
+                cur = self.db.conn.execute(f"INSERT INTO {table} (id, data) VALUES (?, ?)", (row["id"], json.dumps(data)))
+            else:
+                cur = self.db.conn.execute(f"INSERT INTO {table} (data) VALUES (?)", (json.dumps(data),))
+            out.append({**data, "id": cur.lastrowid})
+        return out
+
+    def _upsert(self):
+        table = self.db.ensure(self.table_name)
+        if self.on_conflict != "id":
+            self.db.ensure_index(table, self.on_conflict)
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        out = []
+        for row in rows:
+            data = self._prepare(row)
+            if self.on_conflict == "id":
+                existing = self.db.conn.execute(f"SELECT id, data FROM {table} WHERE id = ?", (row.get("id"),)).fetchone()
+            else:
+                existing = self.db.conn.execute(
+                    f"SELECT id, data FROM {table} WHERE json_extract(data, '$.{self.on_conflict}') = ?",
+                    (row.get(self.on_conflict),)
+                ).fetchone()
+            if existing:
+                merged = {**json.loads(existing[1]), **data}
+                self.db.conn.execute(f"UPDATE {table} SET data = ? WHERE id = ?", (json.dumps(merged), existing[0]))
+                out.append({**merged, "id": existing[0]})
+            elif "id" in row:
+                self.db.conn.execute(f"INSERT INTO {table} (id, data) VALUES (?, ?)", (row["id"], json.dumps(data)))
+                out.append({**data, "id": row["id"]})
+            else:
+                cur = self.db.conn.execute(f"INSERT INTO {table} (data) VALUES (?)", (json.dumps(data),))
+                out.append({**data, "id": cur.lastrowid})
+        return out
+
+    def _update(self):
+        where, params = self._where()
+        table = self.db.ensure(self.table_name)
+        rows = self._rows(f"SELECT id, data FROM {table}{where}", params)
+        values = self._prepare(self.payload)
+        for row in rows:
+            row.update(values)
+            data = {k: v for k, v in row.items() if k != "id"}
+            self.db.conn.execute(f"UPDATE {table} SET data = ? WHERE id = ?", (json.dumps(data), row["id"]))
+        return rows
+
+    def _delete(self):
+        where, params = self._where()
+        table = self.db.ensure(self.table_name)
+        rows = self._rows(f"SELECT id, data FROM {table}{where}", params)
+        self.db.conn.execute(f"DELETE FROM {table}{where}", params)
+        return rows
+
+
+class LocalDB:
+    """슈파베이스 미설정 시 쓰는 로컬 저장소 (db.table(...) 인터페이스 호환)"""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self._tables = set()
+
+    def ensure(self, table):
+        if not table.replace("_", "").isalnum():
+            raise ValueError(f"잘못된 테이블 이름: {table}")
+        if table not in self._tables:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)")
+            self._tables.add(table)
+        return table
+
+    def ensure_index(self, table, column):
+        """upsert 충돌 컬럼 조회용 표현식 인덱스 (대량 upsert 가 행마다 전체 스캔하지 않도록)"""
+        if (table, column) not in self._tables:
+            if not column.replace("_", "").isalnum():
+                raise ValueError(f"잘못된 컬럼 이름: {column}")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} (json_extract(data, '$.{column}'))")
+            self._tables.add((table, column))
+
+    def table(self, name):
+        return Query(self, name)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,80 @@
+import os
+import time
+import asyncio
+import inspect
+
+
+class SnapshotPoller:
+    """백그라운드 태스크 하나가 스냅샷을 주기적으로 갱신하고, 모든 요청은 메모리에서 읽는다"""
+
+    def __init__(self, fetch, interval=5.0, max_staleness=15.0, name="market"):
+        self.fetch = fetch                  # 인자 없는 코루틴 함수, 또는 동기 함수 (스레드에서 실행)
+        self.interval = interval            # 갱신 주기 (초)
+        self.max_staleness = max_staleness  # 이보다 오래된 스냅샷은 읽을 때 즉시 갱신
+        self.name = name
+        self.snapshot = None
+        self.updated_at = 0.0
+        self.listeners = []                 # 갱신될 때마다 호출되는 콜백 (snapshot, updated_at)
+        self.passive = False                # True 면 직접 조회하지 않고 mirror() 로만 받음 (멀티 워커의 팔로워)
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def age(self):
+        """마지막 갱신 이후 경과 시간 (초)"""
+        if not self.updated_at:
+            return None
+        return time.time() - self.updated_at
+
+    def is_stale(self):
+        age = self.age()
+        return age is None or age > self.max_staleness
+
+    async def refresh(self):
+        """업스트림을 한 번 조회해서 스냅샷 교체 (동시 호출은 하나로 합쳐짐)"""
+        requested_at = time.time()
+        async with self._lock:
+            # 락을 기다리는 동안 다른 호출이 이미 갱신했다면 그 결과를 그대로 사용
+            if self.updated_at >= requested_at:
+                return self.snapshot
+            if inspect.iscoroutinefunction(self.fetch):
+                data = await self.fetch()
+            else:
+                data = await asyncio.to_thread(self.fetch)
+            self.snapshot = data
+            self.updated_at = time.time()
+        for listener in self.listeners:
+            try:
+                listener(data, self.updated_at)
+            except Exception as e:
+                print(f"[{self.name}] 리스너 오류: {e}")
+        return data
+
+    def mirror(self, snapshot, updated_at):
+        """다른 프로세스가 갱신한 스냅샷을 그대로 반영 (리스너는 호출하지 않음)"""
+        self.snapshot, self.updated_at = snapshot, updated_at
+
+    async def get(self):
+        """현재 스냅샷 반환 (허용 지연을 넘겼으면 먼저 갱신)"""
+        if self.is_stale() and not self.passive:
+            await self.refresh()
+        return self.snapshot
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[{self.name}] 스냅샷 갱신 오류: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+
+def poller_from_env(fetch, prefix="MARKET", name="market", default_interval=5):
+    """MARKET_REFRESH_SEC / MARKET_MAX_STALENESS_SEC 환경변수로 주기 설정"""
+    interval = float(os.getenv(f"{prefix}_REFRESH_SEC", str(default_interval)))
+    max_staleness = float(os.getenv(f"{prefix}_MAX_STALENESS_SEC", str(interval * 3)))
+    return SnapshotPoller(fetch, interval=interval, max_staleness=max_staleness, name=name)
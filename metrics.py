@@ -0,0 +1,320 @@
+import sys
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from collections import Counter as _Tally
+
+# Prometheus 텍스트 형식 지표 (외부 라이브러리 없이). 요청 경로에서는 숫자 더하기만 하고
+# 문자열 조립은 /metrics 를 긁어갈 때만. 이미 각 모듈이 세고 있는 값은 수집 시점에 콜백으로 읽음
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """라벨 조합별 버킷 카운트. observe 는 이진 탐색 한 번 + 정수 덧셈"""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}   # labels -> [버킷별 개수..., +Inf 개수, 합계]
+
+    def observe(self, value, *labels):
+        row = self.series.get(labels)
+        if row is None:
+            row = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, row in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += count
+                le = _labels(self.labelnames + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """수집 시점에 fn() 을 호출. fn 은 숫자 또는 {라벨 튜플: 숫자} 반환"""
+
+    def __init__(self, name, help, fn, labels=(), kind="gauge"):
+        self.name, self.help, self.fn, self.labelnames, self.kind = name, help, fn, tuple(labels), kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            return lines + [f"# {self.name} 수집 실패: {e!r}"]
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                if v is not None:
+                    labels = labels if isinstance(labels, tuple) else (labels,)
+                    lines.append(f"{self.name}{_labels(self.labelnames, labels)} {float(v)}")
+        elif value is not None:
+            lines.append(f"{self.name} {float(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=(), kind="gauge"):
+        return self._add(Gauge(name, help, fn, labels, kind))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """엔드포인트별 응답 시작까지 걸린 시간 (SSE/스트리밍은 첫 바이트까지).
+    라벨은 라우트 경로 템플릿이라 쿼리/경로 값이 달라도 계열이 늘지 않음"""
+
+    def __init__(self, app, histogram, counter):
+        self.app = app
+        self.histogram = histogram
+        self.counter = counter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        observed = False
+
+        async def timed_send(message):
+            nonlocal observed
+            if message["type"] == "http.response.start" and not observed:
+                observed = True
+                route = scope.get("route")
+                path = getattr(route, "path", "other")
+                self.histogram.observe(time.perf_counter() - started, path)
+                self.counter.inc(scope["method"], path, message["status"])
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+class _Query:
+    """db.table(...) 빌더 체인을 감싸서 execute() 시간만 잼"""
+
+    __slots__ = ("_inner", "_table", "_op", "_histogram", "_errors")
+
+    def __init__(self, inner, table, histogram, errors, op="select"):
+        self._inner, self._table, self._histogram, self._errors, self._op = inner, table, histogram, errors, op
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name == "execute":
+            def execute(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                except Exception:
+                    self._errors.inc(self._table, self._op)
+                    raise
+                finally:
+                    self._histogram.observe(time.perf_counter() - started, self._table, self._op)
+            return execute
+
+        def chained(*args, **kwargs):
+            op = name if name in ("select", "insert", "upsert", "update", "delete") else self._op
+            return _Query(attr(*args, **kwargs), self._table, self._histogram, self._errors, op)
+        return chained
+
+
+class InstrumentedDB:
+    """슈파베이스 클라이언트 / LocalDB 공용 계측 래퍼 (table/동작별 지연·오류)"""
+
+    def __init__(self, db, histogram, errors):
+        self.db, self.histogram, self.errors = db, histogram, errors
+
+    def table(self, name):
+        return _Query(self.db.table(name), name, self.histogram, self.errors)
+
+
+class LoopLagMonitor:
+    """interval 마다 깨어나서 늦게 깬 만큼을 이벤트 루프 지연으로 기록"""
+
+    def __init__(self, histogram, interval=0.25):
+        self.histogram = histogram
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self._task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - started - self.interval)
+            self.max = max(self.max, self.last)
+            self.histogram.observe(self.last)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+
+class TaskHealth:
+    """백그라운드 태스크 상태: 살아 있는지, 마지막 성공 시각, 실패 횟수"""
+
+    def __init__(self):
+        self.tasks = {}          # name -> asyncio.Task
+        self.last_success = {}   # name -> epoch
+        self.failures = _Tally()
+        self.last_error = {}
+
+    def watch(self, name, task):
+        self.tasks[name] = task
+        return task
+
+    def ok(self, name):
+        self.last_success[name] = time.time()
+
+    def fail(self, name, error):
+        self.failures[name] += 1
+        self.last_error[name] = repr(error)
+
+    def alive(self):
+        return {name: 0 if task.done() else 1 for name, task in self.tasks.items()}
+
+    def status(self):
+        return {
+            name: {
+                "alive": not task.done(),
+                "last_success": self.last_success.get(name),
+                "failures": self.failures[name],
+                "last_error": self.last_error.get(name)
+            }
+            for name, task in self.tasks.items()
+        }
+
+    def register(self, registry):
+        registry.gauge("background_task_alive", "백그라운드 태스크 실행 중 여부", self.alive, ("task",))
+        registry.gauge("background_task_last_success_timestamp_seconds", "마지막 성공 시각",
+                       lambda: dict(self.last_success), ("task",))
+        registry.gauge("background_task_failures_total", "백그라운드 태스크 실패 횟수",
+                       lambda: dict(self.failures), ("task",), kind="counter")
+
+
+class SamplingProfiler:
+    """지정한 스레드(이벤트 루프 스레드)의 호출 스택을 interval 마다 찍어서 집계.
+    결과는 flamegraph 도구가 읽는 collapsed 형식 (frame;frame;frame 개수). 실행 중일 때만 비용 발생"""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def _sample(self, seconds):
+        stacks = _Tally()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                stacks[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+    async def profile(self, seconds=5.0):
+        """seconds 동안 별도 스레드에서 샘플링 (한 번에 하나만)"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("이미 프로파일링 중입니다")
+        try:
+            stacks = await asyncio.to_thread(self._sample, seconds)
+        finally:
+            self._lock.release()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def bench(n=1_000_000):
+    """계측 한 번에 드는 시간 (µs)"""
+    registry = Registry()
+    histogram = registry.histogram("bench_seconds", "bench", ("source",))
+    counter = registry.counter("bench_total", "bench", ("source", "outcome"))
+    started = time.perf_counter()
+    for i in range(n):
+        histogram.observe(0.0123, "upbit")
+    per_observe = (time.perf_counter() - started) / n * 1e6
+    started = time.perf_counter()
+    for i in range(n):
+        counter.inc("upbit", "ok")
+    per_inc = (time.perf_counter() - started) / n * 1e6
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"observe {per_observe:.3f}µs / inc {per_inc:.3f}µs / render {(time.perf_counter() - started) * 1e3:.2f}ms "
+          f"({len(text)}바이트)")
+
+
+if __name__ == "__main__":
+    bench()
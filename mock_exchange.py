@@ -0,0 +1,220 @@
+import sys
+import json
+import time
+import threading
+from orderbook import synthetic_book
+
+# 메모리 모의 거래소: 지갑은 메모리에만 두고 (지갑별 락으로 원자적 갱신) 주문은 호가를 훑어서 체결.
+# DB 에는 바뀐 지갑만 모아서 주기적으로 저장 (write-behind)
+
+
+class Wallet:
+    __slots__ = ("wallet_id", "krw", "assets", "lock", "trades", "fees")
+
+    def __init__(self, wallet_id, krw, assets=None):
+        self.wallet_id = wallet_id
+        self.krw = float(krw)
+        self.assets = {k: float(v) for k, v in (assets or {}).items()}
+        self.lock = threading.Lock()
+        self.trades = 0
+        self.fees = 0.0
+
+    def to_row(self):
+        return {"id": self.wallet_id, "krw": self.krw, "assets": {k: v for k, v in self.assets.items() if v > 0}}
+
+
+class MockExchange:
+    """여러 지갑(전략별)을 메모리에서 관리하는 모의 체결 엔진.
+    place_order 는 await 없이 끝나는 동기 함수라 이벤트 루프 안에서는 주문 사이에 끼어들 틈이 없고,
+    스레드(백테스트 등)에서 호출해도 지갑 락으로 잔고가 꼬이지 않음"""
+
+    def __init__(self, initial_krw=10_000_000, fee_rate=0.0005, keep_fills=200):
+        self.initial_krw = initial_krw
+        self.fee_rate = fee_rate   # 업비트 원화마켓 수수료 0.05%
+        self.keep_fills = keep_fills
+        self.wallets = {}
+        self.fills = []
+        self.orders = 0
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def wallet(self, wallet_id):
+        """없으면 초기 자금으로 새 지갑 생성"""
+        wallet_id = int(wallet_id)
+        w = self.wallets.get(wallet_id)
+        if w is None:
+            with self._lock:
+                w = self.wallets.get(wallet_id)
+                if w is None:
+                    w = self.wallets[wallet_id] = Wallet(wallet_id, self.initial_krw)
+                    self._dirty.add(wallet_id)
+        return w
+
+    def load(self, rows):
+        """DB mock_wallet 행으로 지갑 복원 (assets 는 dict 또는 JSON 문자열)"""
+        for row in rows:
+            assets = row.get("assets") or {}
+            if isinstance(assets, str):
+                assets = json.loads(assets)
+            self.wallets[int(row["id"])] = Wallet(int(row["id"]), row.get("krw", 0), assets)
+        return len(rows)
+
+    def export_state(self):
+        """다른 워커와 공유할 전체 상태 (지갑 + 최근 체결 + 저장 대기 지갑)"""
+        with self._lock:
+            dirty = sorted(self._dirty)
+        wallets = []
+        for w in list(self.wallets.values()):
+            with w.lock:
+                wallets.append({**w.to_row(), "trades": w.trades, "fees": w.fees})
+        return {"wallets": wallets, "fills": list(self.fills), "orders": self.orders, "dirty": dirty}
+
+    def restore_state(self, state):
+        """export_state() 결과로 메모리 상태 교체"""
+        wallets = {}
+        for row in state["wallets"]:
+            w = wallets[row["id"]] = Wallet(row["id"], row["krw"], row["assets"])
+            w.trades, w.fees = row["trades"], row["fees"]
+        with self._lock:
+            self.wallets = wallets
+            self.fills = list(state["fills"])
+            self.orders = state["orders"]
+            self._dirty = set(state["dirty"])
+
+    def place_order(self, wallet_id, side, symbol, book, amount_krw=None, qty=None):
+        """시장가 주문. 매수는 원화 금액, 매도는 수량 (없으면 전량).
+        호가를 훑어 평균 체결가를 계산하고 수수료를 뗌 → 체결 결과 dict"""
+        if book is None:
+            return {"status": "error", "message": "호가 없음 - 주문 보류"}
+        w = self.wallet(wallet_id)
+        with w.lock:
+            if side == "buy":
+                amount_krw = float(amount_krw or 0)
+                if amount_krw <= 0:
+                    return {"status": "error", "message": "주문 금액이 없습니다"}
+                fee = amount_krw * self.fee_rate
+                if w.krw < amount_krw + fee:
+                    return {"status": "error", "message": "잔액 부족"}
+                filled, spent = book.buy_krw(amount_krw)
+                if filled <= 0:
+                    return {"status": "error", "message": "호가 잔량 없음"}
+                fee = spent * self.fee_rate
+                w.krw -= spent + fee
+                w.assets[symbol] = w.assets.get(symbol, 0.0) + filled
+                krw = spent
+                ref = book.ask_px[0]
+            elif side == "sell":
+                held = w.assets.get(symbol, 0.0)
+                qty = held if qty is None else min(float(qty), held)
+                if qty <= 0:
+                    return {"status": "error", "message": "보유 수량 부족"}
+                filled, krw = book.sell_qty(qty)
+                if filled <= 0:
+                    return {"status": "error", "message": "호가 잔량 없음"}
+                fee = krw * self.fee_rate
+                w.krw += krw - fee
+                w.assets[symbol] = held - filled
+                ref = book.bid_px[0]
+            else:
+                return {"status": "error", "message": f"알 수 없는 주문 방향: {side}"}
+            w.trades += 1
+            w.fees += fee
+            wallet = w.to_row()
+        avg_price = krw / filled
+        fill = {
+            "status": "success",
+            "wallet_id": w.wallet_id,
+            "side": side,
+            "symbol": symbol,
+            "qty": filled,
+            "avg_price": avg_price,
+            "krw": krw,
+            "fee": fee,
+            # 최우선 호가 대비 불리하게 체결된 정도 (bp)
+            "slippage_bps": abs(avg_price / ref - 1) * 1e4,
+            "ts": time.time(),
+            "wallet": wallet
+        }
+        with self._lock:
+            self.orders += 1
+            self._dirty.add(w.wallet_id)
+            self.fills.append(fill)
+            if len(self.fills) > self.keep_fills:
+                del self.fills[:len(self.fills) - self.keep_fills]
+        return fill
+
+    def snapshot(self, wallet_id):
+        w = self.wallet(wallet_id)
+        with w.lock:
+            return {**w.to_row(), "trades": w.trades, "fees": w.fees}
+
+    def drain_dirty(self):
+        """마지막 저장 이후 바뀐 지갑 행 목록 (호출하면 변경 표시는 지워짐)"""
+        with self._lock:
+            ids, self._dirty = self._dirty, set()
+        rows = []
+        for wallet_id in ids:
+            w = self.wallets[wallet_id]
+            with w.lock:
+                rows.append(w.to_row())
+        return rows
+
+    def mark_dirty(self, wallet_ids):
+        """저장 실패한 지갑을 다음 주기에 다시 저장하도록 표시"""
+        with self._lock:
+            self._dirty.update(int(i) for i in wallet_ids)
+
+
+def persist(exchange, db, table="mock_wallet"):
+    """바뀐 지갑을 한 번의 upsert 로 저장 → 저장한 행 수. 실패하면 다시 변경 표시 후 예외 전달"""
+    rows = exchange.drain_dirty()
+    if not rows:
+        return 0
+    try:
+        db.table(table).upsert(rows).execute()
+    except Exception:
+        exchange.mark_dirty(r["id"] for r in rows)
+        raise
+    return len(rows)
+
+
+def bench(orders=200_000, wallets=16, threads=4, mid=1.4e8):
+    """합성 호가 기준 초당 주문 처리량 (단일 스레드 / 여러 스레드 동시 주문)"""
+    book = synthetic_book(mid)
+    exchange = MockExchange(initial_krw=1e15)
+    started = time.perf_counter()
+    for i in range(orders):
+        wallet_id = i % wallets
+        if i % 2 == 0:
+            exchange.place_order(wallet_id, "buy", "BTC", book, amount_krw=50_000 + (i % 97) * 10_000_000)
+        else:
+            exchange.place_order(wallet_id, "sell", "BTC", book, qty=None)
+    elapsed = time.perf_counter() - started
+    print(f"단일 스레드 {orders:,}건: {orders / elapsed:,.0f} 주문/초")
+
+    per_thread = orders // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            side = "buy" if i % 2 == 0 else "sell"
+            exchange.place_order((offset + i) % wallets, side, "BTC", book, amount_krw=1_000_000)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    print(f"{threads}개 스레드 {per_thread * threads:,}건: {per_thread * threads / elapsed:,.0f} 주문/초")
+
+    fill = exchange.place_order(0, "buy", "BTC", book, amount_krw=2e9)
+    print(f"20억 원 매수 슬리피지: {fill['slippage_bps']:.1f}bp (평균가 {fill['avg_price']:,.0f})")
+    print(f"저장 대기 지갑: {len(exchange.drain_dirty())}개")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench()
+    else:
+        print("사용법: python mock_exchange.py bench")
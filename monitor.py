@@ -1,60 +1,63 @@
 import os
 import time
-import requests
-import json
+import asyncio
+import httpx
 from dotenv import load_dotenv
+from upstream import UpstreamScheduler, CircuitOpenError, base_url
 
-# .env 파일 로드
-load_dotenv()
+def _get(url):
+    """동기 버전(CLI) 전용. 서버는 httpx 만 쓰므로 requests 는 처음 쓸 때 import"""
+    import requests
+    return requests.get(url)
 
 class KimchiPremiumMonitor:
     def __init__(self):
-        self.upbit_url = "https://api.upbit.com/v1/ticker"
-        self.bithumb_url = "https://api.bithumb.com/v1/ticker"
-        self.binance_url = "https://api.binance.com/api/v3/ticker/price"
-        self.fx_url = "https://api.exchangerate-api.com/v4/latest/USD" # 무료 환율 API 예시
+        self.upbit_url = base_url("upbit") + "/v1/ticker"
+        self.bithumb_url = base_url("bithumb") + "/v1/ticker"
+        self.binance_url = base_url("binance") + "/api/v3/ticker/price"
+        self.fx_url = base_url("fx") + "/v4/latest/USD" # 무료 환율 API 예시
 
     def get_exchange_rate(self):
         """달러 환율 가져오기"""
         try:
-            response = requests.get(self.fx_url)
+            response = _get(self.fx_url)
             data = response.json()
             return data['rates']['KRW']
         except Exception as e:
             print(f"환율 조회 실패: {e}")
-            return 1350.0  # 기본값
+            return None  # 임의 기본값을 쓰면 김프가 왜곡되므로 없음으로 처리
 
     def get_binance_price(self, symbol="BTCUSDT"):
         """바이낸스 현재가 조회"""
         try:
-            response = requests.get(f"{self.binance_url}?symbol={symbol}")
+            response = _get(f"{self.binance_url}?symbol={symbol}")
             return float(response.json()['price'])
         except Exception as e:
             print(f"바이낸스 조회 실패: {e}")
-            return 0.0
+            return None
 
     def get_upbit_price(self, symbol="KRW-BTC"):
         """업비트 현재가 조회"""
         try:
-            response = requests.get(f"{self.upbit_url}?markets={symbol}")
+            response = _get(f"{self.upbit_url}?markets={symbol}")
             return float(response.json()[0]['trade_price'])
         except Exception as e:
             print(f"업비트 조회 실패: {e}")
-            return 0.0
+            return None
 
     def get_bithumb_price(self, symbol="KRW-BTC"):
         """빗썸 현재가 조회"""
         try:
-            response = requests.get(f"{self.bithumb_url}?markets={symbol}")
+            response = _get(f"{self.bithumb_url}?markets={symbol}")
             return float(response.json()[0]['trade_price'])
         except Exception as e:
             print(f"빗썸 조회 실패: {e}")
-            return 0.0
+            return None
 
     def calculate_premium(self, local_price, binance_price, exchange_rate):
-        """김치 프리미엄 계산"""
-        if binance_price == 0 or exchange_rate == 0:
-            return 0.0
+        """김치 프리미엄 계산 (시세가 하나라도 없으면 None)"""
+        if not local_price or not binance_price or not exchange_rate:
+            return None
         foreign_price_krw = binance_price * exchange_rate
         premium = ((local_price / foreign_price_krw) - 1) * 100
         return premium
@@ -92,14 +95,110 @@ class KimchiPremiumMonitor:
             
             upbit_prem = self.calculate_premium(upbit_p, binance_p, usd_krw)
             bithumb_prem = self.calculate_premium(bithumb_p, binance_p, usd_krw)
-            gap = upbit_prem - bithumb_prem
+            gap = upbit_prem - bithumb_prem if upbit_prem is not None and bithumb_prem is not None else None
             
             curr_time = time.strftime("%H:%M:%S", time.localtime())
+            fmt = lambda v: "     -" if v is None else f"{v:6.2f}"
             
-            print(f"[{curr_time}] {upbit_prem:6.2f}% | {bithumb_prem:6.2f}% | {gap:6.2f}%")
+            print(f"[{curr_time}] {fmt(upbit_prem)}% | {fmt(bithumb_prem)}% | {fmt(gap)}%")
             
             time.sleep(5)  # 5초 간격
 
+class AsyncKimchiPremiumMonitor(KimchiPremiumMonitor):
+    """비동기 버전: 커넥션 풀을 재사용하고 네 소스를 동시에 조회 (서버용).
+    모든 조회는 UpstreamScheduler(소스별 TTL/요청 한도/서킷 브레이커)를 거침"""
+
+    source_labels = {"fx": "환율", "binance": "바이낸스", "upbit": "업비트", "bithumb": "빗썸"}
+
+    def __init__(self, max_connections=20, sources=None):
+        super().__init__()
+        self.max_connections = max_connections
+        self._client = None
+        self.scheduler = UpstreamScheduler(self._request, sources)
+        self.health = {}  # source -> {"stale", "updated_at", "error"}
+        # 조회 실패 시 마지막 정상값으로 대신한 횟수(stale) / 대신할 값도 없었던 횟수(missing)
+        self.fallbacks = {source: {"stale": 0, "missing": 0} for source in self.source_labels}
+
+    @property
+    def client(self):
+        """이벤트 루프 안에서 처음 쓸 때 풀링 클라이언트 생성"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, url, params, timeout):
+        return await self.client.get(url, params=params, timeout=timeout)
+
+    async def _get_json(self, source, url, params=None, ttl=None):
+        return await self.scheduler.get_json(source, url, params, ttl)
+
+    async def _quote(self, source, url, params, parse):
+        """조회 실패 시 기본값을 지어내지 않고 마지막 정상값을 stale로 표시해 반환 (정상값이 없으면 None)"""
+        try:
+            value = parse(await self._get_json(source, url, params))
+            self.health[source] = {"stale": False, "updated_at": self.scheduler.last_good(source, url, params)[1], "error": None}
+            return value
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                print(f"{self.source_labels[source]} 조회 실패: {e!r}")
+            cached = self.scheduler.last_good(source, url, params)
+            self.health[source] = {"stale": True, "updated_at": cached[1] if cached else None, "error": str(e)}
+            self.fallbacks[source]["stale" if cached else "missing"] += 1
+            return parse(cached[0]) if cached else None
+
+    async def get_exchange_rate(self):
+        """달러 환율 가져오기"""
+        return await self._quote("fx", self.fx_url, None, lambda data: data['rates']['KRW'])
+
+    async def get_binance_price(self, symbol="BTCUSDT"):
+        """바이낸스 현재가 조회"""
+        return await self._quote("binance", self.binance_url, {"symbol": symbol}, lambda data: float(data['price']))
+
+    async def get_upbit_price(self, symbol="KRW-BTC"):
+        """업비트 현재가 조회"""
+        return await self._quote("upbit", self.upbit_url, {"markets": symbol}, lambda data: float(data[0]['trade_price']))
+
+    async def get_bithumb_price(self, symbol="KRW-BTC"):
+        """빗썸 현재가 조회"""
+        return await self._quote("bithumb", self.bithumb_url, {"markets": symbol}, lambda data: float(data[0]['trade_price']))
+
+    async def get_combined_data(self, btc_symbol="KRW-BTC"):
+        """모든 시장 데이터를 동시에 수집 (소요 시간 ≈ 가장 느린 소스 하나)"""
+        usd_krw, binance_p, upbit_p, bithumb_p = await asyncio.gather(
+            self.get_exchange_rate(),
+            self.get_binance_price("BTCUSDT"),
+            self.get_upbit_price(btc_symbol),
+            self.get_bithumb_price(btc_symbol)
+        )
+
+        now = time.time()
+        return {
+            "prices": {
+                "binance": binance_p,
+                "upbit": upbit_p,
+                "bithumb": bithumb_p
+            },
+            "fx_rate": usd_krw,
+            "premiums": {
+                "upbit": self.calculate_premium(upbit_p, binance_p, usd_krw),
+                "bithumb": self.calculate_premium(bithumb_p, binance_p, usd_krw)
+            },
+            # 이번 조회에 실패해 마지막 정상값(또는 값 없음)을 쓴 소스와 소스별 데이터 나이
+            "stale": [source for source in self.source_labels if self.health.get(source, {}).get("stale", True)],
+            "ages": {
+                source: round(now - h["updated_at"], 1) if h.get("updated_at") else None
+                for source, h in ((source, self.health.get(source, {})) for source in self.source_labels)
+            }
+        }
+
 if __name__ == "__main__":
+    load_dotenv()
     monitor = KimchiPremiumMonitor()
     monitor.run()
@@ -0,0 +1,133 @@
+import time
+import numpy as np
+from upstream import base_url
+
+
+class OrderBook:
+    """호가 스냅샷 (매도호가 오름차순 / 매수호가 내림차순). 누적 합을 미리 계산해 두고
+    주문 크기만큼 호가를 훑는 계산은 이진 탐색 한 번으로 처리"""
+
+    def __init__(self, asks, bids, ts=None):
+        asks = np.asarray(asks, dtype=np.float64).reshape(-1, 2)
+        bids = np.asarray(bids, dtype=np.float64).reshape(-1, 2)
+        self.ask_px, self.ask_qty = asks[:, 0], asks[:, 1]
+        self.bid_px, self.bid_qty = bids[:, 0], bids[:, 1]
+        self.ts = ts or time.time()
+        self._ask_notional = np.cumsum(self.ask_px * self.ask_qty)
+        self._ask_cum_qty = np.cumsum(self.ask_qty)
+        self._bid_notional = np.cumsum(self.bid_px * self.bid_qty)
+        self._bid_cum_qty = np.cumsum(self.bid_qty)
+
+    @property
+    def mid(self):
+        if not len(self.ask_px) or not len(self.bid_px):
+            return None
+        return (self.ask_px[0] + self.bid_px[0]) / 2
+
+    def buy_krw(self, amount_krw):
+        """원화 금액만큼 시장가 매수 → (체결 수량, 사용 금액). 호가가 모자라면 있는 만큼만"""
+        if not len(self.ask_px) or amount_krw <= 0:
+            return 0.0, 0.0
+        i = int(np.searchsorted(self._ask_notional, amount_krw, side="left"))
+        if i >= len(self.ask_px):
+            return float(self._ask_cum_qty[-1]), float(self._ask_notional[-1])
+        spent_before = self._ask_notional[i - 1] if i else 0.0
+        qty_before = self._ask_cum_qty[i - 1] if i else 0.0
+        return float(qty_before + (amount_krw - spent_before) / self.ask_px[i]), float(amount_krw)
+
+    def sell_qty(self, qty):
+        """수량만큼 시장가 매도 → (체결 수량, 받은 금액). 호가가 모자라면 있는 만큼만"""
+        if not len(self.bid_px) or qty <= 0:
+            return 0.0, 0.0
+        i = int(np.searchsorted(self._bid_cum_qty, qty, side="left"))
+        if i >= len(self.bid_px):
+            return float(self._bid_cum_qty[-1]), float(self._bid_notional[-1])
+        qty_before = self._bid_cum_qty[i - 1] if i else 0.0
+        got_before = self._bid_notional[i - 1] if i else 0.0
+        return float(qty), float(got_before + (qty - qty_before) * self.bid_px[i])
+
+    def buy_many(self, amounts):
+        """금액 배열(호가 통화) 각각으로 시장가 매수했을 때 체결 수량 (호가가 모자라면 NaN)"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        out = np.full(amounts.shape, np.nan)
+        if not len(self.ask_px):
+            return out
+        i = np.searchsorted(self._ask_notional, amounts, side="left")
+        ok = i < len(self.ask_px)
+        i = i[ok]
+        spent_before = np.where(i > 0, self._ask_notional[i - 1], 0.0)
+        qty_before = np.where(i > 0, self._ask_cum_qty[i - 1], 0.0)
+        out[ok] = qty_before + (amounts[ok] - spent_before) / self.ask_px[i]
+        return out
+
+    def sell_many(self, qtys):
+        """수량 배열 각각을 시장가 매도했을 때 받는 금액 (호가가 모자라거나 수량이 NaN이면 NaN)"""
+        qtys = np.asarray(qtys, dtype=np.float64)
+        out = np.full(qtys.shape, np.nan)
+        if not len(self.bid_px):
+            return out
+        i = np.searchsorted(self._bid_cum_qty, qtys, side="left")
+        ok = i < len(self.bid_px)  # NaN 은 맨 뒤로 정렬되므로 여기서 걸러짐
+        i = i[ok]
+        qty_before = np.where(i > 0, self._bid_cum_qty[i - 1], 0.0)
+        got_before = np.where(i > 0, self._bid_notional[i - 1], 0.0)
+        out[ok] = got_before + (qtys[ok] - qty_before) * self.bid_px[i]
+        return out
+
+    def same_levels(self, other):
+        """호가 가격/잔량이 모두 같은지 (캐시된 응답을 다시 받은 경우 재계산 생략용)"""
+        return (other is not None
+                and np.array_equal(self.ask_px, other.ask_px) and np.array_equal(self.ask_qty, other.ask_qty)
+                and np.array_equal(self.bid_px, other.bid_px) and np.array_equal(self.bid_qty, other.bid_qty))
+
+
+def parse_upbit_orderbook(data):
+    """업비트/빗썸 v1 /orderbook 응답 → OrderBook"""
+    book = data[0] if isinstance(data, list) else data
+    units = book["orderbook_units"]
+    asks = [(u["ask_price"], u["ask_size"]) for u in units]
+    bids = [(u["bid_price"], u["bid_size"]) for u in units]
+    return OrderBook(asks, bids, book.get("timestamp", time.time() * 1000) / 1000)
+
+
+def parse_upbit_orderbooks(data):
+    """여러 마켓을 한 번에 조회한 업비트/빗썸 /orderbook 응답 → {심볼: OrderBook}"""
+    return {book["market"].split("-", 1)[1]: parse_upbit_orderbook(book) for book in data}
+
+
+def parse_binance_depth(data):
+    """바이낸스 /api/v3/depth 응답 (가격/수량이 문자열) → OrderBook (USDT 기준)"""
+    return OrderBook([(float(p), float(q)) for p, q in data["asks"]],
+                     [(float(p), float(q)) for p, q in data["bids"]])
+
+
+def synthetic_book(mid, levels=15, tick_bps=2.0, base_qty=None, growth=1.3):
+    """실제 호가를 못 받을 때(오프라인/백테스트) 쓰는 합성 호가: 틱 간격 tick_bps, 깊이는 바깥으로 갈수록 증가"""
+    base_qty = base_qty or 2e7 / mid  # 최우선 호가 약 2천만 원 어치
+    steps = np.arange(1, levels + 1)
+    qty = base_qty * growth ** (steps - 1)
+    asks = np.column_stack([mid * (1 + steps * tick_bps / 1e4), qty])
+    bids = np.column_stack([mid * (1 - steps * tick_bps / 1e4), qty])
+    return OrderBook(asks, bids)
+
+
+class OrderBookCache:
+    """심볼별 업비트 호가를 짧게 캐시 (업스트림 스케줄러 경유), 실패하면 마지막 가격 기준 합성 호가"""
+
+    def __init__(self, monitor, ttl=1.0):
+        self.url = base_url("upbit") + "/v1/orderbook"
+        self.monitor = monitor
+        self.ttl = ttl
+        self.last_prices = {}  # symbol -> 마지막 체결가 (합성 호가 기준)
+
+    async def get(self, symbol):
+        """→ (OrderBook 또는 None, 실제 호가 여부)"""
+        try:
+            data = await self.monitor._get_json("upbit", self.url, {"markets": f"KRW-{symbol}"}, self.ttl)
+            return parse_upbit_orderbook(data), True
+        except Exception as e:
+            price = self.last_prices.get(symbol)
+            if not price:
+                print(f"{symbol} 호가 조회 실패: {e!r}")
+                return None, False
+            return synthetic_book(price), False
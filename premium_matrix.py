@@ -0,0 +1,117 @@
+import time
+import asyncio
+import numpy as np
+from upstream import base_url
+
+# 비교 대상 컬럼 (정렬 키로도 사용)
+MATRIX_COLUMNS = ("upbit_krw", "bithumb_krw", "binance_usdt", "upbit", "bithumb", "gap")
+
+
+def compute_premium_matrix(symbols, upbit_prices, bithumb_prices, binance_prices, fx_rate):
+    """심볼 정렬된 가격 배열로 전 종목 김프를 한 번에 계산 (없는 시세는 NaN)"""
+    upbit = np.asarray(upbit_prices, dtype=np.float64)
+    bithumb = np.asarray(bithumb_prices, dtype=np.float64)
+    binance_krw = np.asarray(binance_prices, dtype=np.float64) * fx_rate
+    with np.errstate(divide="ignore", invalid="ignore"):
+        upbit_prem = (upbit / binance_krw - 1) * 100
+        bithumb_prem = (bithumb / binance_krw - 1) * 100
+        # 해외 시세가 없는 코인도 국내 거래소 간 차이는 의미가 있으므로 따로 계산
+        gap = (upbit / bithumb - 1) * 100
+    return {
+        "symbols": symbols,
+        "upbit_krw": upbit,
+        "bithumb_krw": bithumb,
+        "binance_usdt": np.asarray(binance_prices, dtype=np.float64),
+        "upbit": upbit_prem,
+        "bithumb": bithumb_prem,
+        "gap": gap
+    }
+
+
+def align(symbols, price_map):
+    """심볼 순서대로 가격 배열 생성"""
+    return np.fromiter((price_map.get(s, np.nan) for s in symbols), dtype=np.float64, count=len(symbols))
+
+
+def sort_matrix(matrix, key="upbit", desc=True, limit=None):
+    """정렬 키 기준으로 행 순서 계산 (NaN은 항상 뒤로)"""
+    values = matrix[key]
+    filled = np.where(np.isnan(values), -np.inf if desc else np.inf, values)
+    order = np.argsort(-filled if desc else filled, kind="stable")
+    return order[:limit] if limit else order
+
+
+def matrix_rows(matrix, order=None):
+    """JSON 응답용 행 목록 (NaN → None)"""
+    if order is None:
+        order = np.arange(len(matrix["symbols"]))
+    columns = {c: np.round(matrix[c][order], 4).tolist() for c in MATRIX_COLUMNS}
+    symbols = matrix["symbols"]
+    rows = []
+    for i, idx in enumerate(order.tolist()):
+        row = {"symbol": symbols[idx]}
+        for c in MATRIX_COLUMNS:
+            v = columns[c][i]
+            row[c] = None if v != v else v
+        rows.append(row)
+    return rows
+
+
+class PremiumMatrix:
+    """업비트/빗썸 전체 원화마켓 × 바이낸스 USDT 마켓 김프 매트릭스"""
+
+    market_list_ttl = 3600  # 상장 목록은 자주 바뀌지 않으므로 1시간 캐시
+
+    def __init__(self, monitor):
+        self.monitor = monitor  # AsyncKimchiPremiumMonitor (커넥션 풀/환율 재사용)
+        self.upbit_markets_url = base_url("upbit") + "/v1/market/all"
+        self.bithumb_markets_url = base_url("bithumb") + "/v1/market/all"
+        self._markets = {}
+        self._markets_at = {}
+
+    async def _krw_markets(self, venue, url):
+        """원화마켓 코드 목록 (KRW-BTC, ...)"""
+        if time.time() - self._markets_at.get(venue, 0) > self.market_list_ttl:
+            data = await self.monitor._get_json(venue, url)
+            self._markets[venue] = [m["market"] for m in data if m["market"].startswith("KRW-")]
+            self._markets_at[venue] = time.time()
+        return self._markets[venue]
+
+    async def _krw_tickers(self, venue, markets_url, ticker_url):
+        """원화마켓 전 종목 현재가를 한 번의 다중 마켓 요청으로 조회"""
+        try:
+            markets = await self._krw_markets(venue, markets_url)
+            data = await self.monitor._get_json(venue, ticker_url, {"markets": ",".join(markets)})
+            return {t["market"][4:]: float(t["trade_price"]) for t in data}
+        except Exception as e:
+            print(f"{venue} 전체 시세 조회 실패: {e!r}")
+            return {}
+
+    async def _binance_tickers(self):
+        """바이낸스 전 종목 현재가 (심볼 없이 호출하면 전체 반환)"""
+        try:
+            data = await self.monitor._get_json("binance", self.monitor.binance_url)
+            # 심볼이 "USDT" 하나뿐이면 기준 코인이 빈 문자열이 되므로 제외
+            return {t["symbol"][:-4]: float(t["price"]) for t in data
+                    if t["symbol"].endswith("USDT") and len(t["symbol"]) > 4}
+        except Exception as e:
+            print(f"바이낸스 전체 시세 조회 실패: {e!r}")
+            return {}
+
+    async def refresh(self):
+        """거래소마다 한 번씩 일괄 조회 후 매트릭스 계산"""
+        fx_rate, upbit, bithumb, binance = await asyncio.gather(
+            self.monitor.get_exchange_rate(),
+            self._krw_tickers("upbit", self.upbit_markets_url, self.monitor.upbit_url),
+            self._krw_tickers("bithumb", self.bithumb_markets_url, self.monitor.bithumb_url),
+            self._binance_tickers()
+        )
+        started = time.perf_counter()
+        symbols = sorted(upbit.keys() | bithumb.keys())
+        matrix = compute_premium_matrix(
+            symbols, align(symbols, upbit), align(symbols, bithumb), align(symbols, binance),
+            np.nan if fx_rate is None else fx_rate  # 환율이 없으면 김프 열은 NaN (국내 거래소 간 차이는 유지)
+        )
+        matrix["fx_rate"] = fx_rate
+        matrix["compute_ms"] = (time.perf_counter() - started) * 1000
+        return matrix
@@ -0,0 +1,323 @@
+import os
+import math
+import time
+import random
+from collections import deque
+import numpy as np
+
+# 김프 온라인 통계: 틱마다 O(1) 로 갱신하고 조회할 때만 요약 계산.
+#   구간 평균/분산 (Welford, 구간에서 빠지는 값은 역연산), 최소/최대 (단조 덱),
+#   분위수 (고정 폭 히스토그램), 시간 가중 EWMA 평균/변동성
+
+METRICS = ("premium_up", "premium_bithumb", "gap")   # rule_engine 지표 이름과 같음
+DEFAULT_WINDOWS = (300, 3600, 14400)                 # 5분 / 1시간 / 4시간
+DEFAULT_HALFLIVES = (60, 900)                        # EWMA 반감기 (초)
+
+
+def window_label(seconds):
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+class HistogramSketch:
+    """고정 폭 버킷 히스토그램 (값 추가/제거 O(1), 분위수는 누적합 한 번). 범위 밖 값은 양 끝 버킷에"""
+
+    def __init__(self, lo=-20.0, hi=30.0, width=0.01):
+        self.lo, self.width = lo, width
+        self.bins = int(round((hi - lo) / width))
+        self.counts = [0] * self.bins  # 틱마다 건드리므로 numpy 스칼라 대신 리스트
+        self.n = 0
+
+    def _bin(self, value):
+        return min(max(int((value - self.lo) / self.width), 0), self.bins - 1)
+
+    def add(self, value):
+        self.counts[self._bin(value)] += 1
+        self.n += 1
+
+    def remove(self, value):
+        self.counts[self._bin(value)] -= 1
+        self.n -= 1
+
+    def quantiles(self, qs):
+        """버킷 중앙값 기준 분위수 (오차 ≤ width/2)"""
+        if not self.n:
+            return [None] * len(qs)
+        cum = np.cumsum(self.counts)
+        idx = np.searchsorted(cum, [max(q * self.n, 1) for q in qs], side="left")
+        return [self.lo + (i + 0.5) * self.width for i in idx.tolist()]
+
+
+class RollingWindow:
+    """최근 seconds 초 구간의 개수/평균/분산/최소/최대/분위수"""
+
+    min_std = 1e-3  # 표준편차가 이보다 작으면(0.001%p) 사실상 일정한 구간이라 z-score 생략
+
+    def __init__(self, seconds, sketch=None):
+        self.seconds = seconds
+        self.values = deque()   # (ts, value)
+        self.mins = deque()     # 값이 증가하는 순서 (맨 앞이 최소)
+        self.maxs = deque()     # 값이 감소하는 순서 (맨 앞이 최대)
+        self.sketch = sketch or HistogramSketch()
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, ts, value):
+        self.values.append((ts, value))
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append((ts, value))
+        while self.maxs and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+        self.maxs.append((ts, value))
+        self.sketch.add(value)
+        self.expire(ts)
+
+    def _remove(self, value):
+        self.n -= 1
+        if not self.n:
+            self.mean = self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.n
+        self.m2 = max(self.m2 - delta * (value - self.mean), 0.0)
+
+    def expire(self, now):
+        cutoff = now - self.seconds
+        while self.values and self.values[0][0] <= cutoff:
+            _, value = self.values.popleft()
+            self._remove(value)
+            self.sketch.remove(value)
+        while self.mins and self.mins[0][0] <= cutoff:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= cutoff:
+            self.maxs.popleft()
+
+    @property
+    def std(self):
+        """표본 표준편차 (값이 사실상 일정하면 역연산 오차만 남으므로 0)"""
+        if self.n < 2:
+            return None
+        std = math.sqrt(self.m2 / (self.n - 1))
+        return std if std > 1e-9 else 0.0
+
+    def summary(self, last):
+        if not self.n:
+            return {"count": 0}
+        std = self.std
+        low, high = self.mins[0][1], self.maxs[0][1]
+        # 버킷 중앙값이라 실제 범위를 벗어날 수 있으므로 최소/최대로 자름
+        p05, p50, p95 = (min(max(p, low), high) for p in self.sketch.quantiles((0.05, 0.5, 0.95)))
+        return {
+            "count": self.n,
+            "mean": round(self.mean, 4),
+            "std": None if std is None else round(std, 4),
+            "min": round(low, 4),
+            "max": round(high, 4),
+            "p05": round(p05, 3), "p50": round(p50, 3), "p95": round(p95, 3),
+            "z": round((last - self.mean) / std, 2) if std and std >= self.min_std else None
+        }
+
+
+class Ewma:
+    """시간 가중 지수 이동 평균/분산 (틱 간격이 불규칙해도 반감기 기준으로 감쇠)"""
+
+    def __init__(self, halflife):
+        self.halflife = halflife
+        self.mean = None
+        self.var = 0.0
+        self.ts = None
+
+    def add(self, ts, value):
+        if self.mean is None:
+            self.mean, self.ts = value, ts
+            return
+        alpha = 1 - 0.5 ** (max(ts - self.ts, 0.0) / self.halflife)
+        delta = value - self.mean
+        self.mean += alpha * delta
+        self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+        self.ts = ts
+
+    def summary(self):
+        if self.mean is None:
+            return None
+        return {"mean": round(self.mean, 4), "std": round(math.sqrt(self.var), 4)}
+
+
+class SeriesStats:
+    """지표 하나(예: BTC 업비트 김프)의 여러 구간 통계. sample_sec 보다 촘촘한 틱은
+    최신값/EWMA 만 갱신하고 구간 버퍼에는 넣지 않음 (웹소켓 틱에서도 메모리 고정)"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS, halflives=DEFAULT_HALFLIVES, sample_sec=1.0):
+        self.windows = [RollingWindow(w) for w in windows]
+        self.ewmas = [Ewma(h) for h in halflives]
+        self.sample_sec = sample_sec
+        self.last = None
+        self.last_ts = None
+        self._sampled_at = -math.inf
+
+    def add(self, ts, value):
+        self.last, self.last_ts = value, ts
+        for ewma in self.ewmas:
+            ewma.add(ts, value)
+        if ts - self._sampled_at >= self.sample_sec:
+            self._sampled_at = ts
+            for window in self.windows:
+                window.add(ts, value)
+
+    def summary(self, now=None):
+        if self.last is None:
+            return None
+        now = now or time.time()
+        for window in self.windows:
+            window.expire(now)
+        return {
+            "last": round(self.last, 4),
+            "updated_at": self.last_ts,
+            "windows": {window_label(w.seconds): w.summary(self.last) for w in self.windows},
+            "ewma": {window_label(e.halflife): e.summary() for e in self.ewmas}
+        }
+
+
+class PremiumStats:
+    """심볼 × 지표(METRICS)별 SeriesStats. 시세 스냅샷/웹소켓 틱/매트릭스 갱신이 update 로 들어옴"""
+
+    def __init__(self, symbols=None, windows=DEFAULT_WINDOWS, halflives=DEFAULT_HALFLIVES, sample_sec=1.0):
+        self.symbols = set(symbols) if symbols else None   # None 이면 들어오는 심볼 모두
+        self.windows = tuple(windows)
+        self.halflives = tuple(halflives)
+        self.sample_sec = sample_sec
+        self.series = {}    # (symbol, metric) -> SeriesStats
+        self.version = 0
+        self.updates = 0
+        self.published = None  # 다른 워커(리더)가 발행한 요약. 있으면 조회는 이것으로 응답
+
+    def tracks(self, symbol):
+        return self.symbols is None or symbol in self.symbols
+
+    def update(self, symbol, values, ts=None):
+        """values: {"premium_up": .., "premium_bithumb": .., "gap": ..} (None/NaN 은 건너뜀)"""
+        if not self.tracks(symbol):
+            return
+        ts = ts or time.time()
+        for metric in METRICS:
+            value = values.get(metric)
+            if value is None or value != value:
+                continue
+            series = self.series.get((symbol, metric))
+            if series is None:
+                series = self.series[(symbol, metric)] = SeriesStats(self.windows, self.halflives, self.sample_sec)
+            series.add(ts, value)
+        self.updates += 1
+        self.version += 1
+
+    def export(self):
+        """다른 워커에 넘길 조회 결과 요약 (구간 버퍼 전체 대신 응답에 쓰는 값만)"""
+        symbols = sorted({symbol for symbol, _ in self.series})
+        return {
+            "version": self.version,
+            "snapshot": self.snapshot(),
+            "prompts": {symbol: self.prompt_context(symbol) for symbol in symbols},
+            "regimes": {symbol: self.regime_key(symbol) for symbol in symbols}
+        }
+
+    def load_export(self, view):
+        self.published = view
+        self.version = view["version"]
+
+    def snapshot(self, symbols=None, now=None):
+        if self.published is not None:
+            return {s: v for s, v in self.published["snapshot"].items() if symbols is None or s in symbols}
+        now = now or time.time()
+        result = {}
+        for (symbol, metric), series in sorted(self.series.items()):
+            if symbols is None or symbol in symbols:
+                result.setdefault(symbol, {})[metric] = series.summary(now)
+        return result
+
+    def regime_key(self, symbol="BTC", metric="premium_up"):
+        """AI 응답 캐시 키에 붙이는 국면 구분: 가장 긴 구간 기준 z-score 를 정수로 버킷팅"""
+        if self.published is not None:
+            return self.published["regimes"].get(symbol, "z:na")
+        series = self.series.get((symbol, metric))
+        if series is None:
+            return "z:na"
+        window = series.windows[-1]
+        std = window.std
+        return f"z:{round((series.last - window.mean) / std):+d}" if std and std >= window.min_std else "z:na"
+
+    def prompt_context(self, symbol="BTC", now=None):
+        """AI 프롬프트용 요약: 현재 값이 구간 분포에서 어디쯤인지와 변동성 (데이터가 없으면 빈 문자열)"""
+        if self.published is not None:
+            return self.published["prompts"].get(symbol, "")
+        labels = {"premium_up": "업비트 김프", "premium_bithumb": "빗썸 김프", "gap": "업비트-빗썸 차이"}
+        lines = []
+        for metric in METRICS:
+            series = self.series.get((symbol, metric))
+            summary = series.summary(now) if series else None
+            if summary is None:
+                continue
+            parts = []
+            for label, w in summary["windows"].items():
+                if w["count"] < 2:
+                    continue
+                z = "" if w["z"] is None else f", z {w['z']:+.2f}"
+                parts.append(f"{label} 평균 {w['mean']:.2f}% (범위 {w['min']:.2f}~{w['max']:.2f}, "
+                             f"p05/p95 {w['p05']:.2f}/{w['p95']:.2f}, 표준편차 {w['std']:.3f}{z})")
+            ewma = [f"{label} {e['mean']:.2f}%±{e['std']:.3f}" for label, e in summary["ewma"].items() if e]
+            line = f"- {labels[metric]} 현재 {summary['last']:.2f}%"
+            if parts:
+                line += ": " + "; ".join(parts)
+            if ewma:
+                line += f" / EWMA(반감기) {', '.join(ewma)}"
+            lines.append(line)
+        if not lines:
+            return ""
+        return f"[{symbol} 김프 통계 (구간별)]\n" + "\n".join(lines)
+
+
+def premium_stats_from_env():
+    """PREMIUM_STATS_SYMBOLS / PREMIUM_STATS_WINDOWS / PREMIUM_STATS_HALFLIVES / PREMIUM_STATS_SAMPLE_SEC"""
+    symbols = os.getenv("PREMIUM_STATS_SYMBOLS", "BTC,ETH,XRP")
+    windows = os.getenv("PREMIUM_STATS_WINDOWS")
+    halflives = os.getenv("PREMIUM_STATS_HALFLIVES")
+    return PremiumStats(
+        [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols != "*" else None,
+        [int(w) for w in windows.split(",")] if windows else DEFAULT_WINDOWS,
+        [int(h) for h in halflives.split(",")] if halflives else DEFAULT_HALFLIVES,
+        float(os.getenv("PREMIUM_STATS_SAMPLE_SEC", "1"))
+    )
+
+
+def bench(ticks=200_000, seed=5):
+    """틱당 갱신 시간 + 전체 구간 재계산 결과와 비교"""
+    rng = random.Random(seed)
+    stats = PremiumStats(["BTC"], sample_sec=0)
+    ts, value = 0.0, 2.5
+    history = []
+    started = time.perf_counter()
+    for _ in range(ticks):
+        ts += 0.25
+        value += rng.gauss(0, 0.01)
+        history.append((ts, value))
+        stats.update("BTC", {"premium_up": value, "premium_bithumb": value - 0.3, "gap": 0.3}, ts)
+    elapsed = time.perf_counter() - started
+    window = stats.series[("BTC", "premium_up")].windows[1]
+    recent = np.array([v for t, v in history if t > ts - window.seconds])
+    print(f"틱 {ticks:,}개 × 지표 {len(METRICS)}개: 틱당 {elapsed / ticks * 1e6:.1f}µs")
+    print(f"{window_label(window.seconds)} 구간 평균 {window.mean:.6f} (전체 재계산 {recent.mean():.6f}), "
+          f"표준편차 {window.std:.6f} ({recent.std(ddof=1):.6f}), "
+          f"최대 {window.maxs[0][1]:.4f} ({recent.max():.4f}), 중앙값 {window.sketch.quantiles([0.5])[0]:.3f} "
+          f"({np.median(recent):.3f})")
+
+
+if __name__ == "__main__":
+    bench()
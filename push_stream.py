@@ -0,0 +1,97 @@
+import json
+import asyncio
+from collections import deque
+
+
+def encode_event(topic, payload):
+    """SSE 프레임 직렬화 (업데이트당 한 번만 수행)"""
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {topic}\ndata: {data}\n\n".encode("utf-8")
+
+
+class StreamClient:
+    """접속한 대시보드 하나의 송신 대기열"""
+
+    def __init__(self, max_backlog=100):
+        self.latest = {}          # 상태형 토픽: 최신 값만 보관 (느린 클라이언트는 중간 값 건너뜀)
+        self.backlog = deque()    # 누적형 토픽: 순서대로 전송
+        self.max_backlog = max_backlog
+        self.overflowed = False   # 누적형 대기열이 넘쳤으면 resync 이벤트로 전체 재조회 유도
+        self.wakeup = asyncio.Event()
+
+    def push(self, key, frame, state):
+        if state:
+            self.latest[key] = frame
+        else:
+            if len(self.backlog) >= self.max_backlog:
+                self.backlog.popleft()
+                self.overflowed = True
+            self.backlog.append(frame)
+        self.wakeup.set()
+
+    def drain(self):
+        """보낼 프레임을 한 번에 꺼냄"""
+        frames = []
+        if self.overflowed:
+            # 중간 이벤트를 잃었으므로 남은 누적형 이벤트는 버리고 클라이언트가 REST로 다시 맞추도록 함
+            self.backlog.clear()
+            self.overflowed = False
+            frames.append(encode_event("resync", {}))
+        frames.extend(self.latest.values())
+        frames.extend(self.backlog)
+        self.latest.clear()
+        self.backlog.clear()
+        self.wakeup.clear()
+        return frames
+
+
+class Broadcaster:
+    """시세/차트/AI 생각/규칙 변경을 모든 접속자에게 SSE로 전파"""
+
+    # 최신 값만 의미 있는 토픽 (나머지는 델타 누적)
+    state_topics = {"market", "ticker", "matrix", "arbitrage"}
+
+    def __init__(self, heartbeat=15.0, max_backlog=100):
+        self.heartbeat = heartbeat
+        self.max_backlog = max_backlog
+        self.clients = set()
+        self.last_frames = {}     # 새 접속자에게 바로 보낼 상태형 토픽의 마지막 프레임
+        self.listeners = []       # 발행할 때마다 호출 (topic, payload, key) - 다른 워커로 전달용
+
+    def publish(self, topic, payload, key=None):
+        """key: 상태형 토픽을 심볼별 등으로 나눠 최신 값만 유지할 때 사용"""
+        frame = encode_event(topic, payload)
+        state = topic in self.state_topics
+        original_key, key = key, key or topic
+        if state:
+            self.last_frames[key] = frame
+        for client in self.clients:
+            client.push(key, frame, state)
+        for listener in self.listeners:
+            listener(topic, payload, original_key)
+
+    def subscribe(self):
+        client = StreamClient(self.max_backlog)
+        for key, frame in self.last_frames.items():
+            client.push(key, frame, True)
+        self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        self.clients.discard(client)
+
+    async def stream(self, client):
+        """StreamingResponse용 제너레이터"""
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(client.wakeup.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                frames = client.drain()
+                if frames:
+                    yield b"".join(frames)
+        finally:
+            self.unsubscribe(client)
@@ -0,0 +1,282 @@
+import re
+import sys
+import time
+import random
+from bisect import bisect_left, bisect_right, insort
+
+# 평가 가능한 지표 (스냅샷/틱 → 값). gap = 업비트 김프 - 빗썸 김프
+METRICS = ("premium_up", "premium_bithumb", "gap")
+COMPARATORS = ("<", "<=", ">", ">=")
+ACTIONS = ("buy", "sell", "alert")
+
+# 규칙 문구 → 구조화용 키워드
+_BELOW_WORDS = ("<", "미만", "이하", "하향", "아래", "하락", "역프")
+_ABOVE_WORDS = (">", "이상", "초과", "상향", "상단", "위", "돌파", "+")
+_BUY_WORDS = ("매수", "진입", "매집", "롱")
+_SELL_WORDS = ("매도", "손절", "익절", "청산", "현금화", "숏")
+_SYMBOLS = {"BTC": ("BTC", "비트"), "ETH": ("ETH", "이더"), "XRP": ("XRP", "리플")}
+
+
+class Rule:
+    """구조화된 규칙: metric comparator threshold 가 참이 되는 순간 action"""
+
+    __slots__ = ("rule_id", "name", "metric", "comparator", "threshold", "symbol", "action", "amount_krw", "last_fired")
+
+    def __init__(self, rule_id, metric, comparator, threshold, symbol="BTC", action="alert", amount_krw=None, name=None):
+        if metric not in METRICS:
+            raise ValueError(f"알 수 없는 지표: {metric}")
+        if comparator not in COMPARATORS:
+            raise ValueError(f"알 수 없는 비교 연산자: {comparator}")
+        if action not in ACTIONS:
+            raise ValueError(f"알 수 없는 동작: {action}")
+        self.rule_id = str(rule_id)
+        self.name = name or rule_id
+        self.metric = metric
+        self.comparator = comparator
+        self.threshold = float(threshold)
+        self.symbol = symbol.upper()
+        self.action = action
+        self.amount_krw = amount_krw
+        self.last_fired = 0.0
+
+    def to_dict(self):
+        return {
+            "rule_id": self.rule_id, "name": self.name, "metric": self.metric, "comparator": self.comparator,
+            "threshold": self.threshold, "symbol": self.symbol, "action": self.action, "amount_krw": self.amount_krw
+        }
+
+
+def parse_rule(name, rule_id=None):
+    """자유 문구 규칙명 → Rule (수치 조건을 찾지 못하면 None)
+    예) '표준 저김프 진입 (Premium < 1%)' → premium_up < 1.0 매수"""
+    match = re.search(r"(-?\d+(?:\.\d+)?)\s*%", name)
+    if not match:
+        return None
+    threshold = float(match.group(1))
+    # 숫자 바로 뒤/앞 문맥을 우선으로 방향 판단 (없으면 문장 전체)
+    around = name[max(0, match.start() - 4):match.end() + 8]
+    comparator = None
+    for text in (around, name):
+        if any(w in text for w in _BELOW_WORDS):
+            comparator = "<"
+        elif any(w in text for w in _ABOVE_WORDS):
+            comparator = ">"
+        if comparator:
+            break
+    if comparator is None:
+        return None
+
+    if "스프레드" in name or ("빗썸" in name and "업비트" in name):
+        metric = "gap"
+        # '빗썸이 0.5% 이상 저렴' = 업비트 김프 - 빗썸 김프 > 0.5
+        comparator = ">"
+    elif "빗썸" in name:
+        metric = "premium_bithumb"
+    else:
+        metric = "premium_up"
+
+    # 매수/매도 단어가 모두 있으면 먼저 나온 쪽이 규칙의 동작 ('매수 후 ... 매도')
+    buy_at = min((name.find(w) for w in _BUY_WORDS if w in name), default=-1)
+    sell_at = min((name.find(w) for w in _SELL_WORDS if w in name), default=-1)
+    if sell_at >= 0 and (buy_at < 0 or sell_at < buy_at):
+        action = "sell"
+    elif buy_at >= 0 or metric != "gap" and comparator == "<":
+        action = "buy"
+    else:
+        action = "alert"
+
+    symbol = "BTC"
+    for code, words in _SYMBOLS.items():
+        if any(w in name.upper() for w in words):
+            symbol = code
+            break
+    return Rule(rule_id or name, metric, comparator, threshold, symbol, action, name=name)
+
+
+class ThresholdIndex:
+    """한 (심볼, 지표, 비교 연산자)의 임계값 정렬 목록.
+    이전 값 → 현재 값 사이에서 조건이 거짓→참으로 바뀐 임계값 구간만 bisect로 잘라냄"""
+
+    def __init__(self, comparator):
+        self.comparator = comparator
+        self.keys = []   # (threshold, rule_id) 정렬 유지
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, rule):
+        insort(self.keys, (rule.threshold, rule.rule_id))
+
+    def remove(self, rule):
+        key = (rule.threshold, rule.rule_id)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def crossed(self, prev, value):
+        """prev 에서는 거짓이고 value 에서는 참이 된 규칙 id 목록"""
+        keys, c = self.keys, self.comparator
+        # 튜플 비교에서 같은 임계값의 모든 rule_id 를 포함/제외하기 위한 경계
+        lo_key = lambda t: (t, "")
+        hi_key = lambda t: (t, "\uffff")
+        if c == "<" and value < prev:      # thr in (value, prev]
+            lo, hi = bisect_right(keys, hi_key(value)), bisect_right(keys, hi_key(prev))
+        elif c == "<=" and value < prev:   # thr in [value, prev)
+            lo, hi = bisect_left(keys, lo_key(value)), bisect_left(keys, lo_key(prev))
+        elif c == ">" and value > prev:    # thr in [prev, value)
+            lo, hi = bisect_left(keys, lo_key(prev)), bisect_left(keys, lo_key(value))
+        elif c == ">=" and value > prev:   # thr in (prev, value]
+            lo, hi = bisect_right(keys, hi_key(prev)), bisect_right(keys, hi_key(value))
+        else:
+            return []
+        return [rule_id for _, rule_id in keys[lo:hi]]
+
+
+class RuleEngine:
+    """스냅샷/틱마다 임계값을 넘나든 규칙만 찾아 신호 발생 (전체 규칙을 훑지 않음).
+    조건이 참이 되는 순간(에지)에만 발생하고, 같은 규칙은 cooldown 초 안에 다시 발생하지 않음"""
+
+    def __init__(self, cooldown=60.0):
+        self.cooldown = cooldown
+        self.rules = {}       # rule_id -> Rule
+        self.indexes = {}     # (symbol, metric, comparator) -> ThresholdIndex
+        self.last_values = {} # (symbol, metric) -> 직전 값
+        self.listeners = []   # 신호마다 호출 (signal dict)
+        self.signals = []     # 최근 신호 (UI 표시용)
+        self.evaluations = 0
+        self.total_us = 0.0
+        self.last_us = 0.0
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add(self, rule):
+        if rule.rule_id in self.rules:
+            self.remove(rule.rule_id)
+        self.rules[rule.rule_id] = rule
+        key = (rule.symbol, rule.metric, rule.comparator)
+        if key not in self.indexes:
+            self.indexes[key] = ThresholdIndex(rule.comparator)
+        self.indexes[key].add(rule)
+
+    def remove(self, rule_id):
+        rule = self.rules.pop(rule_id, None)
+        if rule:
+            self.indexes[(rule.symbol, rule.metric, rule.comparator)].remove(rule)
+
+    def load_rules(self, rows):
+        """rules.json / trading_rules 행 중 구조화 가능한 것만 등록, 등록 개수 반환
+        (rules.json 은 설명문에 수치가 있는 경우가 있어 이름 뒤에 붙여 해석)"""
+        count = 0
+        for row in rows:
+            rule = parse_rule(f"{row['name']} {row.get('description', '')}", row.get("id") or row["name"])
+            if rule:
+                rule.name = row["name"]
+                self.add(rule)
+                count += 1
+        return count
+
+    def update(self, symbol, metrics, ts=None):
+        """metrics: {지표: 값}. 값이 None(시세 없음)인 지표는 건너뜀. 발생한 신호 목록 반환"""
+        started = time.perf_counter()
+        ts = ts or time.time()
+        fired = []
+        for metric, value in metrics.items():
+            if value is None:
+                continue
+            prev = self.last_values.get((symbol, metric))
+            self.last_values[(symbol, metric)] = value
+            if prev is None or prev == value:
+                continue  # 첫 값은 기준점만 잡음
+            for comparator in COMPARATORS:
+                index = self.indexes.get((symbol, metric, comparator))
+                if not index:
+                    continue
+                for rule_id in index.crossed(prev, value):
+                    rule = self.rules[rule_id]
+                    if ts - rule.last_fired < self.cooldown:
+                        continue
+                    rule.last_fired = ts
+                    fired.append({
+                        "time": time.strftime("%H:%M:%S", time.localtime(ts)),
+                        "ts": ts,
+                        "value": round(value, 4),
+                        **rule.to_dict()
+                    })
+        self.evaluations += 1
+        self.last_us = (time.perf_counter() - started) * 1e6
+        self.total_us += self.last_us
+        for signal in fired:
+            self.signals.append(signal)
+            for listener in self.listeners:
+                try:
+                    listener(signal)
+                except Exception as e:
+                    print(f"[rules] 리스너 오류: {e}")
+        if len(self.signals) > 50:
+            del self.signals[:-50]
+        return fired
+
+    def stats(self):
+        return {
+            "rules": len(self.rules),
+            "evaluations": self.evaluations,
+            "last_us": round(self.last_us, 1),
+            "avg_us": round(self.total_us / self.evaluations, 1) if self.evaluations else 0.0
+        }
+
+
+def snapshot_metrics(data):
+    """monitor.get_combined_data() 결과 → 지표 값"""
+    up, bit = data['premiums']['upbit'], data['premiums']['bithumb']
+    return {
+        "premium_up": up,
+        "premium_bithumb": bit,
+        "gap": up - bit if up is not None and bit is not None else None
+    }
+
+
+def bench(rule_count=50_000, ticks=20_000, seed=3):
+    """규칙 수 대비 틱당 평가 시간 측정 (임계값은 현실적인 -2~8% 구간에 분포)"""
+    rng = random.Random(seed)
+    engine = RuleEngine(cooldown=0)
+    started = time.perf_counter()
+    for i in range(rule_count):
+        engine.add(Rule(f"r{i}", rng.choice(METRICS), rng.choice(COMPARATORS), round(rng.uniform(-2, 8), 2),
+                        action=rng.choice(ACTIONS)))
+    print(f"규칙 {rule_count:,}개 등록: {time.perf_counter() - started:.2f}초")
+
+    premium, gap = 2.5, 0.1
+    fired = 0
+    samples = []
+    for _ in range(ticks):
+        # 5초 간격 스냅샷 수준의 작은 변동
+        premium += rng.gauss(0, 0.02)
+        gap += rng.gauss(0, 0.01)
+        t0 = time.perf_counter()
+        fired += len(engine.update("BTC", {"premium_up": premium, "premium_bithumb": premium - gap, "gap": gap}))
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    p50, p99 = samples[len(samples) // 2] * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+    print(f"틱 {ticks:,}회: p50 {p50:.1f}µs / p99 {p99:.1f}µs / 신호 {fired:,}건")
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    parser = argparse.ArgumentParser(description="규칙 구조화 확인 / 평가 벤치마크")
+    parser.add_argument("command", choices=["parse", "bench"])
+    parser.add_argument("--rules", type=int, default=50_000)
+    parser.add_argument("--ticks", type=int, default=20_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.rules, args.ticks)
+        sys.exit(0)
+    with open("rules.json", "r", encoding="utf-8") as f:
+        for r in json.load(f):
+            rule = parse_rule(f"{r['name']} {r['description']}", r["id"])
+            if rule:
+                print(f"{r['name']}: {rule.symbol} {rule.metric} {rule.comparator} {rule.threshold} → {rule.action}")
+            else:
+                print(f"{r['name']}: 수치 조건 없음")
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import subprocess
+
+# 무거운 SDK 클라이언트(제미나이/슈파베이스)는 import 시점이 아니라 처음 쓸 때 생성.
+#   서버는 바로 연결을 받기 시작하고, 시작 직후 백그라운드 스레드에서 미리 데워 둠 (warm)
+#   → /api/market-data 처럼 SDK 가 필요 없는 요청은 SDK import 를 기다리지 않음
+# 콜드 스타트 단계별 시간(프로세스 시작 → import 완료 → startup 완료 → 첫 응답)은 /api/health, /metrics 로 노출
+
+
+def process_started_at():
+    """프로세스 시작 시각 (리눅스는 /proc 기준 → 인터프리터 기동 시간까지 포함, 그 외는 이 모듈 import 시각)"""
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - ticks / os.sysconf("SC_CLK_TCK"))
+    except Exception:
+        return time.time()
+
+
+class ColdStart:
+    """단계별 프로세스 시작 후 경과 초. 단계마다 처음 한 번만 기록"""
+
+    def __init__(self):
+        self.started_at = process_started_at()
+        self.phases = {}
+
+    def mark(self, phase):
+        if phase not in self.phases:
+            self.phases[phase] = round(time.time() - self.started_at, 4)
+        return self.phases[phase]
+
+
+class FirstResponse:
+    """첫 HTTP 응답이 나가는 순간을 ColdStart 의 "first_response" 로 기록 (이후에는 그냥 통과)"""
+
+    def __init__(self, app, coldstart):
+        self.app = app
+        self.coldstart = coldstart
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "first_response" in self.coldstart.phases:
+            return await self.app(scope, receive, send)
+
+        async def marked_send(message):
+            if message["type"] == "http.response.start":
+                self.coldstart.mark("first_response")
+            await send(message)
+
+        await self.app(scope, receive, marked_send)
+
+
+class LazyService:
+    """등록된 서비스의 대리 객체: 속성에 처음 접근할 때 실제 클라이언트를 만들고 그대로 위임"""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    @property
+    def init_failed(self):
+        """생성에 실패했는지 (생성을 시도하지 않음)"""
+        return self._name in self._registry.errors
+
+    def __repr__(self):
+        return f"<LazyService {self._name} ready={self._registry.ready(self._name)}>"
+
+
+class ServiceRegistry:
+    """이름 → 생성 함수. get() 에서 한 번만 생성 (스레드 안전), 실패하면 오류를 기억하고 다시 시도하지 않음"""
+
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        self.errors = {}
+        self.init_seconds = {}
+        self.listeners = []  # 생성할 때마다 (이름, 소요 초, "ok"/"error")
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """→ LazyService (그대로 클라이언트처럼 쓰면 됨)"""
+        self.factories[name] = factory
+        return LazyService(self, name)
+
+    def ready(self, name):
+        return name in self.instances
+
+    def get(self, name):
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name in self.instances:
+                return self.instances[name]
+            if name in self.errors:
+                raise RuntimeError(f"{name} 초기화 실패: {self.errors[name]}")
+            started = time.perf_counter()
+            try:
+                instance = self.factories[name]()
+            except Exception as e:
+                self.errors[name] = repr(e)
+                self._notify(name, started, "error")
+                print(f"[services] {name} 초기화 오류: {e!r}")
+                raise RuntimeError(f"{name} 초기화 실패: {e!r}") from e
+            self.instances[name] = instance
+            self._notify(name, started, "ok")
+            return instance
+
+    def _notify(self, name, started, outcome):
+        self.init_seconds[name] = seconds = time.perf_counter() - started
+        for listener in self.listeners:
+            listener(name, seconds, outcome)
+
+    def warm_now(self, names=None):
+        """지금 바로 모두 생성 (SERVICE_WARMUP=eager: 예전처럼 import 시점 생성, 비교 측정용)"""
+        for name in names or list(self.factories):
+            try:
+                self.get(name)
+            except RuntimeError:
+                pass
+
+    async def warm(self, names=None, delay=0.0):
+        """서버가 연결을 받기 시작한 뒤 스레드에서 하나씩 생성 (이벤트 루프는 막지 않음)"""
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        for name in names or list(self.factories):
+            try:
+                await asyncio.to_thread(self.get, name)
+            except RuntimeError:
+                pass
+        print(f"[services] 미리 생성 완료 {sorted(self.instances)} ({time.perf_counter() - started:.2f}초)")
+
+    def status(self):
+        return {name: {
+            "ready": name in self.instances,
+            "init_ms": round(self.init_seconds[name] * 1000, 1) if name in self.init_seconds else None,
+            "error": self.errors.get(name)
+        } for name in self.factories}
+
+
+def warmup_from_env():
+    """SERVICE_WARMUP: background(기본, 시작 후 미리 생성) / lazy(첫 사용 때만) / eager(import 시점)
+    → (모드, SERVICE_WARMUP_DELAY_SEC)"""
+    mode = os.getenv("SERVICE_WARMUP", "background").strip().lower()
+    if mode not in ("background", "lazy", "eager"):
+        print(f"[services] 알 수 없는 SERVICE_WARMUP={mode!r} → background")
+        mode = "background"
+    return mode, float(os.getenv("SERVICE_WARMUP_DELAY_SEC", "1"))
+
+
+# ---------------- 콜드 스타트 측정 ----------------
+
+IMPORT_PROBE = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def measure_import(runs, env):
+    """새 인터프리터에서 `import app` 만 걸리는 시간 (초, 중앙값)"""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True, text=True, timeout=120)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "import 실패")
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return sorted(samples)[len(samples) // 2]
+
+
+def measure_first_response(env, port, path="/api/market-data", timeout=60.0):
+    """uvicorn 을 새로 띄워서 첫 응답까지 걸린 시간 (초) + 서버가 기록한 단계별 시간"""
+    import httpx
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"서버 종료 (코드 {server.returncode})")
+                if time.perf_counter() - started > timeout:
+                    raise TimeoutError("첫 응답 시간 초과")
+                try:
+                    status = client.get(path).status_code
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            elapsed = time.perf_counter() - started
+            health = client.get("/api/health").json()
+        return elapsed, status, health.get("coldstart", {}), health.get("services", {})
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def bench(runs=3, port=18731, modes=("eager", "background")):
+    """SERVICE_WARMUP 모드별 import 시간 / 첫 응답까지 시간 비교 (현재 환경변수 그대로 사용, 업스트림 조회 포함)"""
+    for n, mode in enumerate(modes):
+        env = {**os.environ, "SERVICE_WARMUP": mode}
+        imported = measure_import(runs, env)
+        elapsed, status, phases, services = measure_first_response(env, port + n)
+        print(f"[{mode:>10}] import app {imported * 1000:7.1f}ms | 첫 응답(HTTP {status}) {elapsed * 1000:7.1f}ms "
+              f"| 서버 기록 {phases} | 서비스 {({k: v['init_ms'] for k, v in services.items()})}")
+
+
+if __name__ == "__main__":
+    bench(*(int(a) for a in sys.argv[1:2]))
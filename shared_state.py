@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import fcntl
+import pickle
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# 여러 uvicorn 워커가 같은 상태를 보도록 하는 로컬 파일 기반 공유 계층 (외부 서비스 불필요).
+#   리더 워커 하나 (flock) 만 업스트림 수집/AI 자율 진화/지갑 저장을 실행하고 결과를 파일로 발행,
+#   나머지 워커는 바뀐 파일만 다시 읽어서 자기 메모리 객체에 반영 → 읽기 요청은 모든 워커가 메모리에서 처리
+# SHARED_STATE_DIR 을 /dev/shm 아래로 두면 디스크를 거치지 않음
+
+
+class SharedState:
+    """키마다 pickle 파일 하나. 쓰기는 임시 파일 → os.replace 로 원자적 교체,
+    읽기는 파일이 바뀌었을 때(inode/크기/수정 시각)만 다시 읽음"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._seen = {}   # key -> 마지막으로 읽거나 쓴 파일 서명
+        self._locks = {}  # key -> 잠금 파일 fd
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.pkl")
+
+    @staticmethod
+    def _signature(st):
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def publish(self, key, value):
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._seen[key] = self._signature(os.stat(path))
+
+    def load(self, key):
+        """→ (값, 바뀌었는지). 파일이 없거나 지난번과 같으면 (None, False)"""
+        path = self._file(key)
+        try:
+            signature = self._signature(os.stat(path))
+        except FileNotFoundError:
+            return None, False
+        if self._seen.get(key) == signature:
+            return None, False
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+        self._seen[key] = signature
+        return value, True
+
+    def acquire(self, key):
+        """워커 간 잠금 (다른 워커가 잡고 있으면 기다림 → 이벤트 루프에서는 스레드로 호출).
+        flock 은 스레드가 아니라 fd 단위라 다른 스레드에서 release 해도 됨"""
+        fd = self._locks.get(key)
+        if fd is None:
+            fd = self._locks[key] = os.open(os.path.join(self.path, f"{key}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def release(self, key):
+        fcntl.flock(self._locks[key], fcntl.LOCK_UN)
+
+    @contextmanager
+    def locked(self, key):
+        """워커 간 배타 구간 (읽고-고치고-발행하는 상태용). 구간은 짧게 유지할 것"""
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+
+class LeaderElection:
+    """잠금 파일 flock 을 잡은 워커가 리더. 리더 프로세스가 죽으면 OS 가 잠금을 풀어 다른 워커가 이어받음"""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_leader = False
+        self.elected_at = None
+        self._fd = None
+
+    def try_acquire(self):
+        if self.is_leader:
+            return True
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, str(os.getpid()).encode())
+        self.is_leader = True
+        self.elected_at = time.time()
+        return True
+
+    def leader_pid(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+
+class EventLog:
+    """JSON 줄 로그 (리더의 푸시(SSE) 이벤트 → 팔로워가 이어 읽어서 자기 접속자에게 다시 전파).
+    append 는 메모리에 모으기만 하고 flush 가 한 번에 기록 (StateMirror.run 이 스레드에서 호출 → 이벤트 루프를 막지 않음).
+    max_bytes 를 넘으면 .1 로 옮기고 새 파일 시작, 읽는 쪽은 inode 가 바뀌면 .1 에 남은 부분부터 마저 읽음"""
+
+    def __init__(self, path, max_bytes=4 << 20, from_start=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.from_start = from_start  # 처음 읽을 때 파일 처음부터 (False 면 끝부터)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._inode = None
+        self._offset = None
+        self._partial = b""
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def append(self, topic, payload, key=None):
+        line = json.dumps([topic, payload, key], ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            self._pending.append(line)
+
+    def flush(self):
+        """모아 둔 줄을 한 번에 기록, 기록한 줄 수 반환. 쓰는 워커가 여럿이면 호출하는 쪽에서 잠금"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return 0
+        with open(self.path, "ab") as f:
+            f.write(b"".join(lines))
+            rotate = f.tell() > self.max_bytes
+        if rotate:
+            os.replace(self.path, f"{self.path}.1")
+        return len(lines)
+
+    def read_new(self):
+        """지난번 이후 추가된 이벤트 목록 [(topic, payload, key)]"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if self._inode is None:
+            if st is None:
+                return []
+            self._inode, self._offset = st.st_ino, 0 if self.from_start else st.st_size
+            events = []
+        elif st is None or st.st_ino != self._inode:
+            # 교체됨: .1 로 옮겨진 예전 파일에서 아직 안 읽은 부분부터
+            events = self._read(f"{self.path}.1")
+            if st is None:
+                return events
+            self._inode, self._offset, self._partial = st.st_ino, 0, b""
+        else:
+            events = []
+        return events + self._read(self.path)
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_ino != self._inode:
+                    return []  # 읽기 전에 두 번 이상 교체되어 이미 지워진 파일
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        self._offset += len(data)
+        *lines, self._partial = (self._partial + data).split(b"\n")
+        return [tuple(json.loads(line)) for line in lines if line]
+
+
+class StateMirror:
+    """리더: 등록된 항목의 버전이 바뀌었으면 interval 마다 발행 / 팔로워: 바뀐 항목만 적용 + 이벤트 전파.
+    팔로워도 매 주기 리더 잠금을 시도하므로 리더가 죽으면 interval 안에 다른 워커가 이어받음.
+    반대 방향(팔로워 → 리더)은 inbox: send() 로 보낸 요청을 리더가 on_request 로 처리"""
+
+    def __init__(self, shared, election, events=None, interval=0.25, inbox=None):
+        self.shared = shared
+        self.election = election
+        self.events = events
+        self.inbox = inbox
+        self.interval = interval
+        self.items = {}          # key -> (export, apply, version)
+        self._published = {}     # key -> 마지막으로 발행한 버전
+        self.listeners = []      # 리더가 되었을 때 호출 (인자 없음)
+        self.on_event = None     # 팔로워가 이벤트를 받았을 때 (topic, payload, key)
+        self.on_request = None   # 리더가 팔로워의 요청을 받았을 때 (topic, payload), 같은 요청이 다시 와도 되도록 멱등하게
+        self.counters = {"published": 0, "applied": 0, "events": 0, "requests": 0}
+
+    def register(self, key, export, apply, version=None):
+        """version: 바뀔 때만 발행하기 위한 변경 번호 함수 (None 이면 매 주기 발행)"""
+        self.items[key] = (export, apply, version)
+
+    def register_attrs(self, key, obj, names, version=None):
+        """객체 속성 몇 개를 그대로 주고받는 항목"""
+        self.register(key, lambda: {name: getattr(obj, name) for name in names},
+                      lambda state: obj.__dict__.update(state), version)
+
+    @property
+    def role(self):
+        return "leader" if self.election.is_leader else "follower"
+
+    def publish_changed(self):
+        for key, (export, _, version) in self.items.items():
+            v = version() if version else time.time()
+            if key in self._published and self._published[key] == v:
+                continue
+            self.shared.publish(key, export())
+            self._published[key] = v
+            self.counters["published"] += 1
+
+    def send(self, topic, payload):
+        """리더가 처리할 요청: 리더면 바로 처리, 팔로워면 inbox 에 모아 두었다가 다음 주기에 기록"""
+        if self.election.is_leader or not self.inbox:
+            if self.on_request:
+                self.on_request(topic, payload)
+        else:
+            self.inbox.append(topic, payload)
+
+    def handle_requests(self):
+        if self.inbox and self.on_request:
+            for topic, payload, _ in self.inbox.read_new():
+                self.on_request(topic, payload)
+                self.counters["requests"] += 1
+
+    def apply_changed(self):
+        for key, (_, apply, _) in self.items.items():
+            value, changed = self.shared.load(key)
+            if changed:
+                apply(value)
+                self.counters["applied"] += 1
+        if self.events and self.on_event:
+            for topic, payload, key in self.events.read_new():
+                self.on_event(topic, payload, key)
+                self.counters["events"] += 1
+
+    def step(self):
+        if not self.election.is_leader and self.election.try_acquire():
+            print(f"[shared] 워커 {os.getpid()} 리더 선출")
+            for listener in self.listeners:
+                listener()
+        if self.election.is_leader:
+            self.handle_requests()
+            self.publish_changed()
+        else:
+            self.apply_changed()
+
+    def flush(self):
+        """모아 둔 이벤트를 파일에 기록 (run 이 스레드에서 호출)"""
+        if self.events and self.events.pending:
+            self.events.flush()
+        if self.inbox and self.inbox.pending:
+            with self.shared.locked("inbox"):  # 팔로워 여럿이 같은 파일에 씀
+                self.inbox.flush()
+
+    async def run(self):
+        while True:
+            try:
+                self.step()
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"[shared] 상태 동기화 오류: {e!r}")
+            await asyncio.sleep(self.interval)
+
+
+def shared_state_from_env():
+    """SHARED_STATE_DIR 이 있거나 WEB_CONCURRENCY > 1 이면 공유 모드 → (SharedState, StateMirror), 아니면 (None, None)"""
+    path = os.getenv("SHARED_STATE_DIR")
+    if not path and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        path = "data/shared"
+    if not path:
+        return None, None
+    shared = SharedState(path)
+    mirror = StateMirror(shared, LeaderElection(os.path.join(path, "leader.lock")),
+                         EventLog(os.path.join(path, "events.jsonl")),
+                         float(os.getenv("SHARED_SYNC_SEC", "0.25")),
+                         EventLog(os.path.join(path, "inbox.jsonl"), from_start=True))
+    return shared, mirror
@@ -0,0 +1,85 @@
+import numpy as np
+
+from arbitrage import ArbitrageGraph, synthetic_matrix
+
+NAN = np.nan
+
+
+def matrix(xrp_binance=0.6, xrp_upbit=1000.0, xrp_bithumb=1000.0):
+    """USDT 원화 시세 1400, XRP 는 바이낸스에서 싸게 사서 국내에서 팔면 남는 시장"""
+    return {
+        "symbols": ["USDT", "XRP"],
+        "upbit_krw": np.array([1400.0, xrp_upbit]),
+        "bithumb_krw": np.array([1400.0, xrp_bithumb]),
+        "binance_usdt": np.array([NAN, xrp_binance]),
+        "fx_rate": 1400.0
+    }
+
+
+def graph(**kwargs):
+    return ArbitrageGraph(withdrawal={}, **kwargs)
+
+
+def binance_nodes(g):
+    return sorted(asset for venue, asset in g.nodes if venue == "binance")
+
+
+def test_finds_usdt_bridge_cycle():
+    g = graph()
+    assert g.update(matrix())
+    best = g.result["opportunities"][0]
+    assert best["profit_pct"] > 10
+    assert best["route"].startswith(("upbit:KRW", "bithumb:KRW"))
+    assert best["route"].split(" → ")[0] == best["route"].split(" → ")[-1]
+    assert "XRP" in best["assets"]
+    assert g.result["bridge"] == {"upbit": 1400.0, "bithumb": 1400.0}
+
+
+def test_no_opportunity_in_flat_market():
+    g = graph()
+    g.update(matrix(xrp_binance=1000.0 / 1400.0))
+    assert g.result["opportunities"] == []
+
+
+def test_unchanged_prices_skip_search():
+    g = graph()
+    m = matrix()
+    assert g.update(m)
+    version = g.version
+    assert not g.update(m)
+    assert g.version == version and g.counters["skipped"] == 1
+
+
+def test_only_moved_edges_are_dirty():
+    g = graph()
+    g.update(matrix())
+    total = g.result["edges"]
+    g.update(matrix(xrp_upbit=1010.0))
+    assert 0 < g.result["dirty_edges"] < total
+
+
+def test_venue_down_then_recovered_matches_fresh_graph():
+    m = synthetic_matrix(60)
+    down = dict(m, binance_usdt=np.full(60, NAN))
+    g = graph()
+    g.update(down)
+    assert binance_nodes(g) == ["USDT"]
+    g.update(m)
+    fresh = graph()
+    fresh.update(m)
+    assert binance_nodes(g) == binance_nodes(fresh)
+    assert [o["route"] for o in g.result["opportunities"]] == [o["route"] for o in fresh.result["opportunities"]]
+
+
+def test_price_lost_after_build_disables_edges():
+    g = graph()
+    g.update(matrix())
+    assert g.result["opportunities"]
+    g.update(matrix(xrp_binance=NAN))
+    assert all("binance:XRP" not in o["route"] for o in g.result["opportunities"])
+
+
+def test_max_legs_limits_cycle_length():
+    g = graph(max_legs=3)
+    g.update(matrix())
+    assert all(len(o["legs"]) <= 3 for o in g.result["opportunities"])
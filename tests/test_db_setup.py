@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from db_setup import Checkpoint, existing_values, iter_json
+from local_db import LocalDB
+
+
+@pytest.fixture
+def write(tmp_path):
+    def write(name, text):
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+    return write
+
+
+DATA = [123456, 7.25, True, None, {"a": [1, 2, "x,]"]}, "문자열", -0.5e10, 99]
+
+
+@pytest.mark.parametrize("bufsize", [1, 2, 3, 4, 5, 7, 11, 17, 1 << 16])
+def test_iter_json_buffer_boundaries(write, bufsize):
+    path = write("a.json", json.dumps(DATA, ensure_ascii=False))
+    assert list(iter_json(path, bufsize=bufsize)) == DATA
+
+
+def test_iter_json_whitespace_and_single_object(write):
+    path = write("a.json", ' \n[ 1 ,\n 2 ]\n')
+    assert list(iter_json(path, bufsize=2)) == [1, 2]
+    assert list(iter_json(write("b.json", '{"id": 1}'))) == [{"id": 1}]
+
+
+def test_iter_json_unclosed_array(write):
+    with pytest.raises(ValueError):
+        list(iter_json(write("a.json", "[1, 2"), bufsize=2))
+
+
+def test_checkpoint_saves_only_contiguous_chunks(write, tmp_path):
+    path = write("rows.jsonl", "{}\n" * 10)
+    directory = str(tmp_path / "cp")
+    checkpoint = Checkpoint(path, "t", 2, directory)
+    checkpoint.complete(1, 2)          # 0번이 끝나기 전에는 저장 안 함
+    assert checkpoint.next_chunk == 0
+    checkpoint.complete(0, 2)
+    assert (checkpoint.next_chunk, checkpoint.rows) == (2, 4)
+    resumed = Checkpoint(path, "t", 2, directory)
+    assert (resumed.next_chunk, resumed.rows) == (2, 4)
+
+
+def test_checkpoint_resets_when_source_changes(write, tmp_path):
+    path = write("rows.jsonl", "{}\n" * 10)
+    directory = str(tmp_path / "cp")
+    Checkpoint(path, "t", 2, directory).complete(0, 2)
+    assert Checkpoint(path, "t", 5, directory).next_chunk == 0  # 청크 크기가 다름
+    write("rows.jsonl", "{}\n" * 11)
+    assert Checkpoint(path, "t", 2, directory).next_chunk == 0  # 원본이 바뀜
+
+
+def test_checkpoint_reset_removes_file(write, tmp_path):
+    path = write("rows.jsonl", "{}\n")
+    directory = str(tmp_path / "cp")
+    checkpoint = Checkpoint(path, "t", 1, directory)
+    checkpoint.complete(0, 1)
+    checkpoint.reset()
+    assert Checkpoint(path, "t", 1, directory).next_chunk == 0
+
+
+def test_existing_values_reads_every_page(tmp_path):
+    db = LocalDB(str(tmp_path / "t.db"))
+    db.table("trading_rules").insert([{"name": f"rule {n:02d}"} for n in range(25)]).execute()
+    assert existing_values(db, "trading_rules", "name", page=10) == {f"rule {n:02d}" for n in range(25)}
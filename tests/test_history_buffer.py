@@ -0,0 +1,54 @@
+import numpy as np
+
+from history_buffer import HISTORY_FIELDS, OhlcRollup, resample_ohlc
+
+PREMIUM = HISTORY_FIELDS.index("premium_up")
+
+
+def row(premium, close=1.0):
+    values = np.full(len(HISTORY_FIELDS), float(close))
+    values[PREMIUM] = premium
+    return values
+
+
+def test_bucket_ohlc():
+    rollup = OhlcRollup(60, 10)
+    for ts, p in [(0, 2.0), (10, 3.5), (20, 1.0), (59, 2.5)]:
+        rollup.add(ts, row(p, close=ts))
+    ts, values = rollup.window()
+    n = len(HISTORY_FIELDS)
+    assert ts.tolist() == [0]
+    assert values[PREMIUM, 0] == 2.5 and values[0, 0] == 59  # 종가
+    assert values[n:, 0].tolist() == [2.0, 3.5, 1.0]          # open / high / low
+
+
+def test_completed_buckets_move_to_buffer():
+    rollup = OhlcRollup(60, 10)
+    for ts in range(0, 300, 30):
+        rollup.add(ts, row(float(ts)))
+    ts, values = rollup.window()
+    assert ts.tolist() == [0, 60, 120, 180, 240]
+    assert rollup.window(limit=2)[0].tolist() == [180, 240]
+    assert rollup.window(since=100)[0].tolist() == [120, 180, 240]
+
+
+def test_capacity_is_fixed():
+    rollup = OhlcRollup(1, 3)
+    for ts in range(10):
+        rollup.add(ts, row(float(ts)))
+    assert rollup.window()[0].tolist() == [6, 7, 8, 9]  # 완료 3개 + 진행 중 1개
+
+
+def test_nan_first_value_matches_resample():
+    samples = [(0, np.nan), (5, 2.0), (10, 1.0), (65, 4.0), (70, np.nan)]
+    rollup = OhlcRollup(60, 10)
+    for ts, p in samples:
+        rollup.add(ts, row(p))
+    live_ts, live = rollup.window()
+    ts = np.array([t for t, _ in samples], dtype=np.float64)
+    values = np.column_stack([row(p) for _, p in samples])
+    stored_ts, stored = resample_ohlc(ts, values, 60, PREMIUM)
+    n = len(HISTORY_FIELDS)
+    assert live_ts.tolist() == stored_ts.tolist()
+    np.testing.assert_array_equal(live[n + 1:], stored[n + 1:])  # high / low
+    assert live[n + 1:, 0].tolist() == [2.0, 1.0]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from llm_gateway import FakeModel, LLMGateway
+from services import ServiceRegistry
+
+
+def failing_model():
+    registry = ServiceRegistry()
+
+    def factory():
+        raise ImportError("SDK 없음")
+
+    return registry.register("gemini", factory)
+
+
+def test_failed_lazy_model_does_not_leak_slots():
+    gateway = LLMGateway(failing_model(), timeout=1.0, max_concurrency=2)
+
+    async def main():
+        for _ in range(5):
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(gateway._call("p"), 2)
+        return gateway._running
+
+    assert asyncio.run(main()) == 0
+    assert not gateway.available
+
+
+def test_failed_lazy_model_stream_releases_slot():
+    gateway = LLMGateway(failing_model(), timeout=1.0, max_concurrency=1)
+
+    async def main():
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                async for _ in gateway.stream("p"):
+                    pass
+        await asyncio.sleep(0.05)  # 자리는 스레드 작업이 끝난 뒤 돌려줌
+        return gateway._running
+
+    assert asyncio.run(main()) == 0
+
+
+def test_generate_caches_and_coalesces():
+    model = FakeModel(latency=0.02, jitter=0.0, seed=1)
+    gateway = LLMGateway(model, timeout=1.0, max_concurrency=2)
+
+    async def main():
+        first = await asyncio.gather(*(gateway.generate("p", key="k", ttl=60) for _ in range(4)))
+        again = await gateway.generate("p", key="k", ttl=60)
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert len(set(first)) == 1 and again == first[0]
+    assert model.calls == 1
+    assert gateway.counters["coalesced"] == 3 and gateway.counters["hits"] == 1
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import push_stream
+from push_stream import Broadcaster
+
+
+def events(frames):
+    """SSE 프레임 → [(topic, payload)]"""
+    out = []
+    for frame in frames:
+        for block in frame.decode("utf-8").strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.split("\n"))
+            out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_payload_serialized_once_for_all_clients(monkeypatch):
+    calls = []
+    original = push_stream.encode_event
+
+    def counting(topic, payload):
+        calls.append(topic)
+        return original(topic, payload)
+
+    monkeypatch.setattr(push_stream, "encode_event", counting)
+    broadcaster = Broadcaster()
+    clients = [broadcaster.subscribe() for _ in range(5)]
+    broadcaster.publish("market", {"premium_up": 1.5})
+    broadcaster.publish("thought", {"text": "a"})
+    assert calls == ["market", "thought"]
+    first = [client.drain() for client in clients]
+    assert all(frames[0] is first[0][0] for frames in first)  # 같은 bytes 객체를 공유
+
+
+def test_slow_client_gets_only_latest_state():
+    broadcaster = Broadcaster()
+    client = broadcaster.subscribe()
+    for i in range(50):
+        broadcaster.publish("market", {"n": i})
+    broadcaster.publish("ticker", {"n": 1}, key="ticker:BTC")
+    broadcaster.publish("ticker", {"n": 2}, key="ticker:BTC")
+    broadcaster.publish("ticker", {"n": 3}, key="ticker:ETH")
+    assert events(client.drain()) == [("market", {"n": 49}), ("ticker", {"n": 2}), ("ticker", {"n": 3})]
+    assert client.drain() == []
+
+
+def test_delta_topics_keep_order_until_overflow():
+    broadcaster = Broadcaster(max_backlog=3)
+    client = broadcaster.subscribe()
+    for i in range(3):
+        broadcaster.publish("thought", {"n": i})
+    assert [p["n"] for _, p in events(client.drain())] == [0, 1, 2]
+    for i in range(5):
+        broadcaster.publish("thought", {"n": i})
+    broadcaster.publish("market", {"n": 9})
+    # 누적형이 넘치면 resync 하나 + 최신 상태만 (잃은 중간 이벤트는 REST 재조회로 맞춤)
+    assert events(client.drain()) == [("resync", {}), ("market", {"n": 9})]
+
+
+def test_new_subscriber_receives_last_state():
+    broadcaster = Broadcaster()
+    broadcaster.publish("market", {"n": 1})
+    broadcaster.publish("market", {"n": 2})
+    broadcaster.publish("thought", {"n": 1})
+    assert events(broadcaster.subscribe().drain()) == [("market", {"n": 2})]
+
+
+def test_listeners_get_original_key():
+    broadcaster = Broadcaster()
+    seen = []
+    broadcaster.listeners.append(lambda *args: seen.append(args))
+    broadcaster.publish("ticker", {"n": 1}, key="ticker:BTC")
+    broadcaster.publish("market", {"n": 1})
+    assert seen == [("ticker", {"n": 1}, "ticker:BTC"), ("market", {"n": 1}, None)]
+
+
+def test_stream_batches_pending_frames_and_unsubscribes():
+    async def main():
+        broadcaster = Broadcaster(heartbeat=0.05)
+        client = broadcaster.subscribe()
+        stream = broadcaster.stream(client)
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+        for i in range(10):
+            broadcaster.publish("market", {"n": i})
+        chunk = await stream.__anext__()
+        assert await stream.__anext__() == b": ping\n\n"
+        await stream.aclose()
+        return chunk, broadcaster.clients
+
+    chunk, clients = asyncio.run(main())
+    assert events([chunk]) == [("market", {"n": 9})]
+    assert not clients
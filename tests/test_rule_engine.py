@@ -0,0 +1,62 @@
+from rule_engine import ThresholdIndex
+
+
+class R:
+    def __init__(self, rule_id, threshold):
+        self.rule_id, self.threshold = rule_id, threshold
+
+
+def index(comparator, thresholds):
+    idx = ThresholdIndex(comparator)
+    for i, t in enumerate(thresholds):
+        idx.add(R(f"r{i}", t))
+    return idx
+
+
+def brute(comparator, thresholds, prev, value):
+    """모든 규칙을 훑는 기준 구현: prev 에서 거짓, value 에서 참"""
+    ops = {"<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+           ">": lambda a, b: a > b, ">=": lambda a, b: a >= b}
+    op = ops[comparator]
+    return sorted(f"r{i}" for i, t in enumerate(thresholds) if not op(prev, t) and op(value, t))
+
+
+def test_less_than_boundaries():
+    idx = index("<", [1.0, 2.0, 3.0])
+    assert idx.crossed(3.0, 1.0) == ["r1", "r2"]  # 3 < 3 은 거짓 → 참, 1 < 1 은 여전히 거짓
+    assert idx.crossed(1.0, 3.0) == []            # 반대 방향은 발생 안 함
+
+
+def test_less_equal_boundaries():
+    idx = index("<=", [1.0, 2.0, 3.0])
+    assert idx.crossed(3.0, 1.0) == ["r0", "r1"]
+
+
+def test_greater_boundaries():
+    assert index(">", [1.0, 2.0, 3.0]).crossed(1.0, 3.0) == ["r0", "r1"]
+    assert index(">=", [1.0, 2.0, 3.0]).crossed(1.0, 3.0) == ["r1", "r2"]
+
+
+def test_same_threshold_rules_fire_together():
+    idx = index(">", [2.0, 2.0, 2.0])
+    assert sorted(idx.crossed(1.0, 2.5)) == ["r0", "r1", "r2"]
+    assert idx.crossed(2.5, 3.0) == []
+
+
+def test_remove():
+    idx = ThresholdIndex(">")
+    a, b = R("a", 1.0), R("b", 1.0)
+    idx.add(a), idx.add(b)
+    idx.remove(a)
+    assert idx.crossed(0.0, 2.0) == ["b"] and len(idx) == 1
+
+
+def test_matches_brute_force():
+    import random
+    rng = random.Random(3)
+    thresholds = [round(rng.uniform(-2, 2), 1) for _ in range(60)]
+    for comparator in ("<", "<=", ">", ">="):
+        idx = index(comparator, thresholds)
+        for _ in range(300):
+            prev, value = round(rng.uniform(-3, 3), 1), round(rng.uniform(-3, 3), 1)
+            assert sorted(idx.crossed(prev, value)) == brute(comparator, thresholds, prev, value)
@@ -0,0 +1,50 @@
+from shared_state import EventLog
+
+
+def test_buffered_until_flush(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    writer, reader = EventLog(path), EventLog(path, from_start=True)
+    writer.append("rules", {"name": "a"})
+    assert reader.read_new() == []
+    assert writer.flush() == 1
+    assert reader.read_new() == [("rules", {"name": "a"}, None)]
+    assert reader.read_new() == []
+
+
+def test_rotation_keeps_unread_events(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    writer, reader = EventLog(path, max_bytes=64), EventLog(path)
+    writer.append("tick", 0)
+    writer.flush()
+    reader.read_new()  # 처음에는 끝부터
+    for n in range(1, 6):
+        writer.append("tick", n)
+        writer.flush()
+    writer.append("tick", 6)
+    writer.flush()
+    assert (tmp_path / "events.jsonl.1").exists()
+    assert [payload for _, payload, _ in reader.read_new()] == [1, 2, 3, 4, 5, 6]
+
+
+class Election:
+    def __init__(self, is_leader):
+        self.is_leader = is_leader
+
+    def try_acquire(self):
+        return False
+
+
+def test_follower_requests_reach_leader(tmp_path):
+    from shared_state import SharedState, StateMirror
+    shared = SharedState(str(tmp_path))
+    inbox = str(tmp_path / "inbox.jsonl")
+    follower = StateMirror(shared, Election(False), inbox=EventLog(inbox, from_start=True))
+    leader = StateMirror(shared, Election(True), inbox=EventLog(inbox, from_start=True))
+    received = []
+    leader.on_request = lambda topic, payload: received.append((topic, payload))
+    follower.send("rule", {"name": "BTC 김프 3% 이상"})
+    follower.flush()
+    leader.step()
+    assert received == [("rule", {"name": "BTC 김프 3% 이상"})]
+    leader.send("rule", {"name": "직접"})  # 리더는 바로 처리
+    assert received[-1] == ("rule", {"name": "직접"})
@@ -0,0 +1,233 @@
+import asyncio
+
+import pytest
+
+from upstream import CircuitBreaker, CircuitOpenError, UpstreamError, UpstreamScheduler
+
+
+class Response:
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data if data is not None else {"ok": True}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+
+def scheduler(request, ttl=0.0, rate=100.0, burst=100, timeout=0.5):
+    return UpstreamScheduler(request, {"x": {"ttl": ttl, "rate": rate, "burst": burst, "timeout": timeout}})
+
+
+def half_open(breaker):
+    """차단 시간이 막 끝난 상태로 만듦"""
+    breaker.opened = 1
+    breaker.open_until = 0.0
+
+
+# ---------------- CircuitBreaker ----------------
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_breaker_half_open_allows_single_trial():
+    breaker = CircuitBreaker()
+    half_open(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # 시험 요청 결과를 기다리는 중
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_breaker_failed_trial_reopens_longer():
+    breaker = CircuitBreaker(reset_timeout=5.0)
+    half_open(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.remaining() >= 10.0  # 5초 × 2^1
+
+
+def test_breaker_release_frees_trial_slot():
+    breaker = CircuitBreaker()
+    half_open(breaker)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_breaker_retry_after_opens_immediately():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=1.0)
+    breaker.record_failure(retry_after=30)
+    assert breaker.state == "open" and breaker.remaining() >= 30
+
+
+# ---------------- UpstreamScheduler ----------------
+
+def test_scheduler_caches_within_ttl():
+    calls = []
+
+    async def request(url, params, timeout):
+        calls.append(url)
+        return Response(data={"n": len(calls)})
+
+    async def main():
+        s = scheduler(request, ttl=60)
+        first = await s.get_json("x", "u")
+        second = await s.get_json("x", "u")
+        return s, first, second
+
+    s, first, second = asyncio.run(main())
+    assert first == second == {"n": 1}
+    assert len(calls) == 1 and s.counters["x"]["cache_hits"] == 1
+
+
+def test_scheduler_coalesces_concurrent_requests():
+    calls = []
+
+    async def request(url, params, timeout):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return Response()
+
+    async def main():
+        s = scheduler(request)
+        results = await asyncio.gather(*(s.get_json("x", "u") for _ in range(5)))
+        return s, results
+
+    s, results = asyncio.run(main())
+    assert len(calls) == 1 and len(results) == 5
+    assert s.counters["x"]["coalesced"] == 4
+
+
+def test_scheduler_server_errors_open_breaker():
+    async def request(url, params, timeout):
+        return Response(status_code=503)
+
+    async def main():
+        s = scheduler(request)
+        for _ in range(3):
+            with pytest.raises(UpstreamError):
+                await s.get_json("x", "u")
+        with pytest.raises(CircuitOpenError):
+            await s.get_json("x", "u")
+        return s
+
+    s = asyncio.run(main())
+    assert s.breakers["x"].state == "open"
+    assert s.counters["x"]["failures"] == 3
+
+
+def test_scheduler_client_error_keeps_breaker_closed():
+    async def request(url, params, timeout):
+        return Response(status_code=404)
+
+    async def main():
+        s = scheduler(request)
+        for _ in range(5):
+            with pytest.raises(UpstreamError):
+                await s.get_json("x", "u")
+        return s
+
+    assert asyncio.run(main()).breakers["x"].state == "closed"
+
+
+def test_scheduler_rate_limited_trial_does_not_wedge_breaker():
+    """half_open 시험 요청이 토큰 부족으로 끝나도 토큰이 다시 차면 복구"""
+    async def request(url, params, timeout):
+        return Response()
+
+    async def main():
+        s = scheduler(request, rate=0.01, burst=1, timeout=0.01)
+        s.buckets["x"].tokens = 0
+        half_open(s.breakers["x"])
+        with pytest.raises(UpstreamError, match="토큰 버킷"):
+            await s.get_json("x", "u")
+        s.buckets["x"].tokens = 1
+        return s, await s.get_json("x", "u")
+
+    s, data = asyncio.run(main())
+    assert data == {"ok": True}
+    assert s.breakers["x"].state == "closed"
+
+
+def test_scheduler_cancelled_trial_does_not_wedge_breaker():
+    async def slow(url, params, timeout):
+        await asyncio.sleep(10)
+
+    async def main():
+        s = scheduler(slow)
+        half_open(s.breakers["x"])
+        caller = asyncio.create_task(s.get_json("x", "u"))
+        await asyncio.sleep(0.01)
+        fetch = next(iter(s._inflight.values()))
+        fetch.cancel()  # 조회 태스크 자체가 취소됨 (서버 종료 등)
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        return s.breakers["x"].allow(), s._inflight
+
+    allowed, inflight = asyncio.run(main())
+    assert allowed and not inflight
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_waiters():
+    calls = []
+
+    async def request(url, params, timeout):
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        return Response(data={"v": 1})
+
+    async def main():
+        s = scheduler(request, ttl=60)
+        leader = asyncio.create_task(s.get_json("x", "u"))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(s.get_json("x", "u")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        return s, results
+
+    s, results = asyncio.run(main())
+    assert results == [{"v": 1}] * 3
+    assert len(calls) == 1 and s.cache  # 결과도 캐시에 남음
+
+
+def test_leader_and_waiters_get_the_same_wrapped_error():
+    async def request(url, params, timeout):
+        await asyncio.sleep(0.01)
+        raise ConnectionError("down")
+
+    async def main():
+        s = scheduler(request)
+        return await asyncio.gather(*(s.get_json("x", "u") for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, UpstreamError) and "ConnectionError" in str(e) for e in errors)
+
+
+def test_non_json_200_counts_as_failure():
+    class Html(Response):
+        def json(self):
+            raise ValueError("Expecting value")
+
+    async def request(url, params, timeout):
+        return Html()
+
+    async def main():
+        s = scheduler(request)
+        for _ in range(3):
+            with pytest.raises(UpstreamError, match="JSON"):
+                await s.get_json("x", "u")
+        return s
+
+    s = asyncio.run(main())
+    assert s.breakers["x"].state == "open" and s.counters["x"]["failures"] == 3
@@ -0,0 +1,155 @@
+import sys
+import json
+import time
+import random
+import asyncio
+from websockets.asyncio.server import serve
+from ticker_stream import TickerStreamEngine, replay_urls
+
+
+def load_ticks(path):
+    """기록된 틱 파일(JSONL: ts, venue, symbol, price)을 시간순으로 로드"""
+    ticks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                ticks.append(json.loads(line))
+    ticks.sort(key=lambda t: t["ts"])
+    return ticks
+
+
+def synthesize_ticks(symbols=("BTC", "ETH", "XRP"), seconds=600, rate=10, fx_rate=1350.0, seed=42):
+    """녹화본이 없을 때 쓰는 랜덤워크 틱 (심볼·거래소마다 초당 rate개)"""
+    rng = random.Random(seed)
+    base_usdt = {"BTC": 65000.0, "ETH": 3200.0, "XRP": 0.55}
+    ticks = []
+    start = time.time() - seconds
+    for symbol in symbols:
+        usdt = base_usdt.get(symbol, rng.uniform(0.1, 100))
+        premium = {"upbit": 1.03, "bithumb": 1.028}
+        for i in range(int(seconds * rate)):
+            ts = start + i / rate
+            usdt *= 1 + rng.gauss(0, 0.0002)
+            ticks.append({"ts": ts, "venue": "binance", "symbol": symbol, "price": round(usdt, 6)})
+            for venue in ("upbit", "bithumb"):
+                premium[venue] = min(max(premium[venue] + rng.gauss(0, 0.0003), 0.97), 1.08)
+                ticks.append({"ts": ts, "venue": venue, "symbol": symbol, "price": round(usdt * fx_rate * premium[venue], 2)})
+    ticks.sort(key=lambda t: t["ts"])
+    return ticks
+
+
+def encode_tick(venue, tick):
+    """거래소별 실제 웹소켓 메시지 형식으로 변환"""
+    if venue == "binance":
+        return json.dumps({"e": "24hrTicker", "E": int(tick["ts"] * 1000), "s": f"{tick['symbol']}USDT", "c": str(tick["price"])})
+    # 업비트/빗썸은 바이너리 프레임으로 전송
+    return json.dumps({
+        "type": "ticker",
+        "code": f"KRW-{tick['symbol']}",
+        "trade_price": tick["price"],
+        "timestamp": int(tick["ts"] * 1000)
+    }).encode("utf-8")
+
+
+def subscribed_symbols(venue, raw):
+    msg = json.loads(raw)
+    if venue == "binance":
+        return {p.split("usdt@")[0].upper() for p in msg.get("params", [])}
+    codes = set()
+    for part in msg:
+        if part.get("type") == "ticker":
+            codes.update(c.split("-", 1)[1] for c in part.get("codes", []))
+    return codes
+
+
+class TickReplayServer:
+    """녹화된 틱을 거래소 웹소켓 프로토콜 그대로 재생하는 로컬 서버 (/upbit, /bithumb, /binance)"""
+
+    def __init__(self, ticks, speed=1.0, loop_forever=False, drop_after=None):
+        self.ticks = ticks
+        self.speed = speed              # 배속 (0이면 대기 없이 최대 속도)
+        self.loop_forever = loop_forever
+        self.drop_after = drop_after    # N개 전송 후 연결을 끊어 재접속 동작 확인용
+        self.sent = 0
+
+    async def handler(self, ws):
+        venue = ws.request.path.strip("/")
+        symbols = subscribed_symbols(venue, await ws.recv())
+        ticks = [t for t in self.ticks if t["venue"] == venue and t["symbol"] in symbols]
+        sent_here = 0
+        while True:
+            wall_start = time.monotonic()
+            tick_start = ticks[0]["ts"] if ticks else 0
+            for tick in ticks:
+                if self.speed:
+                    delay = (tick["ts"] - tick_start) / self.speed - (time.monotonic() - wall_start)
+                    if delay > 0.001:
+                        await asyncio.sleep(delay)
+                await ws.send(encode_tick(venue, tick))
+                self.sent += 1
+                sent_here += 1
+                if self.drop_after and sent_here >= self.drop_after:
+                    await ws.close()
+                    return
+            if not self.loop_forever or not ticks:
+                break  # 구독한 심볼이 녹화에 없으면 반복할 것도 없음 (await 없이 돌면 이벤트 루프가 멈춤)
+        await ws.wait_closed()
+
+    def serve(self, host="127.0.0.1", port=8765):
+        return serve(self.handler, host, port, max_size=2 ** 20)
+
+
+async def bench(ticks, speed, port):
+    """리플레이 서버 + 엔진을 함께 띄워 처리량 측정"""
+    server = TickReplayServer(ticks, speed=speed)
+    symbols = sorted({t["symbol"] for t in ticks})
+    async with server.serve(port=port):
+        engine = TickerStreamEngine(symbols, urls=replay_urls(port=port), fx_rate=1350.0)
+        started = time.perf_counter()
+        engine.start()
+        while engine.tick_count < len(ticks):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        await engine.stop()
+    span = ticks[-1]["ts"] - ticks[0]["ts"] if ticks else 0
+    print(f"틱 {engine.tick_count:,}개 / {elapsed:.2f}초 = {engine.tick_count / elapsed:,.0f} ticks/s "
+          f"(녹화 구간 {span:.0f}초 → {span / elapsed:,.1f}배속)")
+    for symbol, row in engine.premiums.items():
+        print(f"  {symbol}: 업비트 {row['upbit']:.2f}% / 빗썸 {row['bithumb']:.2f}%")
+
+
+async def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="녹화된 틱 리플레이 서버 (오프라인 테스트/부하 테스트용)")
+    parser.add_argument("command", choices=["serve", "bench", "synth"])
+    parser.add_argument("--ticks", help="녹화 파일 (ticker_stream.py --record 로 생성한 JSONL)")
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 배속 (0 = 최대 속도)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", default="BTC,ETH,XRP")
+    parser.add_argument("--seconds", type=int, default=600, help="synth: 생성할 구간 길이")
+    parser.add_argument("--out", default="ticks.jsonl", help="synth: 출력 파일")
+    args = parser.parse_args(argv)
+
+    symbols = args.symbols.split(",")
+    ticks = load_ticks(args.ticks) if args.ticks else synthesize_ticks(symbols, args.seconds)
+
+    if args.command == "synth":
+        with open(args.out, "w", encoding="utf-8") as f:
+            for tick in ticks:
+                f.write(json.dumps(tick) + "\n")
+        print(f"{len(ticks):,}개 틱 저장: {args.out}")
+    elif args.command == "bench":
+        await bench(ticks, args.speed, args.port)
+    else:
+        server = TickReplayServer(ticks, speed=args.speed, loop_forever=True)
+        async with server.serve(port=args.port):
+            print(f"리플레이 서버 실행 중: ws://127.0.0.1:{args.port}/{{upbit,bithumb,binance}} ({args.speed}배속)")
+            await asyncio.Future()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        pass
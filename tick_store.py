@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+from history_buffer import HISTORY_FIELDS
+
+# 파일 구조: 64바이트 헤더 + 고정 폭 레코드 연속 (UTC 날짜별 파일, append 전용)
+MAGIC = b"KIMPTICK"
+VERSION = 1
+HEADER_SIZE = 64
+TICK_DTYPE = np.dtype([("ts", "<f8"), ("symbol", "S16")] + [(name, "<f8") for name in HISTORY_FIELDS])
+
+
+def day_key(ts):
+    return time.strftime("%Y%m%d", time.gmtime(ts))
+
+
+def _header():
+    header = MAGIC + VERSION.to_bytes(2, "little") + TICK_DTYPE.itemsize.to_bytes(2, "little")
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def _check_header(path, raw):
+    if raw[:8] != MAGIC:
+        raise ValueError(f"틱 파일이 아닙니다: {path}")
+    record_size = int.from_bytes(raw[10:12], "little")
+    if record_size != TICK_DTYPE.itemsize:
+        raise ValueError(f"레코드 크기 불일치 ({record_size} != {TICK_DTYPE.itemsize}): {path}")
+
+
+class TickStoreWriter:
+    """메모리에 모았다가 묶어서 append, fsync는 fsync_interval 초에 한 번만.
+    조회 전 flush 는 스레드에서 호출해도 됨 (버퍼는 잠금 안에서 떼어 내고 파일 쓰기는 순서대로)"""
+
+    def __init__(self, root, flush_interval=1.0, fsync_interval=5.0, buffer_records=8192):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.pending = np.zeros(buffer_records, dtype=TICK_DTYPE)
+        self.count = 0
+        self.last_ts = 0.0
+        self.written = 0
+        self._files = {}          # day -> fd
+        self._last_flush = time.monotonic()
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()     # pending / count
+        self._io_lock = threading.Lock()  # 파일 쓰기 순서 (시간 단조 증가 유지)
+        os.makedirs(root, exist_ok=True)
+
+    def append(self, ts, symbol, values):
+        # 범위 조회가 이진 탐색을 쓰므로 파일 안의 시간은 단조 증가로 유지
+        with self._lock:
+            ts = max(ts, self.last_ts)
+            self.last_ts = ts
+            record = self.pending[self.count]
+            record["ts"] = ts
+            record["symbol"] = symbol.encode("ascii")
+            for name, value in zip(HISTORY_FIELDS, values):
+                record[name] = np.nan if value is None else value
+            self.count += 1
+            full = self.count == len(self.pending)
+        if full or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _fd(self, day):
+        fd = self._files.get(day)
+        if fd is None:
+            path = os.path.join(self.root, f"{day}.ticks")
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            size = os.fstat(fd).st_size
+            if size == 0:
+                os.write(fd, _header())
+            elif (size - HEADER_SIZE) % TICK_DTYPE.itemsize:
+                # 비정상 종료로 잘린 마지막 레코드는 잘라냄
+                os.ftruncate(fd, size - (size - HEADER_SIZE) % TICK_DTYPE.itemsize)
+            # 날짜가 바뀌면 이전 파일은 닫음
+            for old_day in [d for d in self._files if d < day]:
+                os.fsync(self._files[old_day])
+                os.close(self._files.pop(old_day))
+            self._files[day] = fd
+        return fd
+
+    def flush(self, sync=False):
+        with self._io_lock:
+            with self._lock:
+                batch = self.pending[:self.count].copy()
+                self.count = 0
+            if len(batch):
+                days = [day_key(ts) for ts in (batch["ts"][0], batch["ts"][-1])]
+                if days[0] == days[1]:
+                    os.write(self._fd(days[0]), batch.tobytes())
+                else:
+                    for i in range(len(batch)):
+                        os.write(self._fd(day_key(batch["ts"][i])), batch[i:i + 1].tobytes())
+                self.written += len(batch)
+            self._last_flush = time.monotonic()
+            if sync or time.monotonic() - self._last_sync >= self.fsync_interval:
+                for fd in self._files.values():
+                    os.fsync(fd)
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        self.flush(sync=True)
+        for fd in self._files.values():
+            os.close(fd)
+        self._files = {}
+
+
+class TickStore:
+    """날짜별 틱 파일을 memmap으로 열어 시간/심볼 범위 조회 (파일 전체를 읽지 않음)"""
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}   # day -> (레코드 수, memmap)
+
+    def days(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[:8] for name in os.listdir(self.root) if name.endswith(".ticks"))
+
+    def open_day(self, day):
+        """해당 날짜 레코드 배열 (memmap, 복사 없음). 파일이 커졌으면 다시 매핑"""
+        path = os.path.join(self.root, f"{day}.ticks")
+        if not os.path.exists(path):
+            return None
+        count = (os.path.getsize(path) - HEADER_SIZE) // TICK_DTYPE.itemsize
+        cached = self._maps.get(day)
+        if cached and cached[0] == count:
+            return cached[1]
+        if count <= 0:
+            return None
+        with open(path, "rb") as f:
+            _check_header(path, f.read(HEADER_SIZE))
+        records = np.memmap(path, dtype=TICK_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        self._maps[day] = (count, records)
+        return records
+
+    def range(self, start, end=None, symbol=None):
+        """[start, end) 구간 레코드. 심볼 조건이 없고 하루 안이면 memmap 슬라이스 그대로 반환"""
+        end = end if end is not None else time.time() + 1
+        parts = []
+        first, last = day_key(start), day_key(end)
+        for day in self.days():
+            if day < first or day > last:
+                continue
+            records = self.open_day(day)
+            if records is None:
+                continue
+            ts = records["ts"]
+            lo, hi = np.searchsorted(ts, start, side="left"), np.searchsorted(ts, end, side="left")
+            part = records[lo:hi]
+            if symbol:
+                part = part[part["symbol"] == symbol.encode("ascii")]
+            if len(part):
+                parts.append(part)
+        if not parts:
+            return np.zeros(0, dtype=TICK_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def store_dir_from_env():
+    """TICK_STORE_DIR (기본 data/ticks), 비워 두면 디스크 저장 안 함"""
+    return os.getenv("TICK_STORE_DIR", os.path.join("data", "ticks"))
+
+
+def bench(root, count=1_000_000, symbols=("BTC", "ETH", "XRP")):
+    """쓰기 처리량과 하루치 범위 조회 시간 측정"""
+    writer = TickStoreWriter(root)
+    start_ts = time.time() - 86400
+    step = 86400 / count
+    started = time.perf_counter()
+    for i in range(count):
+        writer.append(start_ts + i * step, symbols[i % len(symbols)], (1e8, 1e8, 7e4, 1350.0, 1.0, 0.9))
+    writer.close()
+    write_sec = time.perf_counter() - started
+    print(f"쓰기: {count:,}건 / {write_sec:.2f}초 = {count / write_sec:,.0f} ticks/s")
+
+    store = TickStore(root)
+    started = time.perf_counter()
+    records = store.range(start_ts, start_ts + 86400, symbol="BTC")
+    query_ms = (time.perf_counter() - started) * 1000
+    print(f"하루 범위 + 심볼 조회: {len(records):,}건 / {query_ms:.1f}ms")
+    started = time.perf_counter()
+    records = store.range(start_ts + 3600, start_ts + 7200)
+    print(f"1시간 범위 조회: {len(records):,}건 / {(time.perf_counter() - started) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="틱 저장소 조회/벤치마크")
+    parser.add_argument("command", choices=["info", "dump", "bench"])
+    parser.add_argument("--root", default=store_dir_from_env())
+    parser.add_argument("--symbol")
+    parser.add_argument("--since", type=float, default=time.time() - 3600, help="epoch 초 (기본: 1시간 전)")
+    parser.add_argument("--until", type=float)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.root, args.count)
+        sys.exit(0)
+    store = TickStore(args.root)
+    if args.command == "info":
+        for day in store.days():
+            records = store.open_day(day)
+            n = 0 if records is None else len(records)
+            print(f"{day}: {n:,}건")
+    else:
+        for r in store.range(args.since, args.until, args.symbol):
+            values = " ".join(f"{r[name]:.4f}" for name in HISTORY_FIELDS)
+            print(f"{r['ts']:.3f} {r['symbol'].decode()} {values}")
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import websockets
+from dotenv import load_dotenv
+
+# 거래소별 웹소켓 주소 (리플레이 서버로 바꿔 끼울 수 있도록 환경변수로 덮어쓰기 가능)
+DEFAULT_WS_URLS = {
+    "upbit": "wss://api.upbit.com/websocket/v1",
+    "bithumb": "wss://ws-api.bithumb.com/websocket/v1",
+    "binance": "wss://stream.binance.com:9443/ws"
+}
+
+
+def ws_urls_from_env():
+    return {venue: os.getenv(f"{venue.upper()}_WS_URL", url) for venue, url in DEFAULT_WS_URLS.items()}
+
+
+def replay_urls(host="127.0.0.1", port=8765):
+    """로컬 리플레이 서버(tick_replay.py) 주소"""
+    return {venue: f"ws://{host}:{port}/{venue}" for venue in DEFAULT_WS_URLS}
+
+
+def subscribe_message(venue, symbols):
+    """거래소별 구독 요청 메시지"""
+    if venue == "binance":
+        return json.dumps({
+            "method": "SUBSCRIBE",
+            "params": [f"{s.lower()}usdt@ticker" for s in symbols],
+            "id": 1
+        })
+    # 업비트/빗썸(v1)은 같은 형식
+    return json.dumps([
+        {"ticket": str(uuid.uuid4())},
+        {"type": "ticker", "codes": [f"KRW-{s}" for s in symbols]}
+    ])
+
+
+def parse_tick(venue, raw):
+    """수신 메시지 → (심볼, 가격, 타임스탬프 초). 시세가 아니면 None"""
+    msg = json.loads(raw)
+    if venue == "binance":
+        if msg.get("e") != "24hrTicker":
+            return None  # 구독 응답 등
+        symbol = msg["s"]
+        if not symbol.endswith("USDT"):
+            return None
+        return symbol[:-4], float(msg["c"]), msg["E"] / 1000
+    if msg.get("type") != "ticker":
+        return None
+    code = msg.get("code", "")
+    if not code.startswith("KRW-"):
+        return None
+    return code[4:], float(msg["trade_price"]), msg.get("timestamp", time.time() * 1000) / 1000
+
+
+class TickerStreamEngine:
+    """업비트/빗썸/바이낸스 실시간 체결 스트림으로 최신가 테이블과 김프를 틱 단위로 갱신"""
+
+    venues = ("upbit", "bithumb", "binance")
+
+    def __init__(self, symbols=("BTC",), urls=None, fx_rate=None, record_path=None):
+        self.symbols = [s.upper() for s in symbols]
+        self.urls = urls or ws_urls_from_env()
+        self.fx_rate = fx_rate
+        self.prices = {venue: {} for venue in self.venues}  # 최신가 테이블: venue -> symbol -> price
+        self.updated = {}                                   # symbol -> 마지막 틱 시각
+        self.premiums = {}                                  # symbol -> {"upbit", "bithumb", "gap"}
+        self.listeners = []                                 # 김프가 바뀐 심볼마다 호출 (symbol, row)
+        self.tick_count = 0
+        self.reconnects = {venue: 0 for venue in self.venues}
+        self.record_path = record_path
+        self._record_file = None
+        self._tasks = []
+
+    def set_fx_rate(self, fx_rate):
+        """환율이 바뀌면 전체 심볼 재계산 (환율은 느리게 바뀌므로 드묾)"""
+        if not fx_rate or fx_rate == self.fx_rate:
+            return
+        self.fx_rate = fx_rate
+        for symbol in list(self.updated):
+            self._recompute(symbol)
+
+    def on_tick(self, venue, symbol, price, ts):
+        self.tick_count += 1
+        if self._record_file is not None:
+            self._record_file.write(json.dumps({"ts": ts, "venue": venue, "symbol": symbol, "price": price}) + "\n")
+        table = self.prices[venue]
+        if table.get(symbol) == price:
+            return  # 가격 변화 없으면 재계산 생략
+        table[symbol] = price
+        self.updated[symbol] = ts
+        self._recompute(symbol)
+
+    def _premium(self, local_price, binance_price):
+        if not local_price or not binance_price or not self.fx_rate:
+            return None
+        return ((local_price / (binance_price * self.fx_rate)) - 1) * 100
+
+    def _recompute(self, symbol):
+        """움직인 심볼 하나만 김프 재계산"""
+        binance_p = self.prices["binance"].get(symbol)
+        up = self._premium(self.prices["upbit"].get(symbol), binance_p)
+        bit = self._premium(self.prices["bithumb"].get(symbol), binance_p)
+        row = {
+            "upbit": up,
+            "bithumb": bit,
+            "gap": up - bit if up is not None and bit is not None else None,
+            "ts": self.updated.get(symbol)
+        }
+        self.premiums[symbol] = row
+        for listener in self.listeners:
+            try:
+                listener(symbol, row)
+            except Exception as e:
+                print(f"[ticker] 리스너 오류: {e}")
+
+    async def run_venue(self, venue):
+        """연결이 끊기면 지수 백오프로 재접속 후 재구독"""
+        backoff = 1.0
+        while True:
+            try:
+                async with websockets.connect(self.urls[venue], ping_interval=20, max_size=2 ** 20) as ws:
+                    await ws.send(subscribe_message(venue, self.symbols))
+                    backoff = 1.0
+                    async for raw in ws:
+                        tick = parse_tick(venue, raw)
+                        if tick:
+                            self.on_tick(venue, *tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ticker] {venue} 연결 끊김: {e!r} ({backoff:.0f}초 후 재접속)")
+            self.reconnects[venue] += 1
+            await asyncio.sleep(backoff + random.random())
+            backoff = min(backoff * 2, 60)
+
+    def start(self):
+        if self.record_path and self._record_file is None:
+            self._record_file = open(self.record_path, "a", encoding="utf-8", buffering=1 << 16)
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self.run_venue(venue)) for venue in self.venues]
+        return self._tasks
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+
+async def _print_loop(engine):
+    print("시간 | 심볼 | 업비트 김프 | 빗썸 김프 | 업비트-빗썸 차이")
+    print("-" * 60)
+    while True:
+        await asyncio.sleep(1)
+        curr_time = time.strftime("%H:%M:%S", time.localtime())
+        for symbol, row in engine.premiums.items():
+            if row["gap"] is not None:
+                print(f"[{curr_time}] {symbol:>5} | {row['upbit']:6.2f}% | {row['bithumb']:6.2f}% | {row['gap']:6.2f}%")
+
+
+async def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="거래소 웹소켓 실시간 김프 모니터")
+    parser.add_argument("symbols", nargs="*", default=["BTC"])
+    parser.add_argument("--fx", type=float, default=float(os.getenv("USD_KRW", "1350")), help="원/달러 환율")
+    parser.add_argument("--replay", metavar="HOST:PORT", help="실거래소 대신 로컬 리플레이 서버에 접속")
+    parser.add_argument("--record", metavar="PATH", help="수신한 틱을 JSONL로 기록 (리플레이용)")
+    args = parser.parse_args(argv)
+
+    urls = None
+    if args.replay:
+        host, port = args.replay.split(":")
+        urls = replay_urls(host, int(port))
+    engine = TickerStreamEngine(args.symbols, urls=urls, fx_rate=args.fx, record_path=args.record)
+    engine.start()
+    try:
+        await _print_loop(engine)
+    finally:
+        await engine.stop()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        pass
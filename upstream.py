@@ -0,0 +1,260 @@
+import os
+import time
+import random
+import asyncio
+
+# 소스별 기본 정책: 캐시 TTL(초), 초당 요청 한도 / 버스트 (거래소 공개 API 쿼터보다 여유 있게), 타임아웃
+# - fx: exchangerate-api 무료 플랜은 하루 1회 갱신 → 1시간 캐시면 충분
+# - upbit: 시세 조회 IP당 초당 10회 / bithumb: 공개 API 초당 135회 / binance: 분당 가중치 6000
+DEFAULT_SOURCES = {
+    "fx": {"ttl": 3600.0, "rate": 1 / 60, "burst": 2, "timeout": 3.0},
+    "upbit": {"ttl": 1.0, "rate": 8.0, "burst": 10, "timeout": 2.0},
+    "bithumb": {"ttl": 1.0, "rate": 10.0, "burst": 15, "timeout": 2.0},
+    "binance": {"ttl": 1.0, "rate": 10.0, "burst": 20, "timeout": 2.0}
+}
+
+
+# 거래소/환율 API 주소. 로컬 가짜 서버로 테스트할 때 UPBIT_API_URL=http://127.0.0.1:9100/upbit 처럼 덮어씀
+DEFAULT_BASE_URLS = {
+    "fx": "https://api.exchangerate-api.com",
+    "upbit": "https://api.upbit.com",
+    "bithumb": "https://api.bithumb.com",
+    "binance": "https://api.binance.com"
+}
+
+
+def base_url(source):
+    return os.getenv(f"{source.upper()}_API_URL", DEFAULT_BASE_URLS[source]).rstrip("/")
+
+
+class UpstreamError(Exception):
+    """업스트림 조회 실패 (호출 측은 값을 지어내지 말고 stale 처리)"""
+
+    def __init__(self, source, message):
+        super().__init__(f"{source}: {message}")
+        self.source = source
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지는 토큰 버킷 (최대 burst개)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self, max_wait=None):
+        """토큰이 생길 때까지 대기. max_wait 안에 생기지 않으면 기다리지 않고 False"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            delay = (1 - self.tokens) / self.rate
+            if max_wait is not None and delay > max_wait:
+                return False
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """연속 실패가 쌓이면 일정 시간 요청 차단 (차단 시간은 실패가 반복될수록 두 배씩, 최대 max_timeout).
+    차단이 풀리면 한 번만 시험 요청을 보내고 성공하면 정상 복귀"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=5.0, max_timeout=300.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.failures = 0
+        self.opened = 0
+        self.open_until = 0.0
+        self._trial = False
+
+    @property
+    def state(self):
+        if self.open_until > time.monotonic():
+            return "open"
+        return "half_open" if self.opened else "closed"
+
+    def allow(self):
+        state = self.state
+        if state == "open":
+            return False
+        if state == "half_open":
+            if self._trial:
+                return False  # 시험 요청 결과를 기다리는 중
+            self._trial = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened = 0
+        self._trial = False
+
+    def release(self):
+        """결과 없이 끝난 시험 요청(토큰 부족/취소) → 다음 요청이 다시 시험할 수 있게"""
+        self._trial = False
+
+    def record_failure(self, retry_after=None):
+        self.failures += 1
+        self._trial = False
+        if retry_after is not None or self.failures >= self.failure_threshold or self.opened:
+            timeout = min(self.reset_timeout * 2 ** self.opened, self.max_timeout)
+            if retry_after is not None:
+                timeout = max(timeout, retry_after)
+            # 여러 인스턴스가 동시에 재시도하지 않도록 약간의 지터
+            self.open_until = time.monotonic() + timeout * random.uniform(1.0, 1.2)
+            self.opened += 1
+
+    def remaining(self):
+        return max(0.0, self.open_until - time.monotonic())
+
+
+class UpstreamScheduler:
+    """모든 외부 조회의 단일 창구: 소스별 TTL 캐시 + 동시 요청 합치기 + 토큰 버킷 + 서킷 브레이커.
+    사용자 수와 상관없이 같은 자원은 TTL당 최대 한 번만 호출됨"""
+
+    def __init__(self, request, sources=None):
+        self.request = request   # async (url, params, timeout) -> httpx.Response
+        self.sources = {name: dict(cfg) for name, cfg in (sources or sources_from_env()).items()}
+        self.buckets = {name: TokenBucket(cfg["rate"], cfg["burst"]) for name, cfg in self.sources.items()}
+        self.breakers = {name: CircuitBreaker() for name in self.sources}
+        self.cache = {}       # key -> (data, fetched_at)
+        self._inflight = {}   # key -> 진행 중인 조회 Task
+        self.counters = {name: {"requests": 0, "cache_hits": 0, "coalesced": 0, "failures": 0, "rate_limited": 0}
+                         for name in self.sources}
+        self.listeners = []   # 실제 요청마다 (source, 소요 초, 결과) - 지표 수집용
+
+    @staticmethod
+    def _key(source, url, params):
+        return source, url, tuple(sorted((params or {}).items()))
+
+    def last_good(self, source, url, params=None):
+        """마지막 정상 응답 (data, fetched_at) - TTL이 지났어도 반환, 없으면 None"""
+        return self.cache.get(self._key(source, url, params))
+
+    async def get_json(self, source, url, params=None, ttl=None):
+        key = self._key(source, url, params)
+        ttl = self.sources[source]["ttl"] if ttl is None else ttl
+        counters = self.counters[source]
+        cached = self.cache.get(key)
+        if cached and time.time() - cached[1] < ttl:
+            counters["cache_hits"] += 1
+            return cached[0]
+        task = self._inflight.get(key)
+        if task is not None:
+            counters["coalesced"] += 1
+        else:
+            # 조회는 첫 호출자와 분리된 태스크로 실행 → 첫 호출자가 취소돼도(SSE 접속 종료 등) 합쳐진 대기자는 결과를 받음
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch_and_store(key, source, url, params))
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 아무도 기다리지 않는 태스크의 예외 경고 방지
+
+    async def _fetch_and_store(self, key, source, url, params):
+        """호출자 모두가 같은 예외(UpstreamError 계열)를 받도록 감싸서 저장"""
+        try:
+            data = await self._fetch(source, url, params)
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise UpstreamError(source, repr(e)) from e
+        self.cache[key] = (data, time.time())
+        return data
+
+    async def _fetch(self, source, url, params):
+        breaker = self.breakers[source]
+        counters = self.counters[source]
+        if not breaker.allow():
+            raise CircuitOpenError(source, f"차단 중 ({breaker.remaining():.0f}초 남음)")
+        try:
+            return await self._attempt(source, url, params, breaker, counters)
+        finally:
+            # 성공/실패를 기록하지 않고 빠져나간 경우에도 half_open 시험 자리를 반드시 반납
+            breaker.release()
+
+    async def _attempt(self, source, url, params, breaker, counters):
+        if not await self.buckets[source].acquire(max_wait=self.sources[source]["timeout"]):
+            counters["rate_limited"] += 1
+            raise UpstreamError(source, "요청 예산 소진 (토큰 버킷)")
+        counters["requests"] += 1
+        started = time.perf_counter()
+        try:
+            response = await self.request(url, params, self.sources[source]["timeout"])
+        except Exception as e:
+            self._notify(source, started, type(e).__name__)
+            counters["failures"] += 1
+            breaker.record_failure()
+            raise UpstreamError(source, repr(e))
+        self._notify(source, started, str(response.status_code))
+        if response.status_code == 429 or response.status_code == 418:
+            # 418: 바이낸스가 429 이후에도 계속 요청하면 IP 차단
+            counters["rate_limited"] += 1
+            breaker.record_failure(retry_after=_retry_after(response))
+            raise UpstreamError(source, f"요청 한도 초과 (HTTP {response.status_code})")
+        if response.status_code >= 500:
+            counters["failures"] += 1
+            breaker.record_failure()
+            raise UpstreamError(source, f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            breaker.record_success()  # 요청 자체의 문제 - 업스트림은 정상
+            raise UpstreamError(source, f"HTTP {response.status_code}")
+        try:
+            data = response.json()
+        except ValueError as e:
+            # 200 이라도 점검/CDN 오류 페이지(HTML)면 업스트림 장애로 취급
+            counters["failures"] += 1
+            breaker.record_failure()
+            raise UpstreamError(source, f"JSON 이 아닌 응답 (HTTP {response.status_code}): {e!r}")
+        breaker.record_success()
+        return data
+
+    def _notify(self, source, started, outcome):
+        elapsed = time.perf_counter() - started
+        for listener in self.listeners:
+            listener(source, elapsed, outcome)
+
+    def status(self):
+        """소스별 정책 / 브레이커 상태 / 호출 통계"""
+        return {
+            name: {
+                "ttl": cfg["ttl"],
+                "rate": round(cfg["rate"], 4),
+                "breaker": self.breakers[name].state,
+                "retry_in": round(self.breakers[name].remaining(), 1),
+                **self.counters[name]
+            }
+            for name, cfg in self.sources.items()
+        }
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def sources_from_env():
+    """UPSTREAM_FX_TTL_SEC, UPSTREAM_UPBIT_RATE 처럼 소스별 정책 덮어쓰기"""
+    sources = {}
+    for name, cfg in DEFAULT_SOURCES.items():
+        cfg = dict(cfg)
+        cfg["ttl"] = float(os.getenv(f"UPSTREAM_{name.upper()}_TTL_SEC", cfg["ttl"]))
+        cfg["rate"] = float(os.getenv(f"UPSTREAM_{name.upper()}_RATE", cfg["rate"]))
+        sources[name] = cfg
+    return sources